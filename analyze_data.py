@@ -1,173 +1,287 @@
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
+import argparse
+import sqlite3
+import glob
 import sys
 import os
-from datetime import datetime
+from columnar import file_format
+from sketches import QuantileSketch, CorrelationAccumulator
 
-def analyze_reddit_data(csv_file):
-    # Check if file exists
-    if not os.path.exists(csv_file):
-        print(f"Error: File '{csv_file}' not found.")
+# Output files of run_crawler.py --format parquet/arrow
+COLUMNAR_EXTENSIONS = ('.parquet', '.arrow', '.feather', '.ipc')
+
+# The only columns the analysis looks at
+ANALYZED_COLUMNS = ['title', 'score', 'num_comments', 'created_utc', 'content']
+
+# Rows read at a time; memory use depends on this, not on the size of the input
+CHUNK_SIZE = 50000
+
+DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def iter_file_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield the analyzed columns of a CSV, Parquet or Arrow results file as DataFrame chunks.
+
+    Parquet and Arrow files are memory-mapped and only the analyzed columns are read.
+    """
+    if not path.lower().endswith(COLUMNAR_EXTENSIONS):
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=lambda name: name in ANALYZED_COLUMNS)
+        return
+
+    import pyarrow as pa
+    if file_format(path) == 'arrow':
+        reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+        columns = [name for name in ANALYZED_COLUMNS if name in reader.schema.names]
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).select(columns).to_pandas()
+    else:
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        columns = [name for name in ANALYZED_COLUMNS if name in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+
+def iter_db_chunks(db_path, run_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield posts from the SQLite store as DataFrame chunks.
+
+    Every post is stored once no matter how many crawls saw it, and content length is
+    computed by SQLite so the post bodies are never loaded.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        query = 'SELECT p.title, p.score, p.num_comments, p.created_utc, length(p.content) AS content_length FROM posts p'
+        params = ()
+        if run_id:
+            query += ' JOIN run_posts rp ON rp.post_id = p.id WHERE rp.run_id = ?'
+            params = (run_id,)
+        yield from pd.read_sql_query(query, conn, params=params, chunksize=chunk_size)
+    finally:
+        conn.close()
+
+class PostStats:
+    """
+    Statistics of crawled posts accumulated chunk by chunk in bounded memory.
+
+    Counts, means, maxima, day-of-week counts and correlations are exact; medians and
+    histograms come from quantile sketches.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = set()
+        self.sketches = {name: QuantileSketch() for name in ('score', 'num_comments', 'content_length')}
+        self.largest = {}
+        self.day_counts = np.zeros(7, dtype=np.int64)
+        self.correlation = CorrelationAccumulator(['score', 'num_comments', 'content_length'])
+
+    def update(self, df):
+        """
+        Add one chunk of posts.
+        """
+        if 'content' in df.columns:
+            df = df.assign(content_length=df['content'].astype(str).str.len()).drop(columns=['content'])
+        self.rows += len(df)
+        self.columns.update(df.columns)
+        if 'content_length' in df.columns:
+            self.columns.add('content')
+
+        for name, sketch in self.sketches.items():
+            if name not in df.columns:
+                continue
+            values = pd.to_numeric(df[name], errors='coerce')
+            sketch.update(values.to_numpy(dtype=float))
+            # Keep the title of the largest value seen so far
+            if values.notna().any():
+                index = values.idxmax()
+                if name not in self.largest or values[index] > self.largest[name][0]:
+                    title = df.at[index, 'title'] if 'title' in df.columns else ''
+                    self.largest[name] = (values[index], title)
+
+        if 'created_utc' in df.columns:
+            days = pd.to_datetime(df['created_utc'], errors='coerce').dt.dayofweek.dropna().astype(int)
+            self.day_counts += np.bincount(days, minlength=7)
+
+        if all(name in df.columns for name in self.correlation.columns):
+            self.correlation.update(df[self.correlation.columns].apply(pd.to_numeric, errors='coerce').to_numpy())
+
+def save_histogram(sketch, color, title, xlabel, filename):
+    hist = sketch.histogram(bins=20)
+    edges = hist['edges']
+    plt.figure(figsize=(10, 6))
+    plt.bar(edges[:-1], hist['counts'], width=np.diff(edges), align='edge', alpha=0.7, color=color)
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel('Number of Posts')
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(filename)
+
+def analyze_reddit_data(csv_file, db_path=None, run_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Print statistics and save plots for crawled posts, reading the input in chunks.
+
+    Args:
+        csv_file (str or list): Results file(s) (CSV, Parquet or Arrow) or glob patterns
+        db_path (str, optional): SQLite store to read instead of (or as well as) files
+        run_id (str, optional): Only analyze this run from the SQLite store
+        chunk_size (int, optional): Rows read at a time
+
+    Returns:
+        int: 0 on success, 1 on error
+    """
+    patterns = [csv_file] if isinstance(csv_file, str) else list(csv_file or [])
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            print(f"Error: File '{pattern}' not found.")
+            return 1
+        files.extend(matches)
+    if db_path and not os.path.exists(db_path):
+        print(f"Error: Database '{db_path}' not found.")
         return 1
-    
-    # Load the data
-    print(f"Loading data from {csv_file}...")
+
+    # Stream every source through one set of accumulators
+    stats = PostStats()
     try:
-        df = pd.read_csv(csv_file)
-        print(f"Loaded {len(df)} posts.")
+        for path in files:
+            print(f"Loading data from {path}...")
+            for chunk in iter_file_chunks(path, chunk_size):
+                stats.update(chunk)
+        if db_path:
+            print(f"Loading data from {db_path}" + (f" (run {run_id})..." if run_id else "..."))
+            for chunk in iter_db_chunks(db_path, run_id, chunk_size):
+                stats.update(chunk)
+        print(f"Loaded {stats.rows} posts.")
     except Exception as e:
-        print(f"Error loading CSV file: {e}")
+        print(f"Error loading data: {e}")
         return 1
-    
+
     # Basic statistics
     print("\n=== Basic Statistics ===")
-    print(f"Total posts: {len(df)}")
-    
+    print(f"Total posts: {stats.rows}")
+
     # Check if required columns exist
     required_columns = ['title', 'score', 'num_comments', 'created_utc']
-    missing_columns = [col for col in required_columns if col not in df.columns]
+    missing_columns = [col for col in required_columns if col not in stats.columns]
     if missing_columns:
         print(f"Warning: Missing required columns: {missing_columns}")
         print("Some analyses may not be available.")
-    
+
     # Post scores analysis
-    if 'score' in df.columns:
+    score = stats.sketches['score']
+    if score.count:
         print("\n=== Post Scores Analysis ===")
-        print(f"Average score: {df['score'].mean():.2f}")
-        print(f"Median score: {df['score'].median():.2f}")
-        print(f"Highest score: {df['score'].max()} (Post: '{df.loc[df['score'].idxmax(), 'title']}')")
-        
+        print(f"Average score: {score.mean:.2f}")
+        print(f"Median score: {score.quantile(0.5):.2f}")
+        print(f"Highest score: {stats.largest['score'][0]:g} (Post: '{stats.largest['score'][1]}')")
+
         # Plot score distribution
-        plt.figure(figsize=(10, 6))
-        plt.hist(df['score'], bins=20, alpha=0.7, color='blue')
-        plt.title('Distribution of Post Scores')
-        plt.xlabel('Score')
-        plt.ylabel('Number of Posts')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
         score_plot_file = 'score_distribution.png'
-        plt.savefig(score_plot_file)
+        save_histogram(score, 'blue', 'Distribution of Post Scores', 'Score', score_plot_file)
         print(f"Score distribution plot saved as '{score_plot_file}'")
-    
+
     # Comments analysis
-    if 'num_comments' in df.columns:
+    comments = stats.sketches['num_comments']
+    if comments.count:
         print("\n=== Comments Analysis ===")
-        print(f"Average comments per post: {df['num_comments'].mean():.2f}")
-        print(f"Median comments per post: {df['num_comments'].median():.2f}")
-        print(f"Most commented post: {df['num_comments'].max()} comments (Post: '{df.loc[df['num_comments'].idxmax(), 'title']}')")
-        
+        print(f"Average comments per post: {comments.mean:.2f}")
+        print(f"Median comments per post: {comments.quantile(0.5):.2f}")
+        print(f"Most commented post: {stats.largest['num_comments'][0]:g} comments (Post: '{stats.largest['num_comments'][1]}')")
+
         # Plot comments distribution
-        plt.figure(figsize=(10, 6))
-        plt.hist(df['num_comments'], bins=20, alpha=0.7, color='green')
-        plt.title('Distribution of Comments per Post')
-        plt.xlabel('Number of Comments')
-        plt.ylabel('Number of Posts')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
         comments_plot_file = 'comments_distribution.png'
-        plt.savefig(comments_plot_file)
+        save_histogram(comments, 'green', 'Distribution of Comments per Post', 'Number of Comments', comments_plot_file)
         print(f"Comments distribution plot saved as '{comments_plot_file}'")
-    
+
     # Time analysis
-    if 'created_utc' in df.columns:
+    if 'created_utc' in stats.columns:
         print("\n=== Time Analysis ===")
-        try:
-            # Convert UTC timestamps to datetime objects
-            df['created_datetime'] = pd.to_datetime(df['created_utc'])
-            
-            # Get the day of week for each post
-            df['day_of_week'] = df['created_datetime'].dt.day_name()
-            
-            # Count posts by day of week
-            day_counts = df['day_of_week'].value_counts()
-            
-            # Reorder days of week
-            days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            day_counts = day_counts.reindex(days_order)
-            
-            print("Posts by day of week:")
-            for day, count in day_counts.items():
-                print(f"  {day}: {count}")
-            
-            # Plot posts by day of week
-            plt.figure(figsize=(10, 6))
-            day_counts.plot(kind='bar', color='purple')
-            plt.title('Posts by Day of Week')
-            plt.xlabel('Day of Week')
-            plt.ylabel('Number of Posts')
-            plt.grid(True, alpha=0.3)
-            plt.tight_layout()
-            day_plot_file = 'posts_by_day.png'
-            plt.savefig(day_plot_file)
-            print(f"Posts by day plot saved as '{day_plot_file}'")
-            
-        except Exception as e:
-            print(f"Error in time analysis: {e}")
-    
-    # Content length analysis
-    if 'content' in df.columns:
-        print("\n=== Content Analysis ===")
-        # Calculate content length
-        df['content_length'] = df['content'].astype(str).apply(len)
-        
-        print(f"Average content length: {df['content_length'].mean():.2f} characters")
-        print(f"Median content length: {df['content_length'].median():.2f} characters")
-        print(f"Longest post: {df['content_length'].max()} characters (Post: '{df.loc[df['content_length'].idxmax(), 'title']}')")
-        
-        # Plot content length distribution
+        day_counts = pd.Series(stats.day_counts, index=DAYS_ORDER)
+
+        print("Posts by day of week:")
+        for day, count in day_counts.items():
+            print(f"  {day}: {count}")
+
+        # Plot posts by day of week
         plt.figure(figsize=(10, 6))
-        plt.hist(df['content_length'], bins=20, alpha=0.7, color='orange')
-        plt.title('Distribution of Post Content Length')
-        plt.xlabel('Content Length (characters)')
+        day_counts.plot(kind='bar', color='purple')
+        plt.title('Posts by Day of Week')
+        plt.xlabel('Day of Week')
         plt.ylabel('Number of Posts')
         plt.grid(True, alpha=0.3)
         plt.tight_layout()
+        day_plot_file = 'posts_by_day.png'
+        plt.savefig(day_plot_file)
+        print(f"Posts by day plot saved as '{day_plot_file}'")
+
+    # Content length analysis
+    length = stats.sketches['content_length']
+    if length.count:
+        print("\n=== Content Analysis ===")
+        print(f"Average content length: {length.mean:.2f} characters")
+        print(f"Median content length: {length.quantile(0.5):.2f} characters")
+        print(f"Longest post: {stats.largest['content_length'][0]:g} characters (Post: '{stats.largest['content_length'][1]}')")
+
+        # Plot content length distribution
         length_plot_file = 'content_length_distribution.png'
-        plt.savefig(length_plot_file)
+        save_histogram(length, 'orange', 'Distribution of Post Content Length', 'Content Length (characters)', length_plot_file)
         print(f"Content length distribution plot saved as '{length_plot_file}'")
-    
+
     # Correlation analysis
-    if all(col in df.columns for col in ['score', 'num_comments', 'content_length']):
+    matrix = stats.correlation.correlation()
+    if matrix is not None:
         print("\n=== Correlation Analysis ===")
-        # Calculate correlation between score, comments, and content length
-        correlation = df[['score', 'num_comments', 'content_length']].corr()
+        # Correlation between score, comments, and content length
+        correlation = pd.DataFrame(matrix, index=stats.correlation.columns, columns=stats.correlation.columns)
         print("Correlation matrix:")
         print(correlation)
-        
+
         # Plot correlation heatmap
         plt.figure(figsize=(8, 6))
         plt.imshow(correlation, cmap='coolwarm', interpolation='none', vmin=-1, vmax=1)
         plt.colorbar()
         plt.xticks(range(len(correlation)), correlation.columns, rotation=45)
         plt.yticks(range(len(correlation)), correlation.columns)
-        
+
         # Add correlation values to the heatmap
         for i in range(len(correlation)):
             for j in range(len(correlation)):
-                plt.text(j, i, f"{correlation.iloc[i, j]:.2f}", 
+                plt.text(j, i, f"{correlation.iloc[i, j]:.2f}",
                          ha="center", va="center", color="white" if abs(correlation.iloc[i, j]) > 0.5 else "black")
-        
+
         plt.title('Correlation Between Post Metrics')
         plt.tight_layout()
         corr_plot_file = 'correlation_heatmap.png'
         plt.savefig(corr_plot_file)
         print(f"Correlation heatmap saved as '{corr_plot_file}'")
-    
+
     print("\nAnalysis complete! Check the current directory for generated plots.")
     return 0
 
 def main():
     # Default file name
     default_file = 'legaladvice_classaction_matches.csv'
-    
-    # Get file name from command line argument or use default
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
-    else:
-        csv_file = default_file
+
+    parser = argparse.ArgumentParser(description='Statistics and plots for crawled Reddit posts')
+    parser.add_argument('files', nargs='*',
+                        help='Results files or glob patterns (CSV, Parquet or Arrow), e.g. "crawls/*.parquet"')
+    parser.add_argument('--db', help='Analyze the posts in this SQLite store')
+    parser.add_argument('--run', help='With --db, only analyze this run')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Rows read at a time (default: {CHUNK_SIZE})')
+    args = parser.parse_args()
+
+    # Use the default file when no input is given
+    files = args.files
+    if not files and not args.db:
+        files = [default_file]
         print(f"No file specified, using default: {default_file}")
-    
-    return analyze_reddit_data(csv_file)
+
+    return analyze_reddit_data(files, db_path=args.db, run_id=args.run, chunk_size=args.chunk_size)
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
@@ -1,22 +1,22 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_file, session
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, Response, stream_with_context
 import requests
+from urllib.parse import quote
+from werkzeug.utils import secure_filename
 import os
-import pandas as pd
-import threading
 import time
-import io
-import csv
 import json
-import uuid
 import datetime
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import numpy as np
-import sqlite3
-from db import get_connection, init_db
-from run_crawler import main as run_crawler_main
-from ollama_summarizer import summarize_text
+from db import init_db, save_run, save_crawl_state, get_run, get_runs, get_run_results, iter_run_results
+from export import iter_csv, iter_ndjson, encode_chunks, gzip_chunks
+from job_queue import WorkerPool, enqueue_job, get_job, get_job_results, update_job_progress, add_job_result
+from scoring import rank_posts, CLASS_ACTION_THRESHOLD, CLASS_ACTION_KEYWORDS
+from reddit_crawler import CrawlConfig, run_crawl, run_crawls, parse_subreddits
+from ollama_summarizer import summarize_text, generate_cached, stream_cached, summarize_map_reduce, stream_map_reduce, OllamaError, CONNECTION_ERROR_MESSAGE
+from summary_cache import cache_stats
+from charts import chart_data_from_stats, get_charts
+from run_stats import get_run_stats, refresh_run_stats
+from clustering import update_clusters, get_post_clusters, get_run_clusters, get_cluster, save_cluster_summary
+from search import search_posts, keyword_query
 
 
 app = Flask(__name__)
@@ -29,25 +29,42 @@ if os.environ.get('FLASK_ENV') == 'production':
     app.config['SESSION_COOKIE_HTTPONLY'] = True
     app.config['PREFERRED_URL_SCHEME'] = 'https'
 
-# Global variable to store crawler results
-crawler_results = []
-crawler_running = False
-crawler_complete = False
-current_run_id = None
+# How often the progress stream checks the job for changes, and how long one
+# stream stays open before the browser reconnects (EventSource does this itself)
+EVENTS_POLL_INTERVAL = 0.5
+EVENTS_MAX_SECONDS = 300
+
+# Model used by /summarize and /summarize-all
+SUMMARY_MODEL = os.environ.get('SUMMARY_MODEL', 'gemma3')
+
+# Comment trees fetched concurrently within one crawl job
+CRAWL_FETCH_WORKERS = 4
+
+# Worker processes that summarize posts while the fetch threads keep crawling
+CRAWL_NLP_PROCESSES = 2
+
+# Page sizes for run history and run results
+RUNS_PER_PAGE = 10
+RESULTS_PER_PAGE = 50
+SEARCH_RESULTS_PER_PAGE = 20
 
 # Initialize database
 init_db()
 
 @app.route('/')
 def index():
-    # Get previous crawler runs from database
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM crawler_runs ORDER BY timestamp DESC LIMIT 10')
-    previous_runs = cur.fetchall()
-    conn.close()
-    
-    return render_template('index.html', previous_runs=previous_runs)
+    # Get previous crawler runs from database, paging back through history by (timestamp, id)
+    before = None
+    if request.args.get('before_ts') and request.args.get('before_id'):
+        before = (request.args['before_ts'], request.args['before_id'])
+    previous_runs = get_runs(before, RUNS_PER_PAGE)
+    
+    older = None
+    if len(previous_runs) == RUNS_PER_PAGE:
+        older = {'before_ts': previous_runs[-1]['timestamp'], 'before_id': previous_runs[-1]['id']}
+    
+    return render_template('index.html', previous_runs=previous_runs, older=older,
+                           class_action_query=keyword_query(CLASS_ACTION_KEYWORDS))
 
 @app.route('/ollama-summarize', methods=['POST'])
 def ollama_summarize():
@@ -85,6 +102,7 @@ def summarize():
     
     Expects JSON with:
     - text: The text to summarize
+    - stream (optional): If true, relay the summary as plain text while it is generated
     
     Returns JSON with:
     - summary: The generated summary
@@ -97,38 +115,18 @@ def summarize():
         
         text = data['text']
         
-        # Prepare the request to Ollama
-        url = "http://localhost:11434/api/generate"
-        prompt = f"Summarize this: {text}"
+        if data.get('stream'):
+            return relay_tokens(stream_cached("Summarize this: {text}", text, SUMMARY_MODEL))
         
-        payload = {
-            "model": "gemma3",
-            "prompt": prompt
-        }
-        
-        # Send the request and handle streaming response
-        response = requests.post(url, json=payload, stream=True)
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            return jsonify({'summary': f'Error: Ollama returned status code {response.status_code}'}), 500
-        
-        # Process the streaming response
-        summary = ""
-        for line in response.iter_lines():
-            if line:
-                # Parse the JSON response
-                try:
-                    json_response = json.loads(line.decode('utf-8'))
-                    if 'response' in json_response:
-                        summary += json_response['response']
-                except json.JSONDecodeError:
-                    continue
+        # Send the request through the shared Ollama client
+        summary = generate_cached("Summarize this: {text}", text, SUMMARY_MODEL)
         
         return jsonify({'summary': summary})
     
+    except OllamaError as e:
+        return jsonify({'summary': f'Error: {e}'}), 500
     except requests.exceptions.ConnectionError:
-        return jsonify({'summary': 'Error: Could not connect to Ollama. Make sure it is running on localhost:11434.'}), 503
+        return jsonify({'summary': CONNECTION_ERROR_MESSAGE}), 503
     except Exception as e:
         return jsonify({'summary': f'Error: An unexpected error occurred: {str(e)}'}), 500
 
@@ -136,6 +134,9 @@ def summarize():
 def summarize_all():
     """
     API endpoint to summarize all posts from the current or specified run.
+    
+    With "stream": true in the JSON body the final summary is relayed as plain text
+    while it is generated.
     """
     try:
         data = request.get_json()
@@ -143,433 +144,504 @@ def summarize_all():
         
         # If no run_id provided, use current run
         if not run_id:
-            run_id = current_run_id
+            run_id = current_run_id()
         
-        # Get posts from database
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM crawler_results WHERE run_id = ?', (run_id,))
-        results_data = cur.fetchall()
-        conn.close()
+        # Get posts from database; only the columns used for the prompt
+        results_data = get_run_results(run_id, columns=['title', 'summary'], include_comments=False)
         
         if not results_data:
             return jsonify({'summary': 'Error: No posts found to summarize'}), 400
         
+        # Near-duplicate posts are sent once per cluster, with the number of posts it stands for
+        clusters = get_post_clusters([row['id'] for row in results_data])
+        cluster_rows = {}
+        for row in results_data:
+            key = clusters[row['id']]['cluster_id'] if row['id'] in clusters else row['id']
+            cluster_rows.setdefault(key, []).append(row)
+        
         # Extract content from posts
         post_contents = []
-        for row in results_data:
+        for rows in cluster_rows.values():
+            row = rows[0]
             # Use summary if available, otherwise use title
             content = row['summary'] if row['summary'] else row['title']
             if content and content.strip():
+                if len(rows) > 1:
+                    content = f"[{len(rows)} similar posts] {content}"
                 post_contents.append(content)
         
         if not post_contents:
             return jsonify({'summary': 'Error: No content found in posts to summarize'}), 400
         
-        # Concatenate all post contents
-        full_text = "\n\n---\n\n".join(post_contents)
-        
-        # Prepare the request to Ollama
-        url = "http://localhost:11434/api/generate"
-        prompt = f"Provide a high-level summary of the key themes and common issues from the following Reddit posts:\n\n{full_text}"
+        # One prompt when everything fits the model's budget; otherwise chunks are
+        # summarized in parallel and the partial summaries reduced into the answer
+        prompt = "Provide a high-level summary of the key themes and common issues from the following Reddit posts:\n\n{text}"
+        if data and data.get('stream'):
+            return relay_tokens(stream_map_reduce(post_contents, prompt, SUMMARY_MODEL))
+        summary = summarize_map_reduce(post_contents, prompt, SUMMARY_MODEL)
         
-        payload = {
-            "model": "gemma3",
-            "prompt": prompt
-        }
-        
-        # Send the request and handle streaming response
-        response = requests.post(url, json=payload, stream=True)
+        return jsonify({'summary': summary})
+    
+    except OllamaError as e:
+        return jsonify({'summary': f'Error: {e}'}), 500
+    except requests.exceptions.ConnectionError:
+        return jsonify({'summary': CONNECTION_ERROR_MESSAGE}), 503
+    except Exception as e:
+        return jsonify({'summary': f'Error: An unexpected error occurred: {str(e)}'}), 500
+
+@app.route('/summarize-cluster', methods=['POST'])
+def summarize_cluster():
+    """
+    API endpoint to summarize the shared grievance of a cluster of near-duplicate posts.
+    
+    Expects JSON with:
+    - cluster_id: The cluster to summarize
+    
+    The summary is generated once and stored with the cluster until new posts join it.
+    
+    Returns JSON with:
+    - summary: The cluster summary
+    - size: Number of posts in the cluster
+    """
+    try:
+        data = request.get_json()
+        if not data or 'cluster_id' not in data:
+            return jsonify({'summary': 'Error: Missing required parameter: cluster_id'}), 400
         
-        # Check if the request was successful
-        if response.status_code != 200:
-            return jsonify({'summary': f'Error: Ollama returned status code {response.status_code}'}), 500
+        cluster = get_cluster(data['cluster_id'])
+        if not cluster:
+            return jsonify({'summary': 'Error: Cluster not found'}), 404
         
-        # Process the streaming response
-        summary = ""
-        for line in response.iter_lines():
-            if line:
-                # Parse the JSON response
-                try:
-                    json_response = json.loads(line.decode('utf-8'))
-                    if 'response' in json_response:
-                        summary += json_response['response']
-                except json.JSONDecodeError:
-                    continue
+        if not cluster['summary']:
+            post_contents = [post['summary'] or post['title'] for post in cluster['posts']]
+            prompt = ("The following Reddit posts appear to describe the same grievance. Summarize the shared complaint, "
+                      "the company or product involved and what the posters experienced:\n\n{text}")
+            cluster['summary'] = summarize_map_reduce(post_contents, prompt, SUMMARY_MODEL)
+            save_cluster_summary(cluster['id'], cluster['summary'])
         
-        return jsonify({'summary': summary})
+        return jsonify({'summary': cluster['summary'], 'size': cluster['size']})
     
+    except OllamaError as e:
+        return jsonify({'summary': f'Error: {e}'}), 500
     except requests.exceptions.ConnectionError:
-        return jsonify({'summary': 'Error: Could not connect to Ollama. Make sure it is running on localhost:11434.'}), 503
+        return jsonify({'summary': CONNECTION_ERROR_MESSAGE}), 503
     except Exception as e:
         return jsonify({'summary': f'Error: An unexpected error occurred: {str(e)}'}), 500
 
-@app.route('/run-crawler', methods=['POST'])
-def run_crawler():
-    global crawler_results, crawler_running, crawler_complete, current_run_id
-    
-    # Reset state
-    crawler_results = []
-    crawler_running = True
-    crawler_complete = False
+def relay_tokens(tokens):
+    """
+    Relay a token generator to the client as a chunked plain-text response.
     
-    # Generate a unique ID for this run
-    current_run_id = str(uuid.uuid4())
+    The first token is awaited before the response starts, so a failure to reach Ollama
+    still raises in the view and gets a proper status code. Errors after that are appended
+    to the text. When the client disconnects the generator is closed, which closes the
+    connection to Ollama and stops the generation.
+    """
+    first = next(tokens, '')
     
+    def generate():
+        try:
+            yield first
+            for token in tokens:
+                yield token
+        except OllamaError as e:
+            yield f"\n\nError: {e}"
+        except requests.exceptions.RequestException:
+            yield f"\n\n{CONNECTION_ERROR_MESSAGE}"
+        finally:
+            tokens.close()
+    
+    return Response(stream_with_context(generate()), mimetype='text/plain',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/cache-stats')
+def summary_cache_stats():
+    """
+    Summary cache hit/miss counters for this process and the size of the cache.
+    """
+    return jsonify(cache_stats())
+
+@app.route('/run-crawler', methods=['POST'])
+def run_crawler():
     # Get parameters from form
     subreddit = request.form.get('subreddit', 'legaladvice')
     posts = int(request.form.get('posts', 20))
     keyword = request.form.get('keyword', '')
+    incremental = request.form.get('incremental') == 'on'
+    
+    # Queue the crawl; the job id is also the id of the run it produces
+    run_id = enqueue_job({
+        'subreddit': subreddit,
+        'posts': posts,
+        'keyword': keyword,
+        'incremental': incremental,
+    })
+    worker_pool.notify()
     
     # Store run information in session for later use
     session['current_run'] = {
-        'id': current_run_id,
+        'id': run_id,
         'subreddit': subreddit,
         'posts': posts,
         'keyword': keyword,
         'timestamp': datetime.datetime.now().isoformat()
     }
     
-    # Start crawler in a background thread
-    thread = threading.Thread(target=run_crawler_thread, args=(subreddit, posts, keyword, current_run_id))
-    thread.daemon = True
-    thread.start()
-    
-    return redirect(url_for('results'))
+    return redirect(url_for('results', run_id=run_id))
 
-def run_crawler_thread(subreddit, posts, keyword, run_id):
-    global crawler_results, crawler_running, crawler_complete
+def run_crawler_job(job):
+    """
+    Run one queued crawl job and save its results as a run. Called by the worker pool.
+    """
+    params = job['params']
+    run_id = job['id']
+    
+    # "legaladvice, antiwork:50" crawls both subreddits as one run, each with its own limit
+    configs = [
+        CrawlConfig(
+            subreddit=subreddit,
+            post_limit=post_limit,
+            comment_limit=5,
+            days_limit=30,
+            filter_keywords=[params['keyword']] if params['keyword'] else None,
+            workers=CRAWL_FETCH_WORKERS,
+            nlp_processes=CRAWL_NLP_PROCESSES,
+            incremental=params.get('incremental', False),
+        )
+        for subreddit, post_limit in parse_subreddits(params['subreddit'], params['posts'])
+    ]
+    
+    # Write progress to the queue at most once a second; the last counts are written
+    # once the crawl is over, so a finished job never shows throttled ones
+    last_report = [0.0]
+    latest = []
+    def report_progress(posts_processed, matches_found):
+        latest[:] = [posts_processed, matches_found]
+        if time.monotonic() - last_report[0] >= 1.0:
+            last_report[0] = time.monotonic()
+            update_job_progress(run_id, posts_processed, matches_found)
+    
+    # Matched posts are recorded as they arrive so the results page can show them live
+    on_result = lambda post: add_job_result(run_id, post)
+    marks = []
+    if len(configs) == 1:
+        posts_data = run_crawl(configs[0], progress=report_progress, on_result=on_result, marks=marks)
+    else:
+        posts_data = run_crawls(configs, progress=report_progress, on_result=on_result, marks=marks)
+    if latest:
+        update_job_progress(run_id, *latest)
     
-    # Prepare arguments for the crawler
-    import sys
-    original_argv = sys.argv.copy()
+    # Results pages list the most likely class actions first
+    posts_data = rank_posts(posts_data)
     
-    # Build command line arguments
-    sys.argv = ['run_crawler.py', '--subreddit', subreddit, '--posts', str(posts), '--print-only']
+    # Save the run and its posts to the database; posts seen by earlier runs are updated in place
+    save_run(run_id, datetime.datetime.now().isoformat(), '+'.join(config.subreddit for config in configs),
+             sum(config.post_limit for config in configs), params['keyword'], posts_data)
     
-    # Add keyword if provided
-    if keyword:
-        sys.argv.extend(['--keyword', keyword])
+    # Incremental crawls only move their high-water marks once the posts are stored
+    for mark in marks:
+        save_crawl_state(*mark)
     
-    try:
-        # Redirect stdout to capture output
-        import io
-        from contextlib import redirect_stdout
-        
-        f = io.StringIO()
-        with redirect_stdout(f):
-            # Import and run the crawler
-            from reddit_crawler import crawl_reddit, print_summarized_posts
-            
-            # Define keywords based on input
-            filter_keywords = [keyword] if keyword else None
-            
-            # Run the crawler and get results
-            posts_data = crawl_reddit(subreddit, posts, 5, 30, filter_keywords)
-            
-            # Store results in global variable
-            crawler_results = posts_data
-            
-            # Save results to database
-            conn = get_connection()
-            cur = conn.cursor()
-            
-            # First, save the run information
-            cur.execute(
-                'INSERT INTO crawler_runs (id, timestamp, subreddit, posts_count, keyword, results_count) VALUES (?, ?, ?, ?, ?, ?)',
-                (run_id, datetime.datetime.now().isoformat(), subreddit, posts, keyword, len(posts_data))
-            )
-            
-            # Then save each result
-            for post in posts_data:
-                # Convert top_comments to JSON string if present
-                top_comments_json = None
-                if 'top_comments' in post and post['top_comments']:
-                    top_comments_json = json.dumps(post['top_comments'])
-                
-                cur.execute(
-                    'INSERT INTO crawler_results (run_id, title, url, score, author, created_utc, num_comments, summary, top_comments) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                    (run_id, post['title'], post['permalink'], post['score'], post['author'], post['created_utc'], 
-                     post['num_comments'], post.get('summary', ''), top_comments_json)
-                )
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-    except Exception as e:
-        print(f"Error running crawler: {e}")
-    finally:
-        # Restore original argv
-        sys.argv = original_argv
-        crawler_running = False
-        crawler_complete = True
+    # Group the new posts with earlier near-duplicates so repeated grievances surface
+    update_clusters(posts_data)
+    
+    # Dashboards read these aggregates instead of scanning the run's posts
+    refresh_run_stats(run_id)
+    return len(posts_data)
+
+# Crawl jobs are queued in SQLite and run by a small pool of threads in each web process
+worker_pool = WorkerPool(run_crawler_job)
+
+@app.before_request
+def start_worker_pool():
+    # Started on the first request rather than at import, so it runs inside each
+    # gunicorn worker after the fork. Tests drive the queue themselves.
+    if not app.testing:
+        worker_pool.start()
+
+def current_run_id():
+    return session.get('current_run', {}).get('id')
 
 @app.route('/results')
 def results():
-    run_id = request.args.get('run_id', current_run_id)
-    
-    # If a specific run_id is provided, load results from database
-    if run_id and run_id != current_run_id:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM crawler_runs WHERE id = ?', (run_id,))
-        run_info = cur.fetchone()
-        
-        if not run_info:
-            conn.close()
-            return redirect(url_for('index'))
-        
-        cur.execute('SELECT * FROM crawler_results WHERE run_id = ?', (run_id,))
-        results_data = cur.fetchall()
-        conn.close()
-        
-        # Convert database rows to dictionaries
-        results_list = []
-        for row in results_data:
-            # Parse top_comments JSON if available
-            top_comments = []
-            try:
-                if row['top_comments']:
-                    top_comments = json.loads(row['top_comments'])
-            except (json.JSONDecodeError, TypeError):
-                pass
-            
-            results_list.append({
-                'title': row['title'],
-                'permalink': row['url'],
-                'score': row['score'],
-                'author': row['author'],
-                'created_utc': row['created_utc'],
-                'num_comments': row['num_comments'],
-                'summary': row['summary'],
-                'top_comments': top_comments
-            })
-        
+    run_id = request.args.get('run_id') or current_run_id()
+    
+    if not run_id:
+        # Nothing crawled yet in this session
         return render_template('results.html',
                               crawler_running=False,
-                              crawler_complete=True,
-                              results=results_list,
+                              crawler_complete=False,
+                              results=[],
+                              is_cached=False)
+    
+    # A queued or running job has no stored run yet
+    job = get_job(run_id)
+    if job and job['state'] in ('queued', 'running'):
+        return render_template('results.html',
+                              crawler_running=True,
+                              crawler_complete=False,
+                              results=[],
                               run_id=run_id,
-                              subreddit=run_info['subreddit'],
-                              keyword=run_info['keyword'],
-                              timestamp=run_info['timestamp'],
-                              is_cached=True)
-    else:
-        # Use current results
-        return render_template('results.html', 
-                              crawler_running=crawler_running,
-                              crawler_complete=crawler_complete,
-                              results=crawler_results,
-                              subreddit=session.get('current_run', {}).get('subreddit', ''),
-                              keyword=session.get('current_run', {}).get('keyword', ''),
+                              job=job,
+                              subreddit=job['params']['subreddit'],
+                              keyword=job['params']['keyword'],
                               is_cached=False)
+    
+    # Load results from database
+    run_info = get_run(run_id)
+    
+    if not run_info:
+        if job and job['state'] == 'failed':
+            return render_template('results.html',
+                                  crawler_running=False,
+                                  crawler_complete=True,
+                                  results=[],
+                                  run_id=run_id,
+                                  job=job,
+                                  subreddit=job['params']['subreddit'],
+                                  keyword=job['params']['keyword'],
+                                  is_cached=False)
+        return redirect(url_for('index'))
+    
+    # Show one page at a time, keyed on the position of the last post shown
+    after = request.args.get('after', type=int)
+    results_list = get_run_results(run_id, comment_limit=3, after=after, limit=RESULTS_PER_PAGE)
+    next_after = results_list[-1]['position'] if len(results_list) == RESULTS_PER_PAGE else None
+    
+    # Posts that belong to a cluster link to the other posts with the same grievance
+    post_clusters = get_post_clusters([post['id'] for post in results_list])
+    for post in results_list:
+        post.update(post_clusters.get(post['id'], {}))
+    
+    return render_template('results.html',
+                          crawler_running=False,
+                          crawler_complete=True,
+                          results=results_list,
+                          result_count=run_info['results_count'],
+                          next_after=next_after,
+                          run_id=run_id,
+                          subreddit=run_info['subreddit'],
+                          keyword=run_info['keyword'],
+                          timestamp=run_info['timestamp'],
+                          class_action_threshold=CLASS_ACTION_THRESHOLD,
+                          clusters=get_run_clusters(run_id),
+                          is_cached=True)
+
+@app.route('/api/results/<run_id>')
+def api_results(run_id):
+    """
+    JSON API for the results of a stored run, paged by position.
+    
+    Query parameters:
+    - after: position of the last post on the previous page
+    - limit: page size (default 50, at most 500)
+    - fields: comma-separated result columns to return
+    - comments: set to 0 to leave out top comments
+    
+    Returns JSON with:
+    - results: the posts on this page
+    - next_after: cursor for the next page, or null on the last page
+    """
+    if not get_run(run_id):
+        return jsonify({'error': 'Unknown run id'}), 404
+    
+    limit = max(1, min(request.args.get('limit', RESULTS_PER_PAGE, type=int), 500))
+    fields = request.args.get('fields')
+    columns = fields.split(',') if fields else None
+    include_comments = request.args.get('comments', '1') != '0'
+    
+    results_list = get_run_results(run_id, columns=columns, include_comments=include_comments,
+                                   after=request.args.get('after', type=int), limit=limit)
+    next_after = results_list[-1]['position'] if len(results_list) == limit else None
+    
+    return jsonify({'results': results_list, 'next_after': next_after})
+
+def run_search():
+    # Search parameters shared by /search and /api/search
+    return search_posts(request.args.get('q', ''),
+                        page=request.args.get('page', 1, type=int),
+                        per_page=SEARCH_RESULTS_PER_PAGE,
+                        run_id=request.args.get('run_id') or None,
+                        subreddit=request.args.get('subreddit') or None)
+
+@app.route('/search')
+def search():
+    """
+    Search every stored post and comment, across all runs.
+    """
+    found = run_search()
+    return render_template('search.html',
+                          query=request.args.get('q', ''),
+                          subreddit=request.args.get('subreddit', ''),
+                          run_id=request.args.get('run_id', ''),
+                          results=found['results'],
+                          page=found['page'],
+                          has_more=found['has_more'])
+
+@app.route('/api/search')
+def api_search():
+    """
+    JSON API for full-text search over stored posts and comments.
+    
+    Query parameters:
+    - q: words, "quoted phrases" and OR
+    - page: page number, starting at 1
+    - subreddit, run_id: only search these posts
+    
+    Returns JSON with:
+    - results: the posts on this page, best match first, each with an HTML snippet
+    - page, has_more: the page shown and whether there is a next one
+    """
+    return jsonify(run_search())
 
 @app.route('/status')
-def status():
+@app.route('/status/<job_id>')
+def status(job_id=None):
+    """
+    Progress of a crawl job, by default the one last started in this session.
+    """
+    job = get_job(job_id or current_run_id() or '')
+    if not job:
+        return jsonify({'error': 'Unknown job id'}), 404
+    
     return jsonify({
-        'running': crawler_running,
-        'complete': crawler_complete,
-        'result_count': len(crawler_results)
+        'job_id': job['id'],
+        'state': job['state'],
+        'running': job['state'] in ('queued', 'running'),
+        'complete': job['state'] in ('complete', 'failed'),
+        'posts_processed': job['posts_processed'],
+        'matches_found': job['matches_found'],
+        'result_count': job['results_count'] or 0,
+        'error': job['error']
     })
 
+@app.route('/events/<job_id>')
+def events(job_id):
+    """
+    Server-Sent Events stream of a crawl job.
+    
+    Sends 'progress' events when the job's counters change, a 'result' event for each
+    matched post as the crawler produces it, and a final 'done' event. Reconnecting
+    browsers send Last-Event-ID, so results already delivered are not repeated.
+    """
+    if not get_job(job_id):
+        return jsonify({'error': 'Unknown job id'}), 404
+    
+    last_result_id = request.headers.get('Last-Event-ID', 0, type=int)
+    
+    def stream():
+        nonlocal last_result_id
+        last_progress = None
+        deadline = time.monotonic() + EVENTS_MAX_SECONDS
+        while time.monotonic() < deadline:
+            job = get_job(job_id)
+            if not job:
+                # Deleted while streaming; there is nothing left to wait for
+                return
+            
+            for row in get_job_results(job_id, last_result_id):
+                last_result_id = row['id']
+                yield f"id: {row['id']}\nevent: result\ndata: {row['post']}\n\n"
+            
+            progress = {
+                'state': job['state'],
+                'posts_processed': job['posts_processed'],
+                'matches_found': job['matches_found'],
+            }
+            if progress != last_progress:
+                last_progress = progress
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+            
+            if job['state'] in ('complete', 'failed'):
+                yield f"event: done\ndata: {json.dumps({'state': job['state'], 'error': job['error']})}\n\n"
+                return
+            
+            time.sleep(EVENTS_POLL_INTERVAL)
+        
+        # Ask the browser to reconnect shortly; this frees the worker thread now and then
+        yield "retry: 1000\n\n"
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/visualize/<run_id>')
 def visualize(run_id):
     # Get run info and results from database
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM crawler_runs WHERE id = ?', (run_id,))
-    run_info = cur.fetchone()
+    run_info = get_run(run_id)
     
     if not run_info:
-        conn.close()
         return redirect(url_for('index'))
     
-    cur.execute('SELECT * FROM crawler_results WHERE run_id = ?', (run_id,))
-    results_data = cur.fetchall()
-    cur.close()
-    conn.close()
+    # Aggregates are computed when the run is saved, so the posts are not scanned here
+    stats = get_run_stats(run_id)
     
-    # Convert database rows to dictionaries
-    results_list = []
-    for row in results_data:
-        # Parse top_comments JSON if available
-        top_comments = []
-        try:
-            if row['top_comments']:
-                top_comments = json.loads(row['top_comments'])
-        except (json.JSONDecodeError, TypeError):
-            pass
-        
-        results_list.append({
-            'title': row['title'],
-            'permalink': row['url'],
-            'score': row['score'],
-            'author': row['author'],
-            'created_utc': row['created_utc'],
-            'num_comments': row['num_comments'],
-            'summary': row['summary'],
-            'top_comments': top_comments
-        })
-    
-    # Generate visualizations
-    charts = generate_visualizations(results_list, run_info)
+    # Drawn once per run and reused until the run's data changes
+    charts = get_charts(run_id, chart_data_from_stats(stats))
     
     return render_template('visualize.html',
                           run_info=run_info,
                           charts=charts,
-                          result_count=len(results_list))
-
-def generate_visualizations(results, run_info):
-    charts = {}
-    
-    # Only generate charts if we have results
-    if not results:
-        return charts
-    
-    # 1. Score Distribution
-    plt.figure(figsize=(10, 6))
-    scores = [post['score'] for post in results]
-    plt.hist(scores, bins=10, alpha=0.7, color='blue')
-    plt.title('Distribution of Post Scores')
-    plt.xlabel('Score')
-    plt.ylabel('Number of Posts')
-    plt.grid(True, alpha=0.3)
-    
-    # Save to a bytes buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    charts['score_distribution'] = base64_encode_image(buf)
-    plt.close()
-    
-    # 2. Comments Distribution
-    plt.figure(figsize=(10, 6))
-    comments = [post['num_comments'] for post in results]
-    plt.hist(comments, bins=10, alpha=0.7, color='green')
-    plt.title('Distribution of Comments per Post')
-    plt.xlabel('Number of Comments')
-    plt.ylabel('Number of Posts')
-    plt.grid(True, alpha=0.3)
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    charts['comments_distribution'] = base64_encode_image(buf)
-    plt.close()
-    
-    # 3. Top Posts by Score
-    plt.figure(figsize=(12, 8))
-    top_posts = sorted(results, key=lambda x: x['score'], reverse=True)[:10]
-    titles = [post['title'][:30] + '...' if len(post['title']) > 30 else post['title'] for post in top_posts]
-    scores = [post['score'] for post in top_posts]
-    
-    y_pos = np.arange(len(titles))
-    plt.barh(y_pos, scores, align='center', alpha=0.7, color='purple')
-    plt.yticks(y_pos, titles)
-    plt.xlabel('Score')
-    plt.title('Top Posts by Score')
-    plt.tight_layout()
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    charts['top_posts'] = base64_encode_image(buf)
-    plt.close()
-    
-    return charts
-
-def base64_encode_image(image_buffer):
-    import base64
-    return base64.b64encode(image_buffer.getvalue()).decode('utf-8')
+                          stats=stats,
+                          result_count=stats['count'])
+
+@app.route('/api/visualize/<run_id>')
+def api_visualize(run_id):
+    """
+    Chart data of a run (histogram counts and edges, top posts) for drawing in the browser,
+    along with the run's full aggregate stats.
+    """
+    if not get_run(run_id):
+        return jsonify({'error': 'Run not found'}), 404
+    
+    stats = get_run_stats(run_id)
+    return jsonify({'charts': chart_data_from_stats(stats), 'stats': stats})
 
 @app.route('/download-csv')
 def download_csv():
+    """
+    Stream the results of a run as CSV or NDJSON.
+    
+    Query parameters:
+    - run_id: stored run to export (defaults to the run last started in this session)
+    - format: 'csv' (default) or 'ndjson'
+    - gzip: set to 1 to gzip the download
+    """
     run_id = request.args.get('run_id')
-    results_to_download = []
-    subreddit_name = ''
-    
-    if run_id:
-        # Get cached results from database
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM crawler_runs WHERE id = ?', (run_id,))
-        run = cur.fetchone()
-        
-        if run:
-            subreddit_name = run['subreddit']
-            cur.execute('SELECT * FROM crawler_results WHERE run_id = ?', (run_id,))
-            results = cur.fetchall()
-            
-            for result in results:
-                # Get top comments if available
-                top_comments = []
-                try:
-                    if result['top_comments']:
-                        top_comments = json.loads(result['top_comments'])
-                except (json.JSONDecodeError, TypeError):
-                    pass
-                
-                results_to_download.append({
-                    'title': result['title'],
-                    'permalink': result['url'],
-                    'score': result['score'],
-                    'author': result['author'],
-                    'created_utc': result['created_utc'],
-                    'num_comments': result['num_comments'],
-                    'summary': result['summary'],
-                    'top_comments': top_comments
-                })
-        conn.close()
-    else:
-        # Use current results
-        if not crawler_results:
-            return redirect(url_for('results'))
-        
-        results_to_download = crawler_results
-        if 'current_run' in session:
-            subreddit_name = session['current_run'].get('subreddit', '')
-    
-    # Create a CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Title', 'URL', 'Score', 'Author', 'Created', 'Comments', 'Summary', 'Top Comments'])
-    
-    # Write data
-    for post in results_to_download:
-        # Format top comments as a string
-        top_comments_str = ''
-        if 'top_comments' in post and post['top_comments']:
-            if isinstance(post['top_comments'], list):
-                if isinstance(post['top_comments'][0], str):
-                    top_comments_str = '\n'.join(post['top_comments'])
-                elif isinstance(post['top_comments'][0], dict):
-                    comments_formatted = [f"u/{c.get('author', 'unknown')} (Score: {c.get('score', 0)}): {c.get('body', '')}" 
-                                         for c in post['top_comments'][:3]]
-                    top_comments_str = '\n'.join(comments_formatted)
-        
-        writer.writerow([
-            post['title'],
-            post.get('permalink', ''),
-            post['score'],
-            post['author'],
-            post.get('created_utc', ''),
-            post['num_comments'],
-            post.get('summary', ''),
-            top_comments_str
-        ])
+    export_format = request.args.get('format', 'csv')
+    compress = request.args.get('gzip') == '1'
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': f'Unsupported format: {export_format}'}), 400
+    
+    # Read stored results page by page so memory use does not grow with the run
+    run = get_run(run_id or current_run_id() or '')
+    
+    if not run:
+        return redirect(url_for('results'))
+    
+    subreddit_name = run['subreddit']
+    # The CSV only includes the first three comments of each post
+    results_to_download = iter_run_results(run['id'], comment_limit=3 if export_format == 'csv' else None)
+    
+    lines = iter_csv(results_to_download) if export_format == 'csv' else iter_ndjson(results_to_download)
+    chunks = encode_chunks(lines)
+    if compress:
+        chunks = gzip_chunks(chunks)
     
     # Prepare response
-    output.seek(0)
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"reddit_crawler_{subreddit_name}_{timestamp}.csv" if subreddit_name else f"reddit_crawler_results_{timestamp}.csv"
-    
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
+    filename = f"reddit_crawler_{subreddit_name}_{timestamp}.{export_format}" if subreddit_name else f"reddit_crawler_results_{timestamp}.{export_format}"
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    # The subreddit comes from the request, so the name is reduced to safe ASCII for
+    # filename= and percent-encoded in full for filename*= (RFC 5987)
+    fallback = secure_filename(filename) or f"reddit_crawler_results_{timestamp}.{export_format}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"}
     )
 
 if __name__ == '__main__':
@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+import statistics
+import db
+
+def make_posts(run_index, count):
+    posts = []
+    for i in range(count):
+        post_id = f"r{run_index}p{i}"
+        posts.append({
+            'id': post_id,
+            'title': f"Defective product report {post_id}",
+            'permalink': f"https://www.reddit.com/r/legaladvice/comments/{post_id}/report/",
+            'score': i,
+            'author': f"user{i}",
+            'created_utc': '2024-01-01 00:00:00',
+            'num_comments': 1,
+            'content': 'The company refuses to refund a defective product. ' * 10,
+            'summary': 'The company refuses to refund a defective product.',
+            'top_comments': [{'id': f"{post_id}c0", 'author': 'helper', 'score': 3, 'body': 'Same thing happened to me'}],
+        })
+    return posts
+
+def legacy_insert(path, run_id, posts):
+    # The original write path: a fresh connection and one execute per row,
+    # writing the same rows as db.save_run
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO crawler_runs (id, timestamp, subreddit, posts_count, keyword, results_count) VALUES (?, ?, ?, ?, ?, ?)',
+        (run_id, '2024-01-01T00:00:00', 'legaladvice', len(posts), '', len(posts))
+    )
+    for position, post in enumerate(posts):
+        cur.execute(db.UPSERT_POST_SQL, (post['id'], 'legaladvice', post['title'], post['permalink'], post['score'],
+                                         post['author'], post['created_utc'], post['num_comments'], post['content'],
+                                         post['summary'], '2024-01-01T00:00:00', '2024-01-01T00:00:00'))
+        for rank, comment in enumerate(post['top_comments']):
+            cur.execute(db.UPSERT_COMMENT_SQL, (comment['id'], post['id'], rank, comment['author'], comment['score'],
+                                                comment['body'], None))
+        cur.execute('INSERT OR IGNORE INTO run_posts (run_id, post_id, position) VALUES (?, ?, ?)',
+                    (run_id, post['id'], position))
+    conn.commit()
+    conn.close()
+
+RUN_POSTS_QUERY = 'SELECT p.* FROM run_posts rp JOIN posts p ON p.id = rp.post_id WHERE rp.run_id = ? ORDER BY rp.position'
+RUN_COMMENTS_QUERY = 'SELECT c.* FROM comments c JOIN run_posts rp ON rp.post_id = c.post_id WHERE rp.run_id = ?'
+
+def legacy_read(path, run_id):
+    # The original read path: a fresh connection for every request
+    conn = sqlite3.connect(path)
+    conn.execute(RUN_POSTS_QUERY, (run_id,)).fetchall()
+    conn.execute(RUN_COMMENTS_QUERY, (run_id,)).fetchall()
+    conn.close()
+
+def pooled_read(path, run_id):
+    conn = db.get_connection()
+    conn.execute(RUN_POSTS_QUERY, (run_id,)).fetchall()
+    conn.execute(RUN_COMMENTS_QUERY, (run_id,)).fetchall()
+    conn.close()
+
+def read_latencies(read, path, run_id, stop, latencies):
+    # Reader thread running the queries the results page uses
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            read(path, run_id)
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            latencies.append(float('inf'))
+        time.sleep(0.005)
+    db.close_connections()
+
+def run_writes(path, write, total, batch, read=None):
+    """
+    Write `total` posts in runs of `batch`, optionally with a reader thread running.
+
+    Returns the write time and the reader's latencies.
+    """
+    db.DATABASE_PATH = path
+    db.init_db()
+    db.save_run('seed', '2024-01-01T00:00:00', 'legaladvice', 200, '', make_posts('seed', 200))
+    if write is legacy_insert:
+        # Put the database back on the default rollback journal
+        db.get_connection().execute('PRAGMA journal_mode=DELETE')
+    db.close_connections()
+    
+    stop = threading.Event()
+    latencies = []
+    reader = threading.Thread(target=read_latencies, args=(read, path, 'seed', stop, latencies)) if read else None
+    if reader:
+        reader.start()
+    start = time.perf_counter()
+    for run_index in range(total // batch):
+        write(path, f"run{run_index}", make_posts(run_index, batch))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if reader:
+        reader.join()
+    db.close_connections()
+    return elapsed, latencies
+
+def batched_insert(path, run_id, posts):
+    db.save_run(run_id, '2024-01-01T00:00:00', 'legaladvice', len(posts), '', posts)
+
+def describe(latencies):
+    failed = sum(1 for latency in latencies if latency == float('inf'))
+    latencies = sorted(latency for latency in latencies if latency != float('inf'))
+    return (f"{len(latencies)} reads ({failed} locked out), p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+
+def main():
+    """
+    Benchmark insert throughput and concurrent read latency at 100k posts.
+    """
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch = 1000
+    workdir = tempfile.mkdtemp()
+    
+    print(f"Writing {total} posts in runs of {batch}")
+    for name, write in [('Per-row, rollback journal', legacy_insert), ('Batched, WAL', batched_insert)]:
+        elapsed, _ = run_writes(os.path.join(workdir, f"{write.__name__}.db"), write, total, batch)
+        print(f"{name:<26} {total / elapsed:>10.0f} posts/s")
+    
+    print("Reading a 200-post run while the writer is busy")
+    for name, write, read in [('Per-row, rollback journal', legacy_insert, legacy_read),
+                              ('Batched, WAL', batched_insert, pooled_read)]:
+        _, latencies = run_writes(os.path.join(workdir, f"{write.__name__}_reads.db"), write, total, batch, read)
+        print(f"{name:<26} {describe(latencies)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+import sys
+import time
+from test_scoring import make_posts
+from scoring import score_posts
+
+def main():
+    """
+    Benchmark class-action scoring on batches of 1,000 to 100,000 synthetic posts.
+    """
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f"{'posts':>8} {'seconds':>10} {'posts/s':>12}")
+    for size in sizes:
+        posts = make_posts(size)
+        start = time.perf_counter()
+        score_posts(posts)
+        elapsed = time.perf_counter() - start
+        print(f"{size:>8} {elapsed:>10.4f} {size / elapsed:>12.0f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+# Entry points whose startup cost we track
+TARGETS = ['app', 'run_crawler']
+
+# Dependencies that should only be imported by the code paths that need them
+HEAVY_MODULES = ['pandas', 'matplotlib', 'nltk', 'scipy', 'numpy', 'praw', 'pyarrow']
+
+def run_python(args, workdir):
+    # A scratch database, so importing app does not touch the real one
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, 'startup.db'))
+    return subprocess.run([sys.executable] + args, cwd=os.path.dirname(os.path.abspath(__file__)),
+                          env=env, capture_output=True, text=True, check=True)
+
+def import_times(module, workdir):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        tuple: Cumulative import time of the module in seconds, the (self seconds, name)
+        of every module it pulled in, and the heavy modules that ended up loaded
+    """
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = run_python(['-X', 'importtime', '-c', code], workdir)
+
+    total = 0.0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((int(self_us) / 1e6, name.strip()))
+        if name.strip() == module:
+            total = int(cumulative_us) / 1e6
+    heavy = [name for name in result.stdout.strip().split(',') if name]
+    return total, modules, heavy
+
+def main():
+    """
+    Measure import time of the web app and the CLI, and fail if either loads a heavy
+    dependency at import or takes longer than the budget in milliseconds (first argument).
+    """
+    budget = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else None
+    workdir = tempfile.mkdtemp()
+    failed = False
+
+    for module in TARGETS:
+        # Best of three; the first run also warms the bytecode cache
+        runs = [import_times(module, workdir) for _ in range(3)]
+        total, modules, heavy = min(runs, key=lambda run: run[0])
+        print(f"import {module}: {total * 1000:.0f} ms")
+        for seconds, name in sorted(modules, reverse=True)[:5]:
+            print(f"    {seconds * 1000:>7.1f} ms  {name}")
+        if heavy:
+            print(f"    heavy modules loaded at import: {', '.join(heavy)}")
+            failed = True
+        if budget and total > budget:
+            print(f"    over the {budget * 1000:.0f} ms budget")
+            failed = True
+
+    start = time.perf_counter()
+    run_python(['run_crawler.py', '--help'], workdir)
+    print(f"run_crawler.py --help: {(time.perf_counter() - start) * 1000:.0f} ms wall clock")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
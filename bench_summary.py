@@ -0,0 +1,31 @@
+import sys
+import time
+from test_extractive_summarizer import STOP_WORDS, make_sentences, legacy_rank_sentences
+from extractive_summarizer import rank_sentences
+
+def time_call(func, *args, repeat=3):
+    # Best of a few runs to smooth out noise
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    """
+    Benchmark the sparse TextRank engine against the original double loop
+    on synthetic posts of 10 to 500 sentences.
+    """
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 50, 100, 250, 500]
+    print(f"{'sentences':>10} {'legacy (s)':>12} {'sparse (s)':>12} {'speedup':>9}")
+    for size in sizes:
+        sentences = make_sentences(size, seed=size)
+        # The legacy path is quadratic in Python, so only run it once on big inputs
+        legacy = time_call(legacy_rank_sentences, sentences, STOP_WORDS, repeat=1 if size > 100 else 3)
+        fast = time_call(rank_sentences, sentences, STOP_WORDS)
+        print(f"{size:>10} {legacy:>12.4f} {fast:>12.4f} {legacy / fast:>8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import io
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Rendered chart sets kept in memory, one per run
+CHART_CACHE_SIZE = 32
+
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+
+def histogram(values, bins=10):
+    """
+    Bin values with NumPy, the same way matplotlib's hist does.
+
+    Returns:
+        dict: 'counts' per bin and the bin 'edges' (one more than counts)
+    """
+    import numpy as np
+    counts, edges = np.histogram(np.asarray(values, dtype=float), bins=bins)
+    return {'counts': counts.tolist(), 'edges': edges.tolist()}
+
+def chart_data(results, bins=10, top_n=10):
+    """
+    Compute everything the run charts show, as plain JSON-serializable data.
+
+    Args:
+        results (list): Post dicts with at least 'title', 'score' and 'num_comments'
+        bins (int, optional): Histogram bins. Defaults to 10.
+        top_n (int, optional): Posts in the top posts chart. Defaults to 10.
+
+    Returns:
+        dict: 'score_distribution' and 'comments_distribution' histograms and the
+        'top_posts' titles and scores, or an empty dict without results
+    """
+    if not results:
+        return {}
+    top_posts = sorted(results, key=lambda x: x['score'], reverse=True)[:top_n]
+    return {
+        'score_distribution': histogram([post['score'] for post in results], bins),
+        'comments_distribution': histogram([post['num_comments'] for post in results], bins),
+        'top_posts': {
+            'titles': [post['title'][:30] + '...' if len(post['title']) > 30 else post['title'] for post in top_posts],
+            'scores': [post['score'] for post in top_posts],
+        },
+    }
+
+def chart_data_from_stats(stats):
+    """
+    Build chart_data() output from a run's precomputed aggregates (see run_stats).
+    """
+    if not stats or not stats['count']:
+        return {}
+    return {
+        'score_distribution': stats['score']['histogram'],
+        'comments_distribution': stats['num_comments']['histogram'],
+        'top_posts': {
+            'titles': [post['title'][:30] + '...' if len(post['title']) > 30 else post['title'] for post in stats['top_posts']],
+            'scores': [post['score'] for post in stats['top_posts']],
+        },
+    }
+
+def _encode(figure):
+    buf = io.BytesIO()
+    figure.savefig(buf, format='svg')
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+def _histogram_figure(hist, color, title, xlabel):
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=(10, 6))
+    ax = figure.subplots()
+    edges = hist['edges']
+    widths = [right - left for left, right in zip(edges, edges[1:])]
+    ax.bar(edges[:-1], hist['counts'], width=widths, align='edge', alpha=0.7, color=color)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel('Number of Posts')
+    ax.grid(True, alpha=0.3)
+    return figure
+
+def render_charts(data):
+    """
+    Draw the charts from chart_data() as base64-encoded SVG images.
+
+    Uses matplotlib's object-oriented Figure API, so no global pyplot state is shared
+    between request threads.
+
+    Returns:
+        dict: Chart name to base64 SVG
+    """
+    if not data:
+        return {}
+    from matplotlib.figure import Figure
+
+    charts = {
+        'score_distribution': _encode(_histogram_figure(
+            data['score_distribution'], 'blue', 'Distribution of Post Scores', 'Score')),
+        'comments_distribution': _encode(_histogram_figure(
+            data['comments_distribution'], 'green', 'Distribution of Comments per Post', 'Number of Comments')),
+    }
+
+    figure = Figure(figsize=(12, 8))
+    ax = figure.subplots()
+    top_posts = data['top_posts']
+    y_pos = list(range(len(top_posts['titles'])))
+    ax.barh(y_pos, top_posts['scores'], align='center', alpha=0.7, color='purple')
+    ax.set_yticks(y_pos, top_posts['titles'])
+    ax.set_xlabel('Score')
+    ax.set_title('Top Posts by Score')
+    figure.tight_layout()
+    charts['top_posts'] = _encode(figure)
+
+    return charts
+
+def get_charts(run_id, data):
+    """
+    Return the rendered charts for a run, drawing them only when its chart data changed.
+
+    The cache entry is keyed by run id and checked against a hash of the data, so a run
+    whose posts were re-scored or re-saved is drawn again.
+    """
+    fingerprint = hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+    with _chart_cache_lock:
+        cached = _chart_cache.get(run_id)
+        if cached and cached[0] == fingerprint:
+            _chart_cache.move_to_end(run_id)
+            return cached[1]
+
+    charts = render_charts(data)
+
+    with _chart_cache_lock:
+        _chart_cache[run_id] = (fingerprint, charts)
+        _chart_cache.move_to_end(run_id)
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return charts
@@ -0,0 +1,327 @@
+import re
+import zlib
+import datetime
+from functools import lru_cache
+from db import get_connection
+
+# MinHash signature length and its split into LSH bands. Posts that agree on every row
+# of any one band are compared: with 50 bands of 3 rows a pair with a Jaccard
+# similarity of 0.3 is compared 75% of the time (and a post usually matches several
+# members of its cluster), a pair at 0.1 5% and a pair at 0.05 0.6% of the time.
+NUM_PERM = 150
+BANDS = 50
+ROWS = NUM_PERM // BANDS
+
+# Stored posts read from each of a new post's buckets. A bucket this full belongs to
+# one large cluster or to boilerplate text, and a sample of it is enough to match
+# against, so the cost per post is bounded whatever the size of the store.
+MAX_BUCKET_POSTS = 20
+
+# Estimated Jaccard similarity of two posts' shingle sets at which they share a cluster
+CLUSTER_SIMILARITY = 0.3
+
+# Words per shingle
+SHINGLE_SIZE = 2
+
+# Posts hashed together; bounds the shingle-by-permutation matrix held in memory
+SIGNATURE_BATCH = 256
+
+# Content crawl results carry for posts without text
+NO_TEXT = '[No text content]'
+
+# Seed of the MinHash permutations; changing it invalidates every stored signature
+SEED = 1
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+@lru_cache(maxsize=None)
+def _permutations():
+    import numpy as np
+    rng = np.random.default_rng(SEED)
+    a = rng.integers(1, _MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+    return a, b
+
+def shingles(text):
+    """
+    Return the set of overlapping SHINGLE_SIZE-word sequences in a text.
+    """
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return set(words)
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def cluster_text(post):
+    """
+    Text a post is clustered on: its title and body.
+    """
+    content = post.get('content') or ''
+    if content == NO_TEXT:
+        content = ''
+    return f"{post.get('title') or ''}\n{content}"
+
+def minhash_signatures(texts):
+    """
+    Compute MinHash signatures for a batch of texts.
+
+    Every shingle of the batch is hashed through all permutations in one NumPy
+    operation and the minimum per text is taken with np.minimum.reduceat, so no loop
+    runs per permutation.
+
+    Args:
+        texts (list): The texts
+
+    Returns:
+        numpy.ndarray: One row of NUM_PERM uint32 values per text; texts without any
+        words get a row of the maximum hash
+    """
+    import numpy as np
+    a, b = _permutations()
+    signatures = np.full((len(texts), NUM_PERM), _MAX_HASH, dtype=np.uint32)
+    for start in range(0, len(texts), SIGNATURE_BATCH):
+        batch = [shingles(text) for text in texts[start:start + SIGNATURE_BATCH]]
+        counts = np.array([len(text_shingles) for text_shingles in batch])
+        if not counts.sum():
+            continue
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for text_shingles in batch for shingle in text_shingles),
+                             dtype=np.uint64, count=int(counts.sum()))
+        # Universal hashing modulo a Mersenne prime, as in the usual MinHash construction
+        permuted = ((np.outer(hashes, a) + b) % _MERSENNE_PRIME) & _MAX_HASH
+        offsets = np.cumsum(counts) - counts
+        has_words = counts > 0
+        signatures[start:start + len(batch)][has_words] = np.minimum.reduceat(permuted, offsets[has_words], axis=0)
+    return signatures
+
+def band_hashes(signatures):
+    """
+    Hash each LSH band of each signature to one 64-bit bucket id.
+
+    The band number is mixed in, so buckets of different bands never collide and all
+    of them can share one indexed column.
+
+    Returns:
+        numpy.ndarray: BANDS signed 64-bit bucket ids per signature
+    """
+    import numpy as np
+    rows = signatures.astype(np.uint64).reshape(len(signatures), BANDS, ROWS)
+    buckets = np.broadcast_to(np.arange(1, BANDS + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15),
+                              (len(signatures), BANDS)).copy()
+    for row in range(ROWS):
+        # FNV-style mixing; uint64 arithmetic wraps around
+        buckets = buckets * np.uint64(1099511628211) + rows[:, :, row]
+    return buckets.view(np.int64)
+
+def similarity(signatures, signature):
+    """
+    Estimated Jaccard similarity of each signature row to one signature: the share of
+    permutations whose minimum agrees.
+    """
+    return (signatures == signature).mean(axis=1)
+
+def _merge_clusters(cur, cluster_ids, post_id, now):
+    # The post joins the largest of the clusters it matches
+    if not cluster_ids:
+        cur.execute('INSERT OR REPLACE INTO clusters (id, size, summary, updated_at) VALUES (?, 1, NULL, ?)',
+                    (post_id, now))
+        return post_id
+    import numpy as np
+    placeholders = ', '.join('?' * len(cluster_ids))
+    cur.execute(f'SELECT id, size FROM clusters WHERE id IN ({placeholders})', list(cluster_ids))
+    sizes = {row['id']: row['size'] for row in cur.fetchall()}
+    target = min(sizes, key=lambda cluster_id: (-sizes[cluster_id], cluster_id))
+    others = [cluster_id for cluster_id in sizes if cluster_id != target]
+    
+    # Another matched cluster is only absorbed when its first post, which the cluster is
+    # named after, is similar to the target's; otherwise one post bridging two unrelated
+    # grievances would chain them into a cluster whose posts share nothing
+    if others:
+        cur.execute(f"SELECT post_id, signature FROM post_minhash WHERE post_id IN ({', '.join('?' * len(sizes))})",
+                    list(sizes))
+        representatives = {row['post_id']: np.frombuffer(row['signature'], dtype=np.uint32) for row in cur.fetchall()}
+        others = [cluster_id for cluster_id in others
+                  if similarity(representatives[cluster_id][None, :], representatives[target])[0] >= CLUSTER_SIMILARITY]
+    if others:
+        placeholders = ', '.join('?' * len(others))
+        cur.execute(f'UPDATE post_minhash SET cluster_id = ? WHERE cluster_id IN ({placeholders})', [target] + others)
+        cur.execute(f'DELETE FROM clusters WHERE id IN ({placeholders})', others)
+    # A cluster summary no longer covers the cluster once it grows
+    cur.execute('UPDATE clusters SET size = ?, summary = NULL, updated_at = ? WHERE id = ?',
+                (sizes[target] + sum(sizes[cluster_id] for cluster_id in others) + 1, now, target))
+    return target
+
+def _take_stale_posts(cur):
+    # Signatures made with another NUM_PERM cannot be compared with new ones and their
+    # buckets never match, so the clusters are dropped and their posts clustered again
+    cur.execute('SELECT length(signature) AS size FROM post_minhash LIMIT 1')
+    row = cur.fetchone()
+    if not row or row['size'] == NUM_PERM * 4:
+        return []
+    cur.execute('''
+        SELECT p.id, p.title, p.content FROM post_minhash m
+        JOIN posts p ON p.id = m.post_id
+        ORDER BY p.created_utc, p.id
+    ''')
+    posts = cur.fetchall()
+    for table in ('post_minhash', 'lsh_buckets', 'clusters'):
+        cur.execute(f'DELETE FROM {table}')
+    return posts
+
+def update_clusters(posts):
+    """
+    Add posts to the stored clusters, grouping each with the posts it nearly duplicates.
+
+    Runs incrementally: posts clustered before are skipped, and each new post is only
+    compared with at most MAX_BUCKET_POSTS stored posts from each of its LSH buckets,
+    so the cost per post does not grow with the number of posts stored. A post that
+    matches several clusters joins the largest, which absorbs the others whose first
+    posts are similar to its own.
+
+    Args:
+        posts (list): Post dicts with 'id', 'title' and 'content'
+
+    Returns:
+        dict: Cluster id of each post that was clustered now
+    """
+    import numpy as np
+    conn = get_connection()
+    cur = conn.cursor()
+    posts = _take_stale_posts(cur) + list(posts)
+
+    # Skip posts clustered by an earlier run or repeated within this one
+    known = set()
+    ids = list(dict.fromkeys(post['id'] for post in posts))
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        cur.execute(f"SELECT post_id FROM post_minhash WHERE post_id IN ({', '.join('?' * len(chunk))})", chunk)
+        known.update(row['post_id'] for row in cur.fetchall())
+    new_posts = []
+    for post in posts:
+        if post['id'] not in known:
+            known.add(post['id'])
+            new_posts.append(post)
+
+    # Posts without any words have nothing to be similar on
+    signatures = minhash_signatures([cluster_text(post) for post in new_posts])
+    has_words = (signatures != _MAX_HASH).any(axis=1)
+    new_posts = [post for post, keep in zip(new_posts, has_words) if keep]
+    signatures = signatures[has_words]
+    buckets = band_hashes(signatures)
+
+    now = datetime.datetime.now().isoformat()
+    assigned = {}
+    # Each bucket is read through the primary key index and cut off at MAX_BUCKET_POSTS
+    bucket_sql = ' UNION '.join(['SELECT * FROM (SELECT post_id FROM lsh_buckets WHERE bucket = ? LIMIT ?)'] * BANDS)
+    for post, signature, post_buckets in zip(new_posts, signatures, buckets.tolist()):
+        cur.execute(f'''
+            SELECT m.post_id, m.signature, m.cluster_id FROM ({bucket_sql}) b
+            JOIN post_minhash m ON m.post_id = b.post_id
+        ''', [value for bucket in post_buckets for value in (bucket, MAX_BUCKET_POSTS)])
+        candidates = cur.fetchall()
+
+        cluster_ids = set()
+        if candidates:
+            matrix = np.frombuffer(b''.join(row['signature'] for row in candidates), dtype=np.uint32)
+            values = similarity(matrix.reshape(len(candidates), NUM_PERM), signature)
+            cluster_ids = {row['cluster_id'] for row, value in zip(candidates, values) if value >= CLUSTER_SIMILARITY}
+
+        cluster_id = _merge_clusters(cur, cluster_ids, post['id'], now)
+        cur.execute('INSERT INTO post_minhash (post_id, signature, cluster_id) VALUES (?, ?, ?)',
+                    (post['id'], signature.tobytes(), cluster_id))
+        cur.executemany('INSERT OR IGNORE INTO lsh_buckets (bucket, post_id) VALUES (?, ?)',
+                        [(bucket, post['id']) for bucket in post_buckets])
+        assigned[post['id']] = cluster_id
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    # Earlier posts in this batch may have been merged into another cluster since
+    clusters = get_post_clusters(list(assigned))
+    return {post_id: clusters[post_id]['cluster_id'] for post_id in assigned}
+
+def get_post_clusters(post_ids):
+    """
+    Return the cluster id and size of each of the posts that has been clustered.
+
+    Returns:
+        dict: Post id to a dict with 'cluster_id' and 'cluster_size'
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    clusters = {}
+    for start in range(0, len(post_ids), 500):
+        chunk = post_ids[start:start + 500]
+        cur.execute(f'''
+            SELECT m.post_id, m.cluster_id, c.size FROM post_minhash m
+            JOIN clusters c ON c.id = m.cluster_id
+            WHERE m.post_id IN ({', '.join('?' * len(chunk))})
+        ''', chunk)
+        for row in cur.fetchall():
+            clusters[row['post_id']] = {'cluster_id': row['cluster_id'], 'cluster_size': row['size']}
+    cur.close()
+    conn.close()
+    return clusters
+
+def get_run_clusters(run_id, min_size=2, limit=20):
+    """
+    Return the largest clusters with posts in a run.
+
+    Args:
+        run_id (str): The run
+        min_size (int, optional): Smallest cluster to include. Defaults to 2.
+        limit (int, optional): Most clusters to return. Defaults to 20.
+
+    Returns:
+        list: Dicts with the cluster 'id', its 'size' across all runs, 'run_count' posts
+        in this run, the 'title' of its first post and its stored 'summary'
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT c.id, c.size, c.summary, p.title, COUNT(*) AS run_count FROM run_posts rp
+        JOIN post_minhash m ON m.post_id = rp.post_id
+        JOIN clusters c ON c.id = m.cluster_id
+        JOIN posts p ON p.id = c.id
+        WHERE rp.run_id = ? AND c.size >= ?
+        GROUP BY c.id
+        ORDER BY c.size DESC, c.id
+        LIMIT ?
+    ''', (run_id, min_size, limit))
+    clusters = cur.fetchall()
+    cur.close()
+    conn.close()
+    return clusters
+
+def get_cluster(cluster_id, post_limit=20):
+    """
+    Return a cluster with its most recent posts, or None.
+
+    Returns:
+        dict: The clusters row with 'posts', each with 'id', 'title' and 'summary'
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT * FROM clusters WHERE id = ?', (cluster_id,))
+    cluster = cur.fetchone()
+    if cluster:
+        cur.execute('''
+            SELECT p.id, p.title, p.summary FROM post_minhash m
+            JOIN posts p ON p.id = m.post_id
+            WHERE m.cluster_id = ?
+            ORDER BY p.created_utc DESC
+            LIMIT ?
+        ''', (cluster_id, post_limit))
+        cluster['posts'] = cur.fetchall()
+    cur.close()
+    conn.close()
+    return cluster
+
+def save_cluster_summary(cluster_id, summary):
+    """
+    Store the LLM summary of a cluster; it is cleared when the cluster grows.
+    """
+    conn = get_connection()
+    conn.execute('UPDATE clusters SET summary = ? WHERE id = ?', (summary, cluster_id))
+    conn.commit()
+    conn.close()
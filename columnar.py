@@ -0,0 +1,154 @@
+import os
+import datetime
+import threading
+
+# Rows buffered before they are written out as one Parquet row group / Arrow record batch
+ROW_GROUP_SIZE = 500
+
+# File extensions written as Arrow IPC files; everything else is Parquet
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+def result_schema():
+    """
+    Arrow schema of a crawl result, with the top comments kept as a list of structs.
+    """
+    import pyarrow as pa
+    comment = pa.struct([
+        ('id', pa.string()),
+        ('author', pa.string()),
+        ('score', pa.int64()),
+        ('body', pa.string()),
+        ('created_utc', pa.timestamp('s')),
+    ])
+    return pa.schema([
+        ('id', pa.string()),
+        ('subreddit', pa.string()),
+        ('title', pa.string()),
+        ('score', pa.int64()),
+        ('url', pa.string()),
+        ('permalink', pa.string()),
+        ('author', pa.string()),
+        ('created_utc', pa.timestamp('s')),
+        ('num_comments', pa.int64()),
+        ('content', pa.string()),
+        ('summary', pa.string()),
+        ('top_comments', pa.list_(comment)),
+        ('class_action_score', pa.float64()),
+        ('likely_class_action', pa.bool_()),
+    ])
+
+def file_format(path):
+    """
+    Return 'arrow' or 'parquet' depending on the file extension.
+    """
+    return 'arrow' if os.path.splitext(path)[1].lower() in ARROW_EXTENSIONS else 'parquet'
+
+def _timestamp(value):
+    if not value:
+        return None
+    return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+def _row(post):
+    # Crawl results carry timestamps as formatted strings; store them as real timestamps
+    row = {name: post.get(name) for name in ('id', 'subreddit', 'title', 'score', 'url', 'permalink', 'author',
+                                              'num_comments', 'content', 'summary', 'class_action_score',
+                                              'likely_class_action')}
+    row['created_utc'] = _timestamp(post.get('created_utc'))
+    row['top_comments'] = [
+        {'id': comment.get('id'), 'author': comment.get('author'), 'score': comment.get('score'),
+         'body': comment.get('body'), 'created_utc': _timestamp(comment.get('created_utc'))}
+        for comment in post.get('top_comments') or []
+    ]
+    return row
+
+class ColumnarWriter:
+    """
+    Write crawl results to a Parquet or Arrow IPC file while the crawl is running.
+
+    Posts are buffered and written out every row_group_size rows, so memory use stays
+    bounded and the rows written so far survive a crawl that fails halfway. write() is
+    thread-safe, so it can be passed straight to run_crawl as on_result.
+
+    Args:
+        path (str): Output file; .arrow, .feather and .ipc files are written as Arrow IPC
+        row_group_size (int, optional): Rows per row group. Defaults to ROW_GROUP_SIZE.
+    """
+
+    def __init__(self, path, row_group_size=ROW_GROUP_SIZE):
+        import pyarrow as pa
+        self.path = path
+        self.format = file_format(path)
+        self.row_group_size = row_group_size
+        self.schema = result_schema()
+        self.rows = []
+        self.rows_written = 0
+        self.lock = threading.Lock()
+        if self.format == 'arrow':
+            self.writer = pa.ipc.new_file(path, self.schema)
+        else:
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, post):
+        """
+        Add one crawl result.
+        """
+        with self.lock:
+            self.rows.append(_row(post))
+            if len(self.rows) >= self.row_group_size:
+                self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        if not self.rows:
+            return
+        table = pa.Table.from_pylist(self.rows, schema=self.schema)
+        if self.format == 'arrow':
+            self.writer.write_table(table)
+        else:
+            self.writer.write_table(table, row_group_size=len(self.rows))
+        self.rows_written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        """
+        Write the remaining rows and the file footer.
+        """
+        with self.lock:
+            self._flush()
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def save_columnar(posts_data, path, row_group_size=ROW_GROUP_SIZE):
+    """
+    Save a list of crawl results to a Parquet or Arrow IPC file.
+    """
+    with ColumnarWriter(path, row_group_size) as writer:
+        for post in posts_data:
+            writer.write(post)
+
+def read_results(path, columns=None):
+    """
+    Read a Parquet or Arrow IPC results file into an Arrow table.
+
+    Only the requested columns are read, and the file is memory-mapped, so pages of
+    columns that are not used are never loaded.
+
+    Args:
+        path (str): File written by ColumnarWriter
+        columns (list, optional): Columns to read; all of them by default
+
+    Returns:
+        pyarrow.Table: The results
+    """
+    import pyarrow as pa
+    if file_format(path) == 'arrow':
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        return table.select(columns) if columns else table
+    import pyarrow.parquet as pq
+    return pq.read_table(path, columns=columns, memory_map=True)
@@ -1,19 +1,116 @@
 import os
+import re
+import json
 import sqlite3
+import threading
 
 DATABASE_PATH = os.environ.get('DATABASE_PATH', 'crawler_results.db')
 
+# How long a writer waits for another writer before giving up
+BUSY_TIMEOUT_SECONDS = 10
+
 def dict_factory(cursor, row):
     d = {}
     for idx, col in enumerate(cursor.description):
         d[col[0]] = row[idx]
     return d
 
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection that is kept open and reused by the thread that created it.
+
+    close() only rolls back an unfinished transaction, which is what closing a plain
+    connection would have done to it, so existing get_connection()/close() callers
+    keep working while skipping the cost of reopening the database.
+
+    Borrows nest: a helper that calls get_connection()/close() while its caller has
+    uncommitted writes shares the caller's transaction, and only the outermost close()
+    rolls back what was left uncommitted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # get_connection() calls not yet matched by a close()
+        self.borrows = 0
+
+    def close(self):
+        self.borrows = max(0, self.borrows - 1)
+        if not self.borrows and self.in_transaction:
+            self.rollback()
+
+    def dispose(self):
+        super().close()
+
+# One connection per thread and database path
+_local = threading.local()
+
 def get_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = dict_factory
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    
+    conn = connections.get(DATABASE_PATH)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH, timeout=BUSY_TIMEOUT_SECONDS, factory=PooledConnection)
+        conn.row_factory = dict_factory
+        # WAL lets readers keep going while the crawler holds the write transaction
+        # (switching modes needs an exclusive lock, so only do it once per database)
+        if conn.execute('PRAGMA journal_mode').fetchone()['journal_mode'] != 'wal':
+            conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-16000')  # 16 MB page cache
+        connections[DATABASE_PATH] = conn
+    # Without an open transaction no caller has work to lose, so borrows left behind by
+    # a caller that never reached close() cannot hold back later rollbacks
+    if not conn.in_transaction:
+        conn.borrows = 0
+    conn.borrows += 1
     return conn
 
+def close_connections():
+    """
+    Really close the connections opened by the current thread.
+    """
+    for conn in getattr(_local, 'connections', {}).values():
+        conn.dispose()
+    _local.connections = {}
+
+# doc_id is the rowid the full-text index is keyed on. Declared as INTEGER PRIMARY KEY
+# it is stable, where the implicit rowid of a table with a TEXT key may be renumbered
+# by VACUUM and leave the index pointing at the wrong rows.
+POSTS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS posts (
+        doc_id INTEGER PRIMARY KEY,
+        id TEXT NOT NULL UNIQUE,
+        subreddit TEXT NOT NULL,
+        title TEXT NOT NULL,
+        url TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        author TEXT NOT NULL,
+        created_utc TEXT NOT NULL,
+        num_comments INTEGER NOT NULL,
+        content TEXT,
+        summary TEXT,
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL
+    );
+'''
+
+COMMENTS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS comments (
+        doc_id INTEGER PRIMARY KEY,
+        id TEXT NOT NULL UNIQUE,
+        post_id TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        author TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        body TEXT NOT NULL,
+        created_utc TEXT,
+        FOREIGN KEY (post_id) REFERENCES posts (id)
+    );
+'''
+
 def init_db():
     conn = get_connection()
     cur = conn.cursor()
@@ -30,23 +127,563 @@ def init_db():
         );
     ''')
     
-    # Create crawler_results table
+    # Create posts table, one row per Reddit post no matter how many runs saw it
+    cur.execute(POSTS_TABLE_SQL)
+    
+    # Create comments table holding the top comments of each post in rank order
+    cur.execute(COMMENTS_TABLE_SQL)
+    
+    migrate_doc_ids(cur)
+    
+    # Comments are always looked up and replaced by post
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_comments_post ON comments (post_id, rank)')
+    
+    # Create run_posts table linking each run to the posts it returned
     cur.execute('''
-        CREATE TABLE IF NOT EXISTS crawler_results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+        CREATE TABLE IF NOT EXISTS run_posts (
             run_id TEXT NOT NULL,
-            title TEXT NOT NULL,
-            url TEXT NOT NULL,
-            score INTEGER NOT NULL,
-            author TEXT NOT NULL,
-            created_utc TEXT NOT NULL,
-            num_comments INTEGER NOT NULL,
-            summary TEXT,
-            top_comments TEXT,
+            post_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            class_action_score REAL,
+            PRIMARY KEY (run_id, post_id),
+            FOREIGN KEY (run_id) REFERENCES crawler_runs (id),
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        );
+    ''')
+    
+    # Databases from before posts were scored lack the score column
+    cur.execute('PRAGMA table_info(run_posts)')
+    if 'class_action_score' not in {row['name'] for row in cur.fetchall()}:
+        cur.execute('ALTER TABLE run_posts ADD COLUMN class_action_score REAL')
+    
+    # Indexes for run history, paging through a run and finding a subreddit's recent posts
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_crawler_runs_timestamp ON crawler_runs (timestamp, id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_run_posts_position ON run_posts (run_id, position)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_posts_subreddit_created ON posts (subreddit COLLATE NOCASE, created_utc)')
+    
+    # Create crawl_state table holding the newest post seen per subreddit and keyword set
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_state (
+            subreddit TEXT NOT NULL,
+            keyword_key TEXT NOT NULL,
+            newest_created_utc REAL NOT NULL,
+            newest_post_id TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (subreddit, keyword_key)
+        );
+    ''')
+    
+    # Create crawl_jobs table, the queue shared by every web process
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_jobs (
+            id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            params TEXT NOT NULL,
+            worker TEXT,
+            posts_processed INTEGER NOT NULL DEFAULT 0,
+            matches_found INTEGER NOT NULL DEFAULT 0,
+            results_count INTEGER,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            updated_at TEXT NOT NULL
+        );
+    ''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_crawl_jobs_state ON crawl_jobs (state, created_at)')
+    
+    # Create crawl_job_results table, matched posts of a running job for live progress streams
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_job_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            post TEXT NOT NULL,
+            FOREIGN KEY (job_id) REFERENCES crawl_jobs (id)
+        );
+    ''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_crawl_job_results_job ON crawl_job_results (job_id, id)')
+    
+    # Create run_stats table, aggregates computed once when a run is saved
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS run_stats (
+            run_id TEXT PRIMARY KEY,
+            stats TEXT NOT NULL,
+            computed_at TEXT NOT NULL,
             FOREIGN KEY (run_id) REFERENCES crawler_runs (id)
         );
     ''')
     
+    # Create summary_cache table, summaries keyed by a hash of model, prompt template and text
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS summary_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+    ''')
+    
+    # Create post_minhash table, the MinHash signature and cluster of every clustered post
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS post_minhash (
+            post_id TEXT PRIMARY KEY,
+            signature BLOB NOT NULL,
+            cluster_id TEXT NOT NULL,
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        );
+    ''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_post_minhash_cluster ON post_minhash (cluster_id)')
+    
+    # Create lsh_buckets table, the LSH band hashes used to find similar posts without comparing all pairs
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+            bucket INTEGER NOT NULL,
+            post_id TEXT NOT NULL,
+            PRIMARY KEY (bucket, post_id)
+        ) WITHOUT ROWID;
+    ''')
+    
+    # Create clusters table, groups of posts about the same grievance, named after their first post
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS clusters (
+            id TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            summary TEXT,
+            updated_at TEXT NOT NULL
+        );
+    ''')
+    
+    migrate_crawler_results(cur)
+    create_search_index(cur)
+    
     conn.commit()
     cur.close()
     conn.close()
+
+def migrate_doc_ids(cur):
+    """
+    Give posts and comments from databases created without doc_id their stable key.
+
+    Each table is copied out, recreated and filled again with doc_id set to the old
+    rowid. Its indexes and triggers go with the old table and are created again by
+    init_db, and the full-text index is dropped so it is rebuilt on doc_id.
+    """
+    migrated = False
+    for table, create_sql in (('posts', POSTS_TABLE_SQL), ('comments', COMMENTS_TABLE_SQL)):
+        cur.execute(f'PRAGMA table_info({table})')
+        columns = [row['name'] for row in cur.fetchall()]
+        if 'doc_id' in columns:
+            continue
+        names = ', '.join(['doc_id'] + columns)
+        cur.execute(f'CREATE TEMP TABLE {table}_old AS SELECT rowid AS doc_id, * FROM {table}')
+        cur.execute(f'DROP TABLE {table}')
+        cur.execute(create_sql)
+        cur.execute(f'INSERT INTO {table} ({names}) SELECT {names} FROM temp.{table}_old')
+        cur.execute(f'DROP TABLE temp.{table}_old')
+        migrated = True
+    
+    if migrated:
+        cur.execute('DROP TABLE IF EXISTS posts_fts')
+        cur.execute('DROP TABLE IF EXISTS comments_fts')
+
+def migrate_crawler_results(cur):
+    """
+    Move rows from the old per-run crawler_results table into posts, comments and run_posts.
+
+    The old table stored a copy of every post for every run, with the top comments
+    as a JSON blob. It is dropped once its rows have been moved.
+    """
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'crawler_results'")
+    if not cur.fetchone():
+        return
+    
+    cur.execute('''
+        SELECT r.*, c.subreddit, c.timestamp FROM crawler_results r
+        JOIN crawler_runs c ON c.id = r.run_id
+        ORDER BY r.id
+    ''')
+    runs = {}
+    for row in cur.fetchall():
+        # Databases from before post ids were stored only have the permalink
+        post_id = row.get('post_id')
+        if not post_id:
+            match = re.search(r'/comments/([a-z0-9]+)', row['url'] or '')
+            post_id = match.group(1) if match else f"legacy-{row['id']}"
+        
+        top_comments = []
+        try:
+            if row['top_comments']:
+                top_comments = json.loads(row['top_comments'])
+        except (json.JSONDecodeError, TypeError):
+            pass
+        
+        run = runs.setdefault(row['run_id'], {'subreddit': row['subreddit'], 'timestamp': row['timestamp'], 'posts': []})
+        run['posts'].append({
+            'id': post_id,
+            'title': row['title'],
+            'permalink': row['url'],
+            'score': row['score'],
+            'author': row['author'],
+            'created_utc': row['created_utc'],
+            'num_comments': row['num_comments'],
+            'summary': row['summary'],
+            'top_comments': [c for c in top_comments if isinstance(c, dict)],
+        })
+    
+    # Replay runs oldest first so each post ends up with its latest stats
+    for run_id, run in sorted(runs.items(), key=lambda item: item[1]['timestamp']):
+        upsert_posts(cur, run['posts'], run['subreddit'], run['timestamp'])
+        cur.executemany(
+            'INSERT OR IGNORE INTO run_posts (run_id, post_id, position) VALUES (?, ?, ?)',
+            [(run_id, post['id'], position) for position, post in enumerate(run['posts'])]
+        )
+    
+    cur.execute('DROP TABLE crawler_results')
+
+SEARCH_INDEX_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts (rowid, title, content, summary) VALUES (new.doc_id, new.title, new.content, new.summary);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, title, content, summary) VALUES ('delete', old.doc_id, old.title, old.content, old.summary);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, content, summary ON posts
+    WHEN old.title IS NOT new.title OR old.content IS NOT new.content OR old.summary IS NOT new.summary BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, title, content, summary) VALUES ('delete', old.doc_id, old.title, old.content, old.summary);
+        INSERT INTO posts_fts (rowid, title, content, summary) VALUES (new.doc_id, new.title, new.content, new.summary);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts (rowid, body) VALUES (new.doc_id, new.body);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts (comments_fts, rowid, body) VALUES ('delete', old.doc_id, old.body);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF body ON comments
+    WHEN old.body IS NOT new.body BEGIN
+        INSERT INTO comments_fts (comments_fts, rowid, body) VALUES ('delete', old.doc_id, old.body);
+        INSERT INTO comments_fts (rowid, body) VALUES (new.doc_id, new.body);
+    END
+    ''',
+]
+
+def create_search_index(cur):
+    """
+    Create the FTS5 full-text index over post titles, content, summaries and comment bodies.
+
+    The index tables read their text from posts and comments (external content) and
+    triggers keep them in sync on every insert, update and delete. A database that
+    already has posts when the index is created is indexed once here. The index is
+    keyed on doc_id, which VACUUM leaves alone.
+    """
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'")
+    exists = cur.fetchone() is not None
+    
+    cur.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            title, content, summary, content='posts', content_rowid='doc_id', tokenize='porter unicode61'
+        );
+    ''')
+    cur.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+            body, content='comments', content_rowid='doc_id', tokenize='porter unicode61'
+        );
+    ''')
+    
+    # Re-crawled posts are upserted with unchanged text, so only real text changes touch the index
+    for trigger in SEARCH_INDEX_TRIGGERS:
+        cur.execute(trigger)
+    
+    if not exists:
+        cur.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+        cur.execute("INSERT INTO comments_fts (comments_fts) VALUES ('rebuild')")
+
+UPSERT_POST_SQL = '''
+    INSERT INTO posts (id, subreddit, title, url, score, author, created_utc, num_comments, content, summary, first_seen, last_seen)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        title = excluded.title,
+        score = excluded.score,
+        num_comments = excluded.num_comments,
+        content = coalesce(excluded.content, posts.content),
+        summary = coalesce(excluded.summary, posts.summary),
+        last_seen = max(posts.last_seen, excluded.last_seen)
+'''
+
+UPSERT_COMMENT_SQL = '''
+    INSERT INTO comments (id, post_id, rank, author, score, body, created_utc)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        rank = excluded.rank,
+        score = excluded.score,
+        body = excluded.body
+'''
+
+def upsert_posts(cur, posts_data, subreddit, seen_at):
+    """
+    Insert or update posts and their top comments in batches. Running it twice gives the same rows.
+
+    Args:
+        cur: An open cursor; the caller commits
+        posts_data (list): Posts as returned by reddit_crawler.crawl_reddit
+        subreddit (str): The subreddit the posts were crawled from, unless a post names its own
+        seen_at (str): Timestamp of the run that saw the posts
+    """
+    cur.executemany(UPSERT_POST_SQL, [
+        (post['id'], post.get('subreddit') or subreddit, post['title'], post['permalink'], post['score'], post['author'],
+         post['created_utc'], post['num_comments'], post.get('content'), post.get('summary'), seen_at, seen_at)
+        for post in posts_data
+    ])
+    
+    comment_rows = []
+    for post in posts_data:
+        for rank, comment in enumerate(post.get('top_comments') or []):
+            # Comments migrated from the old JSON blob have no Reddit id
+            comment_id = comment.get('id') or f"{post['id']}-{rank}"
+            comment_rows.append((comment_id, post['id'], rank, comment.get('author', ''), comment.get('score', 0),
+                                 comment.get('body', ''), comment.get('created_utc')))
+    if not comment_rows:
+        return
+    
+    # Replace the top comments of every post we just saved, so comments that have
+    # fallen out of the top list do not linger
+    cur.executemany('DELETE FROM comments WHERE post_id = ?',
+                    [(post['id'],) for post in posts_data if post.get('top_comments')])
+    cur.executemany(UPSERT_COMMENT_SQL, comment_rows)
+
+def save_run(run_id, timestamp, subreddit, posts_count, keyword, posts_data):
+    """
+    Store a crawler run and link it to its posts in a single batched write transaction.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO crawler_runs (id, timestamp, subreddit, posts_count, keyword, results_count) VALUES (?, ?, ?, ?, ?, ?)',
+        (run_id, timestamp, subreddit, posts_count, keyword, len(posts_data))
+    )
+    upsert_posts(cur, posts_data, subreddit, timestamp)
+    cur.executemany(
+        'INSERT OR IGNORE INTO run_posts (run_id, post_id, position, class_action_score) VALUES (?, ?, ?, ?)',
+        [(run_id, post['id'], position, post.get('class_action_score')) for position, post in enumerate(posts_data)]
+    )
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def get_run(run_id):
+    """
+    Return the crawler_runs row for a run id, or None.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT * FROM crawler_runs WHERE id = ?', (run_id,))
+    run = cur.fetchone()
+    conn.close()
+    return run
+
+def get_runs(before=None, limit=10):
+    """
+    Return crawler runs newest first, one page at a time.
+
+    Args:
+        before (tuple, optional): (timestamp, id) of the last run on the previous page
+        limit (int, optional): Page size. Defaults to 10.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    if before:
+        cur.execute('''
+            SELECT * FROM crawler_runs
+            WHERE timestamp < ? OR (timestamp = ? AND id < ?)
+            ORDER BY timestamp DESC, id DESC LIMIT ?
+        ''', (before[0], before[0], before[1], limit))
+    else:
+        cur.execute('SELECT * FROM crawler_runs ORDER BY timestamp DESC, id DESC LIMIT ?', (limit,))
+    runs = cur.fetchall()
+    conn.close()
+    return runs
+
+# Columns of a run result that callers may ask for; 'permalink' is stored as posts.url
+RESULT_COLUMNS = {
+    'id': 'p.id',
+    'title': 'p.title',
+    'permalink': 'p.url',
+    'score': 'p.score',
+    'author': 'p.author',
+    'created_utc': 'p.created_utc',
+    'num_comments': 'p.num_comments',
+    'content': 'p.content',
+    'summary': 'p.summary',
+    'class_action_score': 'rp.class_action_score',
+}
+
+def get_run_results(run_id, columns=None, include_comments=True, comment_limit=None, after=None, limit=None):
+    """
+    Return the posts of a run in saved order, shaped like reddit_crawler.crawl_reddit output.
+
+    Large text columns are only read when asked for, and results can be paged by
+    position so a page never scans the rows before it.
+
+    Args:
+        run_id (str): The run to read
+        columns (list, optional): Result columns to read. Defaults to all but 'content'.
+        include_comments (bool, optional): Attach 'top_comments'. Defaults to True.
+        comment_limit (int, optional): Only attach this many comments per post
+        after (int, optional): Position of the last post on the previous page
+        limit (int, optional): Page size; all remaining posts when None
+
+    Returns:
+        list: One dict per post, each with its 'position' in the run
+    """
+    if columns is None:
+        columns = [name for name in RESULT_COLUMNS if name != 'content']
+    columns = [name for name in columns if name in RESULT_COLUMNS]
+    if 'id' not in columns:
+        columns = ['id'] + columns
+    select = ', '.join(f'{RESULT_COLUMNS[name]} AS {name}' for name in columns)
+    
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(f'''
+        SELECT rp.position AS position, {select} FROM run_posts rp
+        JOIN posts p ON p.id = rp.post_id
+        WHERE rp.run_id = ? AND rp.position > ?
+        ORDER BY rp.position
+        LIMIT ?
+    ''', (run_id, -1 if after is None else after, -1 if limit is None else limit))
+    rows = cur.fetchall()
+    
+    if include_comments and rows:
+        comments_by_post = {}
+        if comment_limit is None:
+            comment_limit = -1
+        # Only fetch comments for the posts on this page, in chunks that stay under
+        # SQLite's bound parameter limit
+        for start in range(0, len(rows), 500):
+            post_ids = [row['id'] for row in rows[start:start + 500]]
+            placeholders = ', '.join('?' * len(post_ids))
+            cur.execute(f'''
+                SELECT id, post_id, author, score, body, created_utc FROM comments
+                WHERE post_id IN ({placeholders}) AND (? < 0 OR rank < ?)
+                ORDER BY post_id, rank
+            ''', post_ids + [comment_limit, comment_limit])
+            for comment in cur.fetchall():
+                comments_by_post.setdefault(comment.pop('post_id'), []).append(comment)
+        for row in rows:
+            row['top_comments'] = comments_by_post.get(row['id'], [])
+    conn.close()
+    
+    return rows
+
+def iter_run_results(run_id, batch_size=500, **kwargs):
+    """
+    Yield every post of a run, reading it from the database one page at a time.
+
+    Keyword arguments are passed on to get_run_results.
+    """
+    after = None
+    while True:
+        page = get_run_results(run_id, after=after, limit=batch_size, **kwargs)
+        yield from page
+        if len(page) < batch_size:
+            return
+        after = page[-1]['position']
+
+def keyword_set_key(keywords):
+    """
+    Canonical key for a keyword list, so the same set in any order or case shares state.
+    """
+    if not keywords:
+        return ''
+    return '\n'.join(sorted({keyword.lower() for keyword in keywords}))
+
+def get_crawl_state(subreddit, keywords):
+    """
+    Return the high-water mark stored for a subreddit and keyword set, or None.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        'SELECT * FROM crawl_state WHERE subreddit = ? AND keyword_key = ?',
+        (subreddit.lower(), keyword_set_key(keywords))
+    )
+    state = cur.fetchone()
+    conn.close()
+    return state
+
+def save_crawl_state(subreddit, keywords, newest_created_utc, newest_post_id):
+    """
+    Store the newest post seen for a subreddit and keyword set, never moving the mark backwards.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO crawl_state (subreddit, keyword_key, newest_created_utc, newest_post_id, updated_at)
+        VALUES (?, ?, ?, ?, datetime('now'))
+        ON CONFLICT (subreddit, keyword_key) DO UPDATE SET
+            newest_created_utc = excluded.newest_created_utc,
+            newest_post_id = excluded.newest_post_id,
+            updated_at = excluded.updated_at
+        WHERE excluded.newest_created_utc >= crawl_state.newest_created_utc
+    ''', (subreddit.lower(), keyword_set_key(keywords), newest_created_utc, newest_post_id))
+    conn.commit()
+    conn.close()
+
+def get_stored_post_ids(subreddit, since, limit=-1):
+    """
+    Return the ids of posts from a subreddit already stored and created at or after
+    `since`, newest first and at most `limit` of them (all by default).
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        'SELECT id FROM posts WHERE subreddit = ? COLLATE NOCASE AND created_utc >= ? ORDER BY created_utc DESC LIMIT ?',
+        (subreddit, since, limit)
+    )
+    post_ids = [row['id'] for row in cur.fetchall()]
+    conn.close()
+    return post_ids
+
+def update_post_stats(stats):
+    """
+    Refresh score and comment count for stored posts.
+
+    Args:
+        stats (list): Dicts with 'id', 'score' and 'num_comments'
+
+    Returns:
+        list: Ids of the runs that include a post whose numbers changed, so their
+        stored aggregates can be recomputed
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    changed = []
+    for post in stats:
+        cur.execute(
+            'UPDATE posts SET score = ?, num_comments = ? WHERE id = ? AND (score != ? OR num_comments != ?)',
+            (post['score'], post['num_comments'], post['id'], post['score'], post['num_comments'])
+        )
+        if cur.rowcount:
+            changed.append(post['id'])
+    run_ids = set()
+    # Stay well under SQLite's limit on query parameters
+    for start in range(0, len(changed), 500):
+        batch = changed[start:start + 500]
+        cur.execute(f"SELECT DISTINCT run_id FROM run_posts WHERE post_id IN ({', '.join('?' * len(batch))})", batch)
+        run_ids.update(row['run_id'] for row in cur.fetchall())
+    conn.commit()
+    conn.close()
+    return sorted(run_ids)
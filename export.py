@@ -0,0 +1,82 @@
+import csv
+import json
+import zlib
+
+# Flush to the client once this many bytes have been produced
+CHUNK_SIZE = 64 * 1024
+
+CSV_HEADER = ['Title', 'URL', 'Score', 'Author', 'Created', 'Comments', 'Summary', 'Top Comments']
+
+class _Echo:
+    """
+    File-like object whose write() hands the formatted line straight back.
+    """
+
+    def write(self, value):
+        return value
+
+def format_top_comments(top_comments):
+    """
+    Flatten the first three top comments into one CSV cell.
+    """
+    if not top_comments or not isinstance(top_comments, list):
+        return ''
+    if isinstance(top_comments[0], str):
+        return '\n'.join(top_comments)
+    if isinstance(top_comments[0], dict):
+        return '\n'.join(f"u/{c.get('author', 'unknown')} (Score: {c.get('score', 0)}): {c.get('body', '')}"
+                         for c in top_comments[:3])
+    return ''
+
+def iter_csv(posts):
+    """
+    Yield the CSV export of the posts line by line.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for post in posts:
+        yield writer.writerow([
+            post['title'],
+            post.get('permalink', ''),
+            post['score'],
+            post['author'],
+            post.get('created_utc', ''),
+            post['num_comments'],
+            post.get('summary', ''),
+            format_top_comments(post.get('top_comments')),
+        ])
+
+def iter_ndjson(posts):
+    """
+    Yield one JSON object per line for each post.
+    """
+    for post in posts:
+        yield json.dumps(post, ensure_ascii=False) + '\n'
+
+def encode_chunks(lines, chunk_size=CHUNK_SIZE):
+    """
+    Encode text lines to UTF-8 and group them into chunks of roughly chunk_size bytes.
+    """
+    buffer = []
+    buffered = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b''.join(buffer)
+
+def gzip_chunks(chunks):
+    """
+    Compress a stream of byte chunks into a single gzip stream.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,118 @@
+import numpy as np
+from scipy import sparse
+
+def build_term_matrix(sentences, stop_words):
+    """
+    Tokenize every sentence once and build a sparse sentence-by-term count matrix.
+
+    Tokens are produced the same way as the original TextRank implementation:
+    whitespace split, lowercased, with stopwords removed.
+
+    Args:
+        sentences (list): The sentences of a single post
+        stop_words (set): Lowercase words to ignore
+
+    Returns:
+        scipy.sparse.csr_matrix: One row per sentence, one column per term
+    """
+    vocabulary = {}
+    rows = []
+    cols = []
+
+    for i, sentence in enumerate(sentences):
+        for word in sentence.split():
+            word = word.lower()
+            if word in stop_words:
+                continue
+            rows.append(i)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+
+    # Duplicate (row, col) pairs are summed, which gives us the term counts
+    data = np.ones(len(rows), dtype=float)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(sentences), max(len(vocabulary), 1)))
+
+def similarity_matrix(sentences, stop_words):
+    """
+    Compute all pairwise cosine similarities between sentences in one sparse product.
+
+    Args:
+        sentences (list): The sentences of a single post
+        stop_words (set): Lowercase words to ignore
+
+    Returns:
+        numpy.ndarray: Dense n x n similarity matrix with a zero diagonal
+    """
+    term_matrix = build_term_matrix(sentences, stop_words)
+
+    # L2-normalize each row; sentences with no remaining words stay all-zero
+    norms = np.sqrt(np.asarray(term_matrix.multiply(term_matrix).sum(axis=1)).ravel())
+    inverse_norms = np.zeros_like(norms)
+    inverse_norms[norms > 0] = 1.0 / norms[norms > 0]
+    normalized = sparse.diags(inverse_norms) @ term_matrix
+
+    matrix = (normalized @ normalized.T).toarray()
+    np.fill_diagonal(matrix, 0.0)
+    return matrix
+
+def pagerank(matrix, alpha=0.85, max_iter=100, tol=1.0e-6):
+    """
+    Weighted PageRank over a dense adjacency matrix.
+
+    This mirrors networkx.pagerank (uniform start and teleport vectors, dangling
+    rows redistributed uniformly, L1 convergence check) without building a graph.
+
+    Args:
+        matrix (numpy.ndarray): Square non-negative weight matrix
+        alpha (float, optional): Damping factor. Defaults to 0.85.
+        max_iter (int, optional): Maximum number of power iterations. Defaults to 100.
+        tol (float, optional): Convergence tolerance per node. Defaults to 1.0e-6.
+
+    Returns:
+        numpy.ndarray: The score of each node
+    """
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+
+    # Make the matrix row-stochastic
+    out_weight = matrix.sum(axis=1)
+    is_dangling = out_weight == 0
+    inverse_weight = np.zeros_like(out_weight)
+    inverse_weight[~is_dangling] = 1.0 / out_weight[~is_dangling]
+    transition = matrix * inverse_weight[:, np.newaxis]
+
+    uniform = np.repeat(1.0 / n, n)
+    x = uniform
+    for _ in range(max_iter):
+        x_last = x
+        x = alpha * (x @ transition + x[is_dangling].sum() * uniform) + (1 - alpha) * uniform
+        if np.absolute(x - x_last).sum() < n * tol:
+            break
+
+    return x
+
+def rank_sentences(sentences, stop_words, num_sentences=5):
+    """
+    Pick the top TextRank sentences and return them in their original order.
+
+    Args:
+        sentences (list): The sentences of a single post
+        stop_words (set): Lowercase words to ignore
+        num_sentences (int, optional): Number of sentences to keep. Defaults to 5.
+
+    Returns:
+        list: The selected sentences
+    """
+    scores = pagerank(similarity_matrix(sentences, stop_words))
+
+    # Sort sentences by score and select top ones
+    ranked_sentences = sorted(((scores[i], s) for i, s in enumerate(sentences)), reverse=True)
+    summary_sentences = [s for _, s in ranked_sentences[:num_sentences]]
+
+    # Sort the selected sentences based on their original order
+    first_index = {}
+    for i, sentence in enumerate(sentences):
+        first_index.setdefault(sentence, i)
+    summary_sentences.sort(key=first_index.__getitem__)
+
+    return summary_sentences
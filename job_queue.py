@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import datetime
+import threading
+import traceback
+from db import get_connection
+
+# Number of crawl jobs each web process runs at once
+DEFAULT_WORKERS = int(os.environ.get('CRAWLER_WORKERS', 2))
+
+# How often idle workers look for queued jobs, in seconds
+POLL_INTERVAL = 1.0
+
+# A running job whose progress has not been updated for this long is assumed
+# to belong to a worker that died, and is queued again
+STALE_JOB_SECONDS = 15 * 60
+
+# How often a running pool looks for stale jobs, in seconds
+REQUEUE_INTERVAL = 60.0
+
+def _now():
+    return datetime.datetime.now().isoformat()
+
+def enqueue_job(params, job_id=None):
+    """
+    Add a crawl job to the queue.
+
+    Args:
+        params (dict): Crawl parameters, stored as JSON and handed to the job handler
+        job_id (str, optional): Id to use; a new UUID by default. It doubles as the run id.
+
+    Returns:
+        str: The job id
+    """
+    job_id = job_id or str(uuid.uuid4())
+    conn = get_connection()
+    conn.execute(
+        "INSERT INTO crawl_jobs (id, state, params, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+        (job_id, json.dumps(params), _now(), _now())
+    )
+    conn.commit()
+    conn.close()
+    return job_id
+
+def get_job(job_id):
+    """
+    Return a job with its params decoded, or None.
+    """
+    conn = get_connection()
+    job = conn.execute('SELECT * FROM crawl_jobs WHERE id = ?', (job_id,)).fetchone()
+    conn.close()
+    if job:
+        job['params'] = json.loads(job['params'])
+    return job
+
+def claim_next_job(worker_id):
+    """
+    Atomically move the oldest queued job to 'running' and return it, or None.
+
+    BEGIN IMMEDIATE takes the write lock up front, so two workers in different
+    processes can never claim the same job.
+    """
+    conn = get_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        job = conn.execute(
+            "SELECT * FROM crawl_jobs WHERE state = 'queued' ORDER BY created_at, id LIMIT 1"
+        ).fetchone()
+        if job:
+            conn.execute(
+                "UPDATE crawl_jobs SET state = 'running', worker = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                (worker_id, _now(), _now(), job['id'])
+            )
+            job['params'] = json.loads(job['params'])
+        conn.commit()
+        return job
+    finally:
+        conn.close()
+
+def update_job_progress(job_id, posts_processed, matches_found):
+    conn = get_connection()
+    conn.execute(
+        'UPDATE crawl_jobs SET posts_processed = ?, matches_found = ?, updated_at = ? WHERE id = ?',
+        (posts_processed, matches_found, _now(), job_id)
+    )
+    conn.commit()
+    conn.close()
+
+def add_job_result(job_id, post):
+    """
+    Record a matched post while its job is still running, for live progress streams.
+    """
+    conn = get_connection()
+    conn.execute('INSERT INTO crawl_job_results (job_id, post) VALUES (?, ?)', (job_id, json.dumps(post)))
+    conn.commit()
+    conn.close()
+
+def get_job_results(job_id, after=0):
+    """
+    Return the live results of a job recorded after the given result id, as (id, post JSON) rows.
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        'SELECT id, post FROM crawl_job_results WHERE job_id = ? AND id > ? ORDER BY id',
+        (job_id, after)
+    ).fetchall()
+    conn.close()
+    return rows
+
+def finish_job(job_id, results_count):
+    conn = get_connection()
+    conn.execute(
+        "UPDATE crawl_jobs SET state = 'complete', results_count = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+        (results_count, _now(), _now(), job_id)
+    )
+    # The finished run is stored in full, so the live copies are no longer needed
+    conn.execute('DELETE FROM crawl_job_results WHERE job_id = ?', (job_id,))
+    conn.commit()
+    conn.close()
+
+def fail_job(job_id, error):
+    conn = get_connection()
+    conn.execute(
+        "UPDATE crawl_jobs SET state = 'failed', error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+        (error, _now(), _now(), job_id)
+    )
+    conn.execute('DELETE FROM crawl_job_results WHERE job_id = ?', (job_id,))
+    conn.commit()
+    conn.close()
+
+def requeue_stale_jobs(max_age=STALE_JOB_SECONDS):
+    """
+    Put running jobs that have stopped reporting progress back on the queue.
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=max_age)).isoformat()
+    conn = get_connection()
+    # The rerun records its live results again from the start
+    conn.execute(
+        "DELETE FROM crawl_job_results WHERE job_id IN (SELECT id FROM crawl_jobs WHERE state = 'running' AND updated_at < ?)",
+        (cutoff,)
+    )
+    cur = conn.execute(
+        "UPDATE crawl_jobs SET state = 'queued', worker = NULL, updated_at = ? WHERE state = 'running' AND updated_at < ?",
+        (_now(), cutoff)
+    )
+    requeued = cur.rowcount
+    conn.commit()
+    conn.close()
+    return requeued
+
+class WorkerPool:
+    """
+    A fixed number of threads that take jobs from the SQLite queue and run them.
+
+    Every web process can start its own pool; jobs are claimed through the database,
+    so each one runs exactly once and its state is visible to every process.
+
+    Args:
+        handler (callable): Called as handler(job) for each claimed job. It returns the
+            number of results, and can report progress through update_job_progress.
+        workers (int, optional): Number of threads. Defaults to CRAWLER_WORKERS or 2.
+    """
+
+    def __init__(self, handler, workers=DEFAULT_WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self.threads = []
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.last_requeue = 0.0
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            requeue_stale_jobs()
+            self.last_requeue = time.monotonic()
+            for index in range(self.workers):
+                worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+                thread = threading.Thread(target=self._run, args=(worker_id,), daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def notify(self):
+        # Wake an idle worker in this process instead of waiting for the next poll
+        self.wakeup.set()
+
+    def _run(self, worker_id):
+        while not self.stopping.is_set():
+            try:
+                self._requeue_if_due()
+                job = claim_next_job(worker_id)
+            except sqlite3.Error:
+                # A locked or busy database must not end the worker; try again on the next poll
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self.wakeup.wait(POLL_INTERVAL)
+                self.wakeup.clear()
+                continue
+            try:
+                results_count = self.handler(job)
+            except Exception as e:
+                traceback.print_exc()
+                self._record(fail_job, job['id'], str(e))
+            else:
+                self._record(finish_job, job['id'], results_count)
+
+    def _requeue_if_due(self):
+        # Jobs left running by a dead worker, or by _record, go back on the queue
+        # without waiting for the next process start
+        with self.lock:
+            if time.monotonic() - self.last_requeue < REQUEUE_INTERVAL:
+                return
+            self.last_requeue = time.monotonic()
+        requeue_stale_jobs()
+
+    def _record(self, update, job_id, *args):
+        try:
+            update(job_id, *args)
+        except sqlite3.Error:
+            # The job stays 'running' until requeue_stale_jobs finds it; the worker carries on
+            traceback.print_exc()
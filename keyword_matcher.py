@@ -0,0 +1,107 @@
+from collections import deque
+from functools import lru_cache
+
+class KeywordMatcher:
+    """
+    Case-insensitive multi-keyword matcher backed by an Aho-Corasick automaton.
+
+    The automaton is built once per keyword list, and each text is then scanned in a
+    single pass whose cost does not depend on how many keywords there are.
+
+    Args:
+        keywords (list): The keywords to look for, in the order they should be reported
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.patterns = [keyword.lower() for keyword in self.keywords]
+
+        # Trie of lowercased keywords: transitions, failure links and the keyword
+        # indices that end at each node
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        # An empty keyword is a substring of every text, as with `keyword in text`,
+        # so it has no place in the trie and is reported for every text instead
+        self.empty = [index for index, pattern in enumerate(self.patterns) if not pattern]
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = child
+                node = child
+            self.output[node].append(index)
+
+        # Breadth-first pass to fill in failure links and merge outputs
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def iter_matches(self, text):
+        """
+        Yield (keyword, start, end) for every occurrence of every keyword in the text.
+
+        Offsets refer to the lowercased text, which matches the original for
+        everything except a handful of exotic Unicode characters.
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        for index in self.empty:
+            yield self.keywords[index], 0, 0
+        node = 0
+        for position, char in enumerate(text.lower()):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in output[node]:
+                yield self.keywords[index], position - len(self.patterns[index]) + 1, position + 1
+
+    def find_all(self, text):
+        """
+        Return every match in the text as a list of (keyword, start, end) tuples.
+        """
+        return list(self.iter_matches(text))
+
+    def matched_keywords(self, *texts):
+        """
+        Return the keywords found in any of the texts, in keyword list order.
+        """
+        # Empty keywords match even empty texts
+        found = {self.keywords[index] for index in self.empty} if texts else set()
+        for text in texts:
+            if not text:
+                continue
+            found.update(match[0] for match in self.iter_matches(text))
+        return [keyword for keyword in self.keywords if keyword in found]
+
+@lru_cache(maxsize=32)
+def _compile(keywords):
+    return KeywordMatcher(keywords)
+
+def compile_keywords(keywords):
+    """
+    Return a matcher for the keyword list, reusing a previously built one when possible.
+
+    Args:
+        keywords (list): The keywords to look for
+
+    Returns:
+        KeywordMatcher: The compiled matcher
+    """
+    return _compile(tuple(keywords))
@@ -1,42 +1,294 @@
-import requests
+import os
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from summary_cache import cached_summary, get_cached, store
+
+# Where Ollama is running; every call in the app goes through this one setting
+OLLAMA_URL = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+
+# Seconds to wait for a connection, and for the model between chunks of output
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 5))
+OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 300))
+
+# Retries for refused connections and 502/503/504 answers, with exponential backoff
+OLLAMA_RETRIES = int(os.environ.get('OLLAMA_RETRIES', 3))
+OLLAMA_BACKOFF = float(os.environ.get('OLLAMA_BACKOFF', 0.5))
+
+# Default number of summaries generated at once by summarize_texts
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get('OLLAMA_MAX_CONCURRENCY', 4))
+
+# Token budget for the text of one prompt; larger inputs are summarized in chunks
+SUMMARY_CHUNK_TOKENS = int(os.environ.get('SUMMARY_CHUNK_TOKENS', 3000))
+
+# On average one chunk ends every this many posts, wherever the budget allows
+CHUNK_BOUNDARY_EVERY = 8
+
+# Stop reducing after this many levels even if the partial summaries are still over budget
+MAX_REDUCE_LEVELS = 3
+
+CHUNK_PROMPT = "Summarize the key themes and common issues in the following Reddit posts. Be concise and keep any details that could matter for a class action:\n\n{text}"
+
+SUMMARY_PROMPT = "You are talking to an experienced attorney. Summarize the following Reddit posts and explain if they can come together in some sort of possible class action case. Additionally, if any one case has the potential to be a class action, highlight that and make it known.:\n\n{text}"
+
+CONNECTION_ERROR_MESSAGE = f"Error: Could not connect to Ollama. Make sure it is running on {OLLAMA_URL.split('://')[-1]}."
+
+class OllamaError(Exception):
+    """
+    Raised when Ollama answers with a non-200 status code.
+    """
+
+    def __init__(self, status_code):
+        super().__init__(f"Ollama returned status code {status_code}")
+        self.status_code = status_code
+
+class OllamaClient:
+    """
+    Shared HTTP client for the Ollama generate API.
+
+    Keeps a pool of keep-alive connections, applies timeouts to every call and
+    retries connection failures and gateway errors with backoff.
+
+    Args:
+        base_url (str, optional): Ollama server URL. Defaults to OLLAMA_URL.
+        pool_size (int, optional): Connections kept open. Defaults to 10.
+    """
+
+    def __init__(self, base_url=OLLAMA_URL, pool_size=10, retries=OLLAMA_RETRIES, backoff=OLLAMA_BACKOFF,
+                 connect_timeout=OLLAMA_CONNECT_TIMEOUT, read_timeout=OLLAMA_READ_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # never re-run a generation the server may still be working on
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def generate(self, prompt, model="llama3"):
+        """
+        Run one non-streaming generation and return the full response text.
+        """
+        response = self.session.post(f"{self.base_url}/api/generate",
+                                     json={"model": model, "prompt": prompt, "stream": False},
+                                     timeout=self.timeout)
+        if response.status_code != 200:
+            raise OllamaError(response.status_code)
+        return response.json().get('response', '')
+
+    def stream_generate(self, prompt, model="llama3"):
+        """
+        Run one streaming generation and yield the response text piece by piece.
+        """
+        response = self.session.post(f"{self.base_url}/api/generate",
+                                     json={"model": model, "prompt": prompt},
+                                     stream=True, timeout=self.timeout)
+        try:
+            if response.status_code != 200:
+                raise OllamaError(response.status_code)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    json_response = json.loads(line.decode('utf-8'))
+                except json.JSONDecodeError:
+                    continue
+                if json_response.get('response'):
+                    yield json_response['response']
+        finally:
+            response.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Return the process-wide Ollama client, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+def generate_cached(template, text, model="llama3"):
+    """
+    Fill the prompt template with the text and generate, reusing a cached answer for the same
+    model, template and text.
+
+    Args:
+        template (str): Prompt with a {text} placeholder
+        text (str): The text to summarize
+        model (str, optional): The Ollama model name. Defaults to "llama3".
+
+    Returns:
+        str: The generated (or cached) response
+    """
+    return cached_summary(model, template, text,
+                          lambda: get_client().generate(template.format(text=text), model))
 
 def summarize_text(text, model="llama3"):
     """
     Send text to a locally running Ollama model and return a summary.
-    
+
     Args:
         text (str): The Reddit post content to summarize
         model (str, optional): The Ollama model name. Defaults to "llama3".
-        
+
     Returns:
         str: The generated summary from Ollama or an error message
     """
     try:
-        # Prepare the request
-        url = "http://localhost:11434/api/generate"
-        prompt = f"You are talking to an experienced attorney. Summarize the following Reddit posts and explain if they can come together in some sort of possible class action case. Additionally, if any one case has the potential to be a class action, highlight that and make it known.:\n\n{text}"
-        
-        payload = {
-            "model": model,
-            "prompt": prompt,
-            "stream": False
-        }
-        
-        # Send the request with stream=False to get a single complete response
-        response = requests.post(url, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            return f"Error: Ollama returned status code {response.status_code}"
-        
-        # Process the non-streaming response
-        json_response = response.json()
-        summary = json_response.get('response', '')
-        
-        return summary
-    
+        return generate_cached(SUMMARY_PROMPT, text, model)
+    except OllamaError as e:
+        return f"Error: {e}"
     except requests.exceptions.ConnectionError:
-        return "Error: Could not connect to Ollama. Make sure it is running on localhost:11434."
+        return CONNECTION_ERROR_MESSAGE
     except Exception as e:
-        return f"Error: An unexpected error occurred: {str(e)}"
\ No newline at end of file
+        return f"Error: An unexpected error occurred: {str(e)}"
+
+def summarize_texts(texts, model="llama3", max_concurrency=OLLAMA_MAX_CONCURRENCY):
+    """
+    Summarize many texts at once, with at most max_concurrency requests in flight.
+
+    Args:
+        texts (list): The texts to summarize
+        model (str, optional): The Ollama model name. Defaults to "llama3".
+        max_concurrency (int, optional): Requests sent at the same time.
+
+    Returns:
+        list: One summary or error message per text, in input order
+    """
+    if not texts:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(texts)))) as executor:
+        return list(executor.map(lambda text: summarize_text(text, model), texts))
+
+def estimate_tokens(text):
+    """
+    Rough token count for budgeting prompts (about four characters per token).
+    """
+    return len(text) // 4 + 1
+
+def chunk_texts(texts, token_budget=SUMMARY_CHUNK_TOKENS):
+    """
+    Split texts into consecutive chunks that each fit in the token budget.
+
+    Chunk boundaries come from the content of the texts (a chunk ends after a text whose
+    hash picks it as a boundary) as well as from the budget, so adding or changing one
+    text only changes the chunk it lands in and the cached summaries of the others stay valid.
+
+    Args:
+        texts (list): The texts to group, in order
+        token_budget (int, optional): Maximum estimated tokens per chunk
+
+    Returns:
+        list: Lists of texts; a single text larger than the budget gets a chunk of its own
+    """
+    chunks = []
+    chunk = []
+    chunk_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if chunk and chunk_tokens + tokens > token_budget:
+            chunks.append(chunk)
+            chunk = []
+            chunk_tokens = 0
+        chunk.append(text)
+        chunk_tokens += tokens
+        if int(hashlib.md5(text.encode('utf-8')).hexdigest(), 16) % CHUNK_BOUNDARY_EVERY == 0:
+            chunks.append(chunk)
+            chunk = []
+            chunk_tokens = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def summarize_map_reduce(texts, template, model="llama3", token_budget=SUMMARY_CHUNK_TOKENS,
+                         max_concurrency=OLLAMA_MAX_CONCURRENCY, separator="\n\n---\n\n"):
+    """
+    Summarize texts too large for one prompt: summarize token-budgeted chunks in parallel,
+    then summarize the partial summaries with the final template.
+
+    Partial summaries go through the summary cache, so re-running after one text changes
+    only regenerates the affected chunk. When the partial summaries are themselves over the
+    budget they are reduced again, level by level.
+
+    Args:
+        texts (list): The texts to summarize
+        template (str): Prompt with a {text} placeholder for the final answer
+        model (str, optional): The Ollama model name. Defaults to "llama3".
+        token_budget (int, optional): Maximum estimated tokens of text per prompt
+        max_concurrency (int, optional): Chunk summaries generated at the same time
+        separator (str, optional): Placed between texts within a prompt
+
+    Returns:
+        str: The final summary
+
+    Raises:
+        OllamaError: If Ollama answers with an error status
+        requests.exceptions.ConnectionError: If Ollama cannot be reached
+    """
+    return generate_cached(template, separator.join(reduce_texts(texts, model, token_budget, max_concurrency, separator)), model)
+
+def reduce_texts(texts, model="llama3", token_budget=SUMMARY_CHUNK_TOKENS,
+                 max_concurrency=OLLAMA_MAX_CONCURRENCY, separator="\n\n---\n\n"):
+    """
+    Replace texts by summaries of their chunks until they fit the token budget together.
+
+    Returns:
+        list: The texts unchanged when they already fit, otherwise the partial summaries
+    """
+    texts = list(texts)
+    levels = 0
+    while estimate_tokens(separator.join(texts)) > token_budget and len(texts) > 1 and levels < MAX_REDUCE_LEVELS:
+        levels += 1
+        chunks = chunk_texts(texts, token_budget)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(chunks)))) as executor:
+            texts = list(executor.map(
+                lambda chunk: generate_cached(CHUNK_PROMPT, separator.join(chunk), model), chunks))
+    return texts
+
+def stream_cached(template, text, model="llama3"):
+    """
+    Like generate_cached, but yield the response piece by piece as Ollama produces it.
+
+    A cached answer is yielded in one piece. A fresh answer is cached only once it has been
+    streamed completely; closing the generator early closes the connection to Ollama, which
+    stops the generation.
+    """
+    summary = get_cached(model, template, text)
+    if summary is not None:
+        yield summary
+        return
+
+    pieces = []
+    tokens = get_client().stream_generate(template.format(text=text), model)
+    try:
+        for token in tokens:
+            pieces.append(token)
+            yield token
+    finally:
+        tokens.close()
+    store(model, template, text, ''.join(pieces))
+
+def stream_map_reduce(texts, template, model="llama3", token_budget=SUMMARY_CHUNK_TOKENS,
+                      max_concurrency=OLLAMA_MAX_CONCURRENCY, separator="\n\n---\n\n"):
+    """
+    Like summarize_map_reduce, but stream the final summary. Chunk summaries are generated
+    (or read from the cache) before the first piece is yielded.
+    """
+    reduced = reduce_texts(texts, model, token_budget, max_concurrency, separator)
+    yield from stream_cached(template, separator.join(reduced), model)
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import deque
+
+# Reddit allows 100 queries per minute for OAuth clients
+REDDIT_REQUESTS_PER_MINUTE = 100
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to keep concurrent workers under a shared request rate.
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (int, optional): Maximum burst size. Defaults to 1.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Block until the requested number of tokens is available, then take them.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+class FairRateLimiter:
+    """
+    Share one TokenBucket between named clients, handing out tokens round robin.
+
+    Each client (e.g. the crawl of one subreddit) gets its turn in order among the
+    clients that are waiting, so a subreddit with many workers cannot starve the others.
+
+    Args:
+        bucket (TokenBucket): The shared request budget
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.condition = threading.Condition()
+        self.turns = deque()
+        self.waiting = {}
+        self.busy = False
+
+    def _next_client(self):
+        for name in self.turns:
+            if self.waiting.get(name):
+                return name
+        return None
+
+    def acquire(self, name, tokens=1):
+        """
+        Block until it is this client's turn and the shared bucket has the tokens.
+        """
+        with self.condition:
+            self.waiting[name] = self.waiting.get(name, 0) + 1
+            if name not in self.turns:
+                self.turns.append(name)
+            while self.busy or self._next_client() != name:
+                self.condition.wait()
+            self.busy = True
+        try:
+            self.bucket.acquire(tokens)
+        finally:
+            with self.condition:
+                self.busy = False
+                self.waiting[name] -= 1
+                # Served clients go to the back of the line
+                self.turns.remove(name)
+                self.turns.append(name)
+                self.condition.notify_all()
+
+    def client(self, name):
+        """
+        Return a limiter with the TokenBucket interface that draws from this budget as `name`.
+        """
+        return ClientRateLimiter(self, name)
+
+class ClientRateLimiter:
+    """
+    One client's view of a FairRateLimiter, usable wherever a TokenBucket is expected.
+    """
+
+    def __init__(self, limiter, name):
+        self.limiter = limiter
+        self.name = name
+
+    def acquire(self, tokens=1):
+        self.limiter.acquire(self.name, tokens)
+
+# Shared by every crawl in this process so parallel workers stay inside Reddit's limit.
+# It is per process: each gunicorn worker has its own, so the budget is multiplied by
+# the number of workers using the same Reddit credentials.
+reddit_rate_limiter = TokenBucket(REDDIT_REQUESTS_PER_MINUTE / 60.0, capacity=10)
@@ -1,63 +1,193 @@
-import praw
-import pandas as pd
 import datetime
-import os
-import nltk
-from nltk.tokenize import sent_tokenize
-from nltk.corpus import stopwords
-from nltk.cluster.util import cosine_distance
-import numpy as np
-import networkx as nx
-
-# Download necessary NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+import logging
+import threading
+from functools import lru_cache
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from keyword_matcher import compile_keywords
+from scoring import CLASS_ACTION_KEYWORDS, rank_posts
+from rate_limit import reddit_rate_limiter, FairRateLimiter
+from summary_cache import cached_summary, get_cached, store
+from db import get_crawl_state, save_crawl_state, get_stored_post_ids, update_post_stats
+from run_stats import refresh_run_stats
+
+logger = logging.getLogger(__name__)
+
+# praw, pandas, NLTK and the NumPy/SciPy summarizer are imported where they are
+# used, so importing this module (the web app and `run_crawler.py --help` do) stays cheap
+
+@lru_cache(maxsize=None)
+def nltk_resources():
+    """
+    Import NLTK and check its data once per process, downloading what is missing.
+
+    Returns:
+        tuple: The sentence tokenizer and the set of English stopwords
+    """
+    import nltk
+    from nltk.tokenize import sent_tokenize
+    from nltk.corpus import stopwords
+
+    for resource, package in (('tokenizers/punkt', 'punkt'), ('corpora/stopwords', 'stopwords')):
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            nltk.download(package)
+
+    return sent_tokenize, frozenset(stopwords.words('english'))
 
 # Function to summarize text using extractive summarization
 def generate_summary(text, num_sentences=5):
+    sent_tokenize, stop_words = nltk_resources()
+    
     # If text is too short, return it as is
     sentences = sent_tokenize(text)
     if len(sentences) <= num_sentences:
         return text
     
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    
-    # Create similarity matrix
-    similarity_matrix = np.zeros((len(sentences), len(sentences)))
-    
-    for i in range(len(sentences)):
-        for j in range(len(sentences)):
-            if i != j:
-                similarity_matrix[i][j] = sentence_similarity(sentences[i], sentences[j], stop_words)
-    
-    # Create graph and use pagerank algorithm to rank sentences
-    sentence_similarity_graph = nx.from_numpy_array(similarity_matrix)
-    scores = nx.pagerank(sentence_similarity_graph)
-    
-    # Sort sentences by score and select top ones
-    ranked_sentences = sorted(((scores[i], s) for i, s in enumerate(sentences)), reverse=True)
-    
-    # Get the top n sentences as summary
-    summary_sentences = [ranked_sentences[i][1] for i in range(min(num_sentences, len(ranked_sentences)))]
-    
-    # Sort the selected sentences based on their original order
-    summary_sentences.sort(key=lambda sentence: sentences.index(sentence))
+    def compute():
+        from extractive_summarizer import rank_sentences
+        
+        # Rank sentences with one sparse similarity product and a vectorized pagerank
+        summary_sentences = rank_sentences(sentences, stop_words, num_sentences)
+        
+        # Join the selected sentences
+        return ' '.join(summary_sentences)
     
-    # Join the selected sentences
-    summary = ' '.join(summary_sentences)
+    # Posts seen by earlier crawls reuse the stored summary
+    return cached_summary('textrank', f"sentences={num_sentences}", text, compute)
+
+# Function run in NLP worker processes: generate_summary without the summary cache
+def textrank_summary(text, num_sentences=5):
+    sent_tokenize, stop_words = nltk_resources()
+    sentences = sent_tokenize(text)
+    if len(sentences) <= num_sentences:
+        return text
     
-    return summary
+    from extractive_summarizer import rank_sentences
+    return ' '.join(rank_sentences(sentences, stop_words, num_sentences))
+
+class SummaryStage:
+    """
+    Summarize crawled posts in worker processes, apart from the threads doing network I/O.
+
+    Sentence tokenization and TextRank hold the GIL, so run inline they stall the fetch
+    threads. Here they run in a process pool fed through a bounded queue: submit() blocks
+    once max_pending posts are waiting, which in turn holds back the fetches. Summaries
+    are looked up in and saved to the summary cache in this process, so only cache
+    misses are sent to the workers.
+
+    Args:
+        processes (int): Worker processes
+        max_pending (int, optional): Posts queued or being summarized before submit()
+            blocks. Defaults to twice the number of processes.
+        num_sentences (int, optional): Sentences per summary. Defaults to 5.
+        summarize (callable, optional): Module-level function called as
+            summarize(text, num_sentences) in the workers. Defaults to textrank_summary.
+        model (str, optional): Name its summaries are cached under. Defaults to 'textrank'.
+    """
+
+    def __init__(self, processes, max_pending=None, num_sentences=5, summarize=None, model='textrank'):
+        import multiprocessing
+        # Spawned workers do not inherit the crawl threads' locks or database connections
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        self.slots = threading.BoundedSemaphore(max_pending or processes * 2)
+        self.num_sentences = num_sentences
+        self.summarize = summarize or textrank_summary
+        self.model = model
+        self.template = f"sentences={num_sentences}"
 
-# Function to calculate similarity between sentences
+    def submit(self, post_data):
+        """
+        Fill in post_data['summary'] if fetch_post_details left it out.
+
+        Returns:
+            Future: Resolves to post_data once it has its summary
+        """
+        future = Future()
+        text = post_data.get('content')
+        if 'summary' in post_data:
+            future.set_result(post_data)
+            return future
+        
+        summary = get_cached(self.model, self.template, text)
+        if summary is not None:
+            post_data['summary'] = summary
+            future.set_result(post_data)
+            return future
+        
+        self.slots.acquire()
+        
+        def finish(summarized):
+            self.slots.release()
+            # An error raised here would be swallowed by the executor and leave the
+            # future unresolved, blocking the crawl that waits on it
+            try:
+                summary = summarized.result()
+                # Texts too short to rank come back unchanged and are not cached, as in generate_summary
+                if summary != text:
+                    store(self.model, self.template, text, summary)
+                post_data['summary'] = summary
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            future.set_result(post_data)
+        
+        try:
+            self.executor.submit(self.summarize, text, self.num_sentences).add_done_callback(finish)
+        except BaseException:
+            self.slots.release()
+            raise
+        return future
+
+    def after(self, fetched):
+        """
+        Summarize the post a fetch future returns once it is done.
+
+        Returns:
+            Future: Resolves to the summarized post
+        """
+        future = Future()
+        
+        def forward(fetched):
+            if fetched.cancelled():
+                future.cancel()
+            elif fetched.exception() is not None:
+                future.set_exception(fetched.exception())
+            else:
+                try:
+                    summarized = self.submit(fetched.result())
+                except BaseException as e:
+                    future.set_exception(e)
+                    return
+                summarized.add_done_callback(lambda summarized: _copy_result(summarized, future))
+        
+        fetched.add_done_callback(forward)
+        return future
+
+    def close(self):
+        """
+        Wait for queued summaries and stop the worker processes.
+        """
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _copy_result(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+# Function to calculate similarity between sentences (reference implementation,
+# extractive_summarizer.similarity_matrix computes all pairs at once)
 def sentence_similarity(sent1, sent2, stop_words):
+    from nltk.cluster.util import cosine_distance
+    
     sent1 = [w.lower() for w in sent1.split() if w.lower() not in stop_words]
     sent2 = [w.lower() for w in sent2.split() if w.lower() not in stop_words]
     
@@ -82,13 +212,114 @@ def sentence_similarity(sent1, sent2, stop_words):
     # Calculate cosine similarity
     return 1 - cosine_distance(vector1, vector2)
 
+# Function to fetch the details, summary and top comments of a single post
+def fetch_post_details(post, comment_limit=5, rate_limiter=None, summarize=True, reddit=None):
+    # The listing already loaded the post's own fields; with a client, the comments are
+    # fetched through it rather than through the client the post came from
+    # Get post details
+    post_data = {
+        'title': post.title,
+        'score': post.score,
+        'id': post.id,
+        'url': post.url,
+        'created_utc': datetime.datetime.fromtimestamp(post.created_utc).strftime('%Y-%m-%d %H:%M:%S'),
+        'author': str(post.author),
+        'num_comments': post.num_comments,
+        'permalink': f'https://www.reddit.com{post.permalink}',
+    }
+    
+    # Get post content
+    if hasattr(post, 'selftext') and post.selftext:
+        post_data['content'] = post.selftext
+        # Generate summary if content is long enough
+        if len(post.selftext.split()) > 50:  # Only summarize if more than 50 words
+            # Without summarize the summary is left to a SummaryStage
+            if summarize:
+                post_data['summary'] = generate_summary(post.selftext)
+        else:
+            post_data['summary'] = post.selftext
+    else:
+        post_data['content'] = '[No text content]'
+        post_data['summary'] = '[No text content]'
+    
+    # Get top comments (this is the network round-trip, so it counts against the rate limit)
+    if rate_limiter:
+        rate_limiter.acquire()
+    post_data['top_comments'] = []
+    source = reddit.submission(id=post.id) if reddit is not None else post
+    source.comment_sort = 'top'
+    source.comments.replace_more(limit=0)  # Skip 'load more comments' links
+    for comment in source.comments[:comment_limit]:
+        comment_data = {
+            'id': comment.id,
+            'author': str(comment.author),
+            'score': comment.score,
+            'body': comment.body,
+            'created_utc': datetime.datetime.fromtimestamp(comment.created_utc).strftime('%Y-%m-%d %H:%M:%S')
+        }
+        post_data['top_comments'].append(comment_data)
+    
+    return post_data
+
+# Reddit returns listings 100 posts per request
+LISTING_PAGE_SIZE = 100
+
+def rate_limited(listing, rate_limiter, page_size=LISTING_PAGE_SIZE):
+    """
+    Iterate over a listing, taking a token from the rate limiter before each page is requested.
+    """
+    iterator = iter(listing)
+    count = 0
+    while True:
+        if rate_limiter and count % page_size == 0:
+            rate_limiter.acquire()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        count += 1
+        yield item
+
+def worker_client(reddit):
+    """
+    Return a new client with the settings of `reddit`, for use by one fetch thread.
+
+    PRAW clients must not be shared between threads, so every fetch thread makes its
+    requests through its own one. For other clients, like the fakes in the tests, this
+    is None and posts fetch their comments through the client they came from.
+    """
+    import praw
+    if not isinstance(reddit, praw.Reddit):
+        return None
+    config = reddit.config
+    settings = {}
+    for name in ('client_id', 'client_secret', 'user_agent', 'username', 'password', 'refresh_token',
+                 'redirect_uri', 'oauth_url', 'reddit_url'):
+        # Settings that are not configured are falsy placeholders
+        if getattr(config, name):
+            settings[name] = getattr(config, name)
+    return praw.Reddit(**settings)
+
+# The client of each fetch thread, set up when the thread starts
+_fetch_thread = threading.local()
+
+def _start_fetch_thread(reddit):
+    _fetch_thread.reddit = worker_client(reddit)
+
+def _fetch_in_thread(post, comment_limit, rate_limiter, summarize):
+    return fetch_post_details(post, comment_limit, rate_limiter, summarize, reddit=_fetch_thread.reddit)
+
 # Function to crawl Reddit
-def crawl_reddit(subreddit_name, post_limit=10, comment_limit=5, days_limit=30, filter_keywords=None):
+def crawl_reddit(subreddit_name, post_limit=10, comment_limit=5, days_limit=30, filter_keywords=None,
+                 workers=1, rate_limiter=reddit_rate_limiter, reddit=None, stop_at=None, state=None, progress=None,
+                 on_result=None, nlp_stage=None):
     # Initialize Reddit API client
     # Note: You need to create a Reddit app and get these credentials
     # Visit https://www.reddit.com/prefs/apps to create an app
     # This will automatically use credentials from praw.ini
-    reddit = praw.Reddit()   
+    if reddit is None:
+        import praw
+        reddit = praw.Reddit()
     
     # Access the subreddit
     subreddit = reddit.subreddit(subreddit_name)
@@ -101,77 +332,300 @@ def crawl_reddit(subreddit_name, post_limit=10, comment_limit=5, days_limit=30,
     posts_data = []
     matches_found = 0
     
+    # Build the keyword automaton once for the whole crawl
+    keyword_matcher = compile_keywords(filter_keywords) if filter_keywords else None
+    
+    # With more than one worker, comment trees are fetched in a bounded pool
+    # while the listing keeps streaming; results keep their listing order. Each
+    # pool thread has a client of its own, the listing keeps this one.
+    executor = ThreadPoolExecutor(max_workers=workers, initializer=_start_fetch_thread,
+                                  initargs=(reddit,)) if workers > 1 else None
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    pending = []
+    
+    # Hand finished posts to on_result as soon as their comments are in
+    def report_result(future):
+        if not future.cancelled() and future.exception() is None:
+            on_result(future.result())
+    
     # Get new posts from the subreddit
     posts_processed = 0
-    for post in subreddit.new(limit=post_limit*2):  # Fetch more posts to account for filtering
-        posts_processed += 1
-        print(f"Processing post {posts_processed}: {post.title[:50]}...")
-        
-        # Skip stickied posts and posts older than the cutoff date
-        if post.stickied or post.created_utc < cutoff_timestamp:
-            print("  Skipping: Stickied or too old")
-            continue
+    reached_mark = False
+    try:
+        # Fetch more posts to account for filtering; listing pages count against the rate limit too
+        for post in rate_limited(subreddit.new(limit=post_limit*2), rate_limiter):
+            # Report the counts so far before handling the next post
+            if progress:
+                progress(posts_processed, matches_found)
+            
+            # Stop paging once we reach the newest post a previous run already saw
+            if stop_at and (post.id == stop_at[1] or post.created_utc < stop_at[0]):
+                logger.info("Reached previously crawled post %s, stopping", post.id)
+                reached_mark = True
+                break
             
-        # If filter keywords are provided, check if any keyword is in the title or selftext
-        if filter_keywords:
-            title_lower = post.title.lower()
-            selftext_lower = post.selftext.lower() if hasattr(post, 'selftext') else ''
+            # The listing is newest first, so the first post is the new high-water mark
+            if state is not None and 'newest_post_id' not in state:
+                state['newest_created_utc'] = post.created_utc
+                state['newest_post_id'] = post.id
             
-            # Check if any keyword is in the title or selftext
-            matched_keywords = [keyword for keyword in filter_keywords if keyword.lower() in title_lower or keyword.lower() in selftext_lower]
-            if matched_keywords:
-                matches_found += 1
-                print(f"  MATCH FOUND! Keywords: {', '.join(matched_keywords)}")
-                print(f"  Title: {post.title}")
-                print(f"  URL: https://www.reddit.com{post.permalink}")
+            posts_processed += 1
+            logger.debug("Processing post %d: %.50s...", posts_processed, post.title)
+            
+            # Skip stickied posts and posts older than the cutoff date
+            if post.stickied or post.created_utc < cutoff_timestamp:
+                logger.debug("  Skipping: Stickied or too old")
+                continue
+                
+            # If filter keywords are provided, check if any keyword is in the title or selftext
+            if keyword_matcher:
+                selftext = post.selftext if hasattr(post, 'selftext') else ''
+                
+                # Check if any keyword is in the title or selftext
+                matched_keywords = keyword_matcher.matched_keywords(post.title, selftext)
+                if matched_keywords:
+                    matches_found += 1
+                    logger.info("MATCH FOUND! Keywords: %s | %s | https://www.reddit.com%s",
+                                ', '.join(matched_keywords), post.title, post.permalink)
+                else:
+                    logger.debug("  No keyword matches found, skipping")
+                    continue  # Skip this post if no keywords match
+            
+            # With an NLP stage, posts are summarized in worker processes after their fetch
+            if executor:
+                # Block the listing when the pool is saturated so memory stays bounded
+                in_flight.acquire()
+                future = executor.submit(_fetch_in_thread, post, comment_limit, rate_limiter, nlp_stage is None)
+                future.add_done_callback(lambda _: in_flight.release())
+                if nlp_stage:
+                    future = nlp_stage.after(future)
+                if on_result:
+                    future.add_done_callback(report_result)
+                pending.append(future)
+            elif nlp_stage:
+                future = nlp_stage.submit(fetch_post_details(post, comment_limit, rate_limiter, summarize=False))
+                if on_result:
+                    future.add_done_callback(report_result)
+                pending.append(future)
             else:
-                print(f"  No keyword matches found, skipping")
-                continue  # Skip this post if no keywords match
+                posts_data.append(fetch_post_details(post, comment_limit, rate_limiter))
+                if on_result:
+                    on_result(posts_data[-1])
         
-        # Get post details
-        post_data = {
-            'title': post.title,
-            'score': post.score,
-            'id': post.id,
-            'url': post.url,
-            'created_utc': datetime.datetime.fromtimestamp(post.created_utc).strftime('%Y-%m-%d %H:%M:%S'),
-            'author': str(post.author),
-            'num_comments': post.num_comments,
-            'permalink': f'https://www.reddit.com{post.permalink}',
-        }
+        # Every post newer than the old mark was seen, unless the post limit cut the listing short
+        if state is not None:
+            state['complete'] = not stop_at or reached_mark or posts_processed < post_limit*2
         
-        # Get post content
-        if hasattr(post, 'selftext') and post.selftext:
-            post_data['content'] = post.selftext
-            # Generate summary if content is long enough
-            if len(post.selftext.split()) > 50:  # Only summarize if more than 50 words
-                post_data['summary'] = generate_summary(post.selftext)
-            else:
-                post_data['summary'] = post.selftext
+        posts_data.extend(future.result() for future in pending)
+        if progress:
+            progress(posts_processed, matches_found)
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    logger.info("Crawling complete. Found %d posts matching the filter criteria out of %d processed posts.",
+                matches_found, posts_processed)
+    return posts_data
+
+# Stored posts whose score and comment count an incremental crawl refreshes: the
+# newest ones, at most this many and this many days old (or the crawl's own limit)
+REFRESH_POST_LIMIT = 500
+REFRESH_DAYS = 7
+
+# Function to refresh score and comment count for posts we already have
+def refresh_post_stats(reddit, post_ids, rate_limiter=reddit_rate_limiter):
+    stats = []
+    # reddit.info takes up to 100 fullnames per request
+    for start in range(0, len(post_ids), 100):
+        if rate_limiter:
+            rate_limiter.acquire()
+        fullnames = [f't3_{post_id}' for post_id in post_ids[start:start + 100]]
+        for post in reddit.info(fullnames=fullnames):
+            stats.append({'id': post.id, 'score': post.score, 'num_comments': post.num_comments})
+    return stats
+
+# Function to crawl only posts newer than the last run for this subreddit and keyword set
+def crawl_reddit_incremental(subreddit_name, post_limit=10, comment_limit=5, days_limit=30, filter_keywords=None,
+                             workers=1, rate_limiter=reddit_rate_limiter, reddit=None, progress=None, on_result=None,
+                             nlp_stage=None, marks=None):
+    # With a marks list the new high-water mark is appended to it as save_crawl_state
+    # arguments, for the caller to save once the crawled posts are stored
+    if reddit is None:
+        import praw
+        reddit = praw.Reddit()
+    
+    mark = get_crawl_state(subreddit_name, filter_keywords)
+    stop_at = (mark['newest_created_utc'], mark['newest_post_id']) if mark else None
+    
+    state = {}
+    posts_data = crawl_reddit(subreddit_name, post_limit, comment_limit, days_limit, filter_keywords,
+                              workers=workers, rate_limiter=rate_limiter, reddit=reddit,
+                              stop_at=stop_at, state=state, progress=progress, on_result=on_result,
+                              nlp_stage=nlp_stage)
+    
+    # Posts stored by earlier runs are not re-processed, only the stats of recent ones
+    # are refreshed; older posts have mostly settled and would cost a request per 100
+    if mark:
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=min(days_limit, REFRESH_DAYS))
+        stored_ids = get_stored_post_ids(subreddit_name, cutoff.strftime('%Y-%m-%d %H:%M:%S'), REFRESH_POST_LIMIT)
+        if stored_ids:
+            # Runs showing a changed post get their dashboard aggregates recomputed, so
+            # /visualize and its cached charts agree with /results again
+            for run_id in update_post_stats(refresh_post_stats(reddit, stored_ids, rate_limiter)):
+                refresh_run_stats(run_id)
+            logger.info("Refreshed score and comment count for %d stored posts", len(stored_ids))
+    
+    # A crawl cut short before the old mark keeps it, so the next run still covers the
+    # posts between the last one fetched and the old mark
+    if 'newest_post_id' in state and not state['complete']:
+        logger.info("Post limit reached before the previous high-water mark; keeping the old mark")
+    elif 'newest_post_id' in state:
+        mark = (subreddit_name, filter_keywords, state['newest_created_utc'], state['newest_post_id'])
+        if marks is None:
+            save_crawl_state(*mark)
         else:
-            post_data['content'] = '[No text content]'
-            post_data['summary'] = '[No text content]'
+            marks.append(mark)
+    
+    return posts_data
+
+# Settings for one crawl, shared by the CLI and the web app
+@dataclass
+class CrawlConfig:
+    subreddit: str = 'legaladvice'
+    post_limit: int = 10
+    comment_limit: int = 5
+    days_limit: int = 30
+    filter_keywords: list = None
+    workers: int = 1
+    incremental: bool = False
+    nlp_processes: int = 0
+
+# Function to run a crawl described by a CrawlConfig
+def run_crawl(config, progress=None, on_result=None, reddit=None, rate_limiter=reddit_rate_limiter, nlp_stage=None,
+              marks=None):
+    """
+    Run a crawl in-process without touching sys.argv or stdout.
+
+    Args:
+        config (CrawlConfig): What to crawl
+        progress (callable, optional): Called as progress(posts_processed, matches_found)
+        on_result (callable, optional): Called with each matching post as soon as it is ready
+        reddit (praw.Reddit, optional): Client to use; a new one from praw.ini by default
+        rate_limiter (TokenBucket, optional): Request budget. Defaults to the process-wide one.
+        nlp_stage (SummaryStage, optional): Summarizer to share; one with config.nlp_processes
+            workers is started for this crawl by default, or summaries are made inline with 0
+        marks (list, optional): Collects the high-water marks of incremental crawls for
+            the caller to pass to save_crawl_state once the posts are stored; without it
+            they are saved as soon as the crawl ends
+
+    Returns:
+        list: The matching posts
+    """
+    if nlp_stage is None and config.nlp_processes > 0:
+        with SummaryStage(config.nlp_processes) as nlp_stage:
+            return run_crawl(config, progress, on_result, reddit, rate_limiter, nlp_stage, marks)
+    
+    # Incremental runs skip posts an earlier run already stored
+    if config.incremental:
+        return crawl_reddit_incremental(config.subreddit, config.post_limit, config.comment_limit, config.days_limit,
+                                        config.filter_keywords, workers=config.workers, rate_limiter=rate_limiter,
+                                        reddit=reddit, progress=progress, on_result=on_result, nlp_stage=nlp_stage,
+                                        marks=marks)
+    return crawl_reddit(config.subreddit, config.post_limit, config.comment_limit, config.days_limit,
+                        config.filter_keywords, workers=config.workers, rate_limiter=rate_limiter, reddit=reddit,
+                        progress=progress, on_result=on_result, nlp_stage=nlp_stage)
+
+# Function to read a list of subreddits with optional per-subreddit post limits
+def parse_subreddits(spec, post_limit):
+    """
+    Parse "legaladvice:100, antiwork+consumerprotection:50" style subreddit lists.
+
+    Args:
+        spec (str or list): Subreddit names separated by commas, spaces or '+', each
+            optionally followed by ':<post limit>'
+        post_limit (int): Limit for subreddits that do not give their own
+
+    Returns:
+        list: (subreddit, post_limit) tuples in the order given, without duplicates
+    """
+    if not isinstance(spec, str):
+        spec = ' '.join(spec)
+    targets = {}
+    for item in spec.replace('+', ' ').replace(',', ' ').split():
+        name, _, limit = item.partition(':')
+        name = name.strip()
+        if name.lower().startswith('r/'):
+            name = name[2:]
+        if name:
+            targets[name] = int(limit) if limit else post_limit
+    return list(targets.items())
+
+# Function to crawl several subreddits at once as a single run
+def run_crawls(configs, progress=None, on_result=None, reddit=None, rate_limiter=reddit_rate_limiter, marks=None):
+    """
+    Crawl several subreddits in parallel and merge their results into one list.
+
+    All crawls share one request budget and one set of NLP worker processes; the budget
+    is handed out round robin between subreddits so a large crawl cannot starve a small
+    one. Each subreddit's thread lists posts through a client of its own (see worker_client).
+
+    Args:
+        configs (list): One CrawlConfig per subreddit, each with its own limits
+        progress (callable, optional): Called as progress(posts_processed, matches_found), summed over subreddits
+        on_result (callable, optional): Called with each matching post as soon as it is ready
+        reddit (praw.Reddit, optional): Client whose settings the crawls use; a new one from praw.ini by default
+        rate_limiter (TokenBucket, optional): Shared request budget. Defaults to the process-wide one.
+        marks (list, optional): Collects the high-water marks of incremental crawls (see run_crawl)
+
+    Returns:
+        list: The matching posts of every subreddit, newest first, each tagged with its 'subreddit'
+    """
+    if reddit is None:
+        import praw
+        reddit = praw.Reddit()
+    fair_limiter = FairRateLimiter(rate_limiter)
+    nlp_processes = max((config.nlp_processes for config in configs), default=0)
+    nlp_stage = SummaryStage(nlp_processes) if nlp_processes > 0 else None
+    
+    counts = {}
+    counts_lock = threading.Lock()
+    
+    def crawl_one(config):
+        def report_progress(posts_processed, matches_found):
+            with counts_lock:
+                counts[config.subreddit] = (posts_processed, matches_found)
+                totals = [sum(values) for values in zip(*counts.values())]
+            if progress:
+                progress(*totals)
         
-        # Get top comments
-        post_data['top_comments'] = []
-        post.comment_sort = 'top'
-        post.comments.replace_more(limit=0)  # Skip 'load more comments' links
-        for comment in post.comments[:comment_limit]:
-            comment_data = {
-                'author': str(comment.author),
-                'score': comment.score,
-                'body': comment.body,
-                'created_utc': datetime.datetime.fromtimestamp(comment.created_utc).strftime('%Y-%m-%d %H:%M:%S')
-            }
-            post_data['top_comments'].append(comment_data)
+        def tag(post):
+            post['subreddit'] = config.subreddit
+            if on_result:
+                on_result(post)
         
-        posts_data.append(post_data)
+        posts = run_crawl(config, progress=report_progress, on_result=tag, reddit=worker_client(reddit) or reddit,
+                          rate_limiter=fair_limiter.client(config.subreddit), nlp_stage=nlp_stage, marks=marks)
+        for post in posts:
+            post['subreddit'] = config.subreddit
+        return posts
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(configs))) as executor:
+            results = list(executor.map(crawl_one, configs))
+    finally:
+        if nlp_stage:
+            nlp_stage.close()
     
-    print(f"\nCrawling complete. Found {matches_found} posts matching the filter criteria out of {posts_processed} processed posts.")
+    # created_utc is formatted so that string order is time order
+    posts_data = [post for posts in results for post in posts]
+    posts_data.sort(key=lambda post: post['created_utc'], reverse=True)
+    logger.info("Crawled %d subreddits, %d matching posts in total", len(configs), len(posts_data))
     return posts_data
 
 # Function to save results to CSV
 def save_to_csv(posts_data, filename='clash_royale_posts.csv'):
+    import pandas as pd
+    
     # Create a DataFrame from the posts data
     df = pd.DataFrame(posts_data)
     
@@ -182,13 +636,11 @@ def save_to_csv(posts_data, filename='clash_royale_posts.csv'):
 # Function to filter posts for potential class action lawsuits
 def filter_class_action_posts(posts_data, keywords):
     filtered_posts = []
+    keyword_matcher = compile_keywords(keywords)
     
     for post in posts_data:
-        title_lower = post['title'].lower()
-        content_lower = post['content'].lower()
-        
         # Check if any keyword is in the title or content
-        if any(keyword.lower() in title_lower or keyword.lower() in content_lower for keyword in keywords):
+        if keyword_matcher.matched_keywords(post['title'], post['content']):
             filtered_posts.append(post)
     
     return filtered_posts
@@ -198,6 +650,9 @@ def print_summarized_posts(posts_data):
     for i, post in enumerate(posts_data, 1):
         print(f"\n{'-'*80}\n")
         print(f"{i}. {post['title']} (Score: {post['score']})")
+        if 'class_action_score' in post:
+            flag = ' - likely class action' if post['likely_class_action'] else ''
+            print(f"Class-action likelihood: {post['class_action_score']:.2f}{flag}")
         print(f"Posted by u/{post['author']} on {post['created_utc']}")
         print(f"URL: {post['permalink']}")
         print("\nSummary:")
@@ -214,14 +669,15 @@ def main():
     days_limit = 30  # Limit to posts from the last 30 days
     
     # Keywords for potential class action lawsuits
-    class_action_keywords = [
-        "class action", "anyone else", "same issue", "same problem",
-        "illegal", "wage theft", "false advertising", "scam", "unsafe", "defective"
-    ]
+    class_action_keywords = list(CLASS_ACTION_KEYWORDS)
     
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     print(f"Crawling r/{subreddit_name} for potential class action posts...")
     posts_data = crawl_reddit(subreddit_name, post_limit, comment_limit, days_limit, class_action_keywords)
     
+    # Most likely class actions first
+    posts_data = rank_posts(posts_data)
+    
     # Print summarized posts
     print_summarized_posts(posts_data)
     
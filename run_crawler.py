@@ -1,6 +1,14 @@
 import argparse
+import datetime
+import logging
+import os
 import sys
-from reddit_crawler import crawl_reddit, print_summarized_posts, save_to_csv, filter_class_action_posts
+import uuid
+from columnar import ColumnarWriter
+from scoring import CLASS_ACTION_KEYWORDS, CLASS_ACTION_THRESHOLD, rank_posts
+from reddit_crawler import CrawlConfig, run_crawl, run_crawls, parse_subreddits, print_summarized_posts, save_to_csv
+from db import init_db, save_run, save_crawl_state
+from run_stats import refresh_run_stats
 
 def main():
     # Create argument parser
@@ -8,7 +16,9 @@ def main():
     
     # Add arguments
     parser.add_argument('--subreddit', type=str, default='legaladvice',
-                        help='Subreddit to crawl (default: legaladvice)')
+                        help='Subreddit to crawl, or several separated by commas (default: legaladvice)')
+    parser.add_argument('--subreddits', nargs='+', metavar='NAME[:POSTS]',
+                        help='Crawl several subreddits in parallel as one run, each optionally with its own post limit')
     parser.add_argument('--posts', type=int, default=100,
                         help='Number of posts to fetch (default: 100)')
     parser.add_argument('--comments', type=int, default=5,
@@ -17,23 +27,43 @@ def main():
                         help='Limit to posts from the last N days (default: 30)')
     parser.add_argument('--output', type=str, default='legaladvice_classaction_matches.csv',
                         help='Output CSV file name (default: legaladvice_classaction_matches.csv)')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Output format; parquet and arrow are written while crawling (default: csv)')
     parser.add_argument('--print-only', action='store_true',
                         help='Only print to console, do not save to CSV')
     parser.add_argument('--no-filter', action='store_true',
                         help='Disable filtering for class action keywords')
     parser.add_argument('--keyword', help='Specify a single keyword to filter by')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of posts whose comments are fetched concurrently (default: 1)')
+    parser.add_argument('--nlp-processes', type=int, default=0,
+                        help='Worker processes that summarize posts alongside the fetches; 0 summarizes inline (default: 0)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only process posts newer than the last run for this subreddit and keywords, store them in '
+                             'the database and refresh the scores of recently stored posts')
+    parser.add_argument('--threshold', type=float, default=CLASS_ACTION_THRESHOLD,
+                        help=f'Class-action likelihood at which posts are flagged (default: {CLASS_ACTION_THRESHOLD})')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log every post processed, not just matches')
     
     # Parse arguments
     args = parser.parse_args()
     
+    # Keep the default file name in step with the chosen format
+    if args.format != 'csv' and args.output == parser.get_default('output'):
+        args.output = os.path.splitext(args.output)[0] + '.' + args.format
+    
+    # Crawl progress is reported through the reddit_crawler logger
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+    
     # Define keywords for potential class action lawsuits
-    class_action_keywords = [
-        "class action", "anyone else", "same issue", "same problem", "illegal",
-        "wage theft", "false advertising", "scam", "unsafe", "defective"
-    ]
+    class_action_keywords = list(CLASS_ACTION_KEYWORDS)
+    
+    # Several subreddits share one client and one rate-limit budget
+    targets = parse_subreddits(args.subreddits or args.subreddit, args.posts)
     
     # Print configuration
-    print(f"Crawling r/{args.subreddit}...")
+    print(f"Crawling {', '.join(f'r/{name}' for name, _ in targets)}...")
     print(f"Fetching posts from the last {args.days} days")
     print(f"Looking for {args.posts} posts with {args.comments} comments each")
     
@@ -49,16 +79,71 @@ def main():
     
     try:
         # Crawl Reddit
-        posts_data = crawl_reddit(args.subreddit, args.posts, args.comments, args.days, filter_keywords)
+        configs = [
+            CrawlConfig(
+                subreddit=subreddit,
+                post_limit=post_limit,
+                comment_limit=args.comments,
+                days_limit=args.days,
+                filter_keywords=filter_keywords,
+                workers=args.workers,
+                nlp_processes=args.nlp_processes,
+                incremental=args.incremental,
+            )
+            for subreddit, post_limit in targets
+        ]
+        # Crawl state and the summary cache live in the database
+        init_db()
+        
+        marks = []
+        def crawl(on_result=None):
+            if len(configs) == 1:
+                return run_crawl(configs[0], on_result=on_result, marks=marks)
+            return run_crawls(configs, on_result=on_result, marks=marks)
+        
+        def tag(post):
+            # Every format gets a subreddit column; run_crawls tags its posts, a single
+            # subreddit crawl does not
+            post.setdefault('subreddit', configs[0].subreddit)
+            return post
+        
+        # Columnar output is written row group by row group as results come in, so its
+        # rows are in crawl order. Scores only depend on the post itself, so each row
+        # is written with the score that rank_posts gives it below.
+        if args.format != 'csv' and not args.print_only:
+            with ColumnarWriter(args.output) as writer:
+                posts_data = crawl(on_result=lambda post: writer.write(rank_posts([tag(post)], threshold=args.threshold)[0]))
+        else:
+            posts_data = crawl()
+        
+        # Most likely class actions first
+        posts_data = rank_posts([tag(post) for post in posts_data], threshold=args.threshold)
+        likely = sum(post['likely_class_action'] for post in posts_data)
+        print(f"{likely} of {len(posts_data)} posts have a class-action likelihood of at least {args.threshold}")
         
         # Print summarized posts
         print_summarized_posts(posts_data)
         
         # Save to CSV if not print-only
-        if not args.print_only:
+        if args.format != 'csv' and not args.print_only:
+            print(f"Data saved to {args.output}")
+        elif not args.print_only:
             save_to_csv(posts_data, args.output)
             print(f"Data saved to {args.output}")
         
+        # Incremental crawls store their posts like the web app does, so later runs can
+        # refresh their scores and comment counts
+        if args.incremental:
+            run_id = str(uuid.uuid4())
+            save_run(run_id, datetime.datetime.now().isoformat(), '+'.join(config.subreddit for config in configs),
+                     sum(config.post_limit for config in configs), args.keyword or '', posts_data)
+            refresh_run_stats(run_id)
+            print(f"Posts stored in the database as run {run_id}")
+        
+        # Incremental crawls only move their high-water marks once the results are written
+        for mark in marks:
+            save_crawl_state(*mark)
+        
         return 0  # Success
     
     except Exception as e:
@@ -0,0 +1,87 @@
+import json
+import datetime
+import statistics
+from db import get_connection, get_run_results
+from charts import histogram
+
+# Columns needed to compute the aggregates; the large text columns are never read
+STATS_COLUMNS = ['id', 'title', 'score', 'num_comments', 'created_utc']
+
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def describe(values, bins=10):
+    """
+    Mean, median, range and histogram of a list of numbers.
+    """
+    if not values:
+        return {'mean': None, 'median': None, 'min': None, 'max': None, 'histogram': {'counts': [], 'edges': []}}
+    return {
+        'mean': statistics.fmean(values),
+        'median': statistics.median(values),
+        'min': min(values),
+        'max': max(values),
+        'histogram': histogram(values, bins),
+    }
+
+def compute_run_stats(results, bins=10, top_n=10):
+    """
+    Compute the aggregates dashboards show for a set of posts.
+
+    Args:
+        results (list): Post dicts with 'id', 'title', 'score', 'num_comments' and 'created_utc'
+        bins (int, optional): Histogram bins. Defaults to 10.
+        top_n (int, optional): Length of the top post lists. Defaults to 10.
+
+    Returns:
+        dict: 'count', 'score' and 'num_comments' summaries, 'top_posts' by score,
+        'most_commented' posts and 'day_of_week' post counts
+    """
+    day_counts = dict.fromkeys(DAYS_OF_WEEK, 0)
+    for post in results:
+        try:
+            created = datetime.datetime.strptime(post['created_utc'], '%Y-%m-%d %H:%M:%S')
+        except (TypeError, ValueError):
+            continue
+        day_counts[DAYS_OF_WEEK[created.weekday()]] += 1
+
+    def top(key):
+        ranked = sorted(results, key=lambda post: post[key], reverse=True)[:top_n]
+        return [{'id': post['id'], 'title': post['title'], 'score': post['score'],
+                 'num_comments': post['num_comments']} for post in ranked]
+
+    return {
+        'count': len(results),
+        'score': describe([post['score'] for post in results], bins),
+        'num_comments': describe([post['num_comments'] for post in results], bins),
+        'top_posts': top('score'),
+        'most_commented': top('num_comments'),
+        'day_of_week': day_counts,
+    }
+
+def refresh_run_stats(run_id):
+    """
+    Compute a run's aggregates from its stored posts and save them in run_stats.
+
+    Returns:
+        dict: The stats
+    """
+    stats = compute_run_stats(get_run_results(run_id, columns=STATS_COLUMNS, include_comments=False))
+    conn = get_connection()
+    conn.execute(
+        'INSERT OR REPLACE INTO run_stats (run_id, stats, computed_at) VALUES (?, ?, ?)',
+        (run_id, json.dumps(stats), datetime.datetime.now().isoformat())
+    )
+    conn.commit()
+    conn.close()
+    return stats
+
+def get_run_stats(run_id):
+    """
+    Return a run's stored aggregates, computing them first for runs saved before run_stats existed.
+    """
+    conn = get_connection()
+    row = conn.execute('SELECT stats FROM run_stats WHERE run_id = ?', (run_id,)).fetchone()
+    conn.close()
+    if row:
+        return json.loads(row['stats'])
+    return refresh_run_stats(run_id)
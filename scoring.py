@@ -0,0 +1,150 @@
+import re
+from functools import lru_cache
+
+# Keywords that point to a potential class action, with how strongly each one does
+CLASS_ACTION_KEYWORDS = {
+    "class action": 3.0,
+    "anyone else": 1.0,
+    "same issue": 1.0,
+    "same problem": 1.0,
+    "illegal": 1.0,
+    "wage theft": 2.0,
+    "false advertising": 2.0,
+    "scam": 1.0,
+    "unsafe": 1.5,
+    "defective": 1.5,
+}
+
+# Comment phrases from other people who were affected the same way
+ME_TOO_PHRASES = [
+    "me too", "same here", "same thing happened", "happened to me", "happening to me",
+    "same issue", "same problem", "i had the same", "i have the same", "us too",
+    "also affected", "in the same boat", "join the class",
+]
+
+# Keyword hits in the title count this much more than hits in the body
+TITLE_WEIGHT = 2.0
+
+# A hit at the very end of the body counts this fraction of one at the start
+END_OF_BODY_WEIGHT = 0.5
+
+# Hand-tuned logistic model over the features
+BIAS = -3.0
+KEYWORD_COEF = 1.5  # per unit of log(1 + weighted keyword hits)
+ENGAGEMENT_COEF = 0.3  # per unit of the mean of log(1 + score) and log(1 + comments)
+ME_TOO_COEF = 0.6  # per top comment with a "me too" phrase
+MAX_ME_TOO = 5
+
+# Posts at or above this likelihood are flagged as likely class actions
+CLASS_ACTION_THRESHOLD = 0.5
+
+@lru_cache(maxsize=32)
+def _compile(phrases):
+    return [re.compile(re.escape(phrase.lower())) for phrase in phrases]
+
+def find_phrases(texts, phrases):
+    """
+    Find the phrases in a batch of texts, searching all of the texts at once.
+
+    Matching is case-insensitive and on substrings, like keyword_matcher. The texts
+    are joined and each phrase is found with one literal search over the whole batch,
+    which is far faster than running the search, or an alternation of all phrases,
+    per text. Hits are mapped back to their texts with a binary search over the text
+    offsets.
+
+    Args:
+        texts (list): Strings to search; None counts as empty
+        phrases (list): Phrases to look for
+
+    Returns:
+        tuple: NumPy arrays with the text index, phrase index and relative position
+        (0.0 at the start of the text, 1.0 at the end) of each hit
+    """
+    import numpy as np
+    texts = [text.lower() if text else '' for text in texts]
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    # One NUL between texts keeps a phrase from matching across two of them
+    starts = np.cumsum(lengths + 1) - lengths - 1
+    joined = '\0'.join(texts)
+
+    positions = []
+    phrase_index = []
+    for index, pattern in enumerate(_compile(tuple(phrases))):
+        found = [match.start() for match in pattern.finditer(joined)]
+        positions.extend(found)
+        phrase_index.extend([index] * len(found))
+
+    positions = np.array(positions, dtype=np.int64)
+    text_index = np.searchsorted(starts, positions, side='right') - 1
+    relative = (positions - starts[text_index]) / np.maximum(lengths[text_index], 1)
+    return text_index, np.array(phrase_index, dtype=np.int64), relative
+
+def score_posts(posts, keywords=None):
+    """
+    Estimate how likely each post is to describe a potential class action.
+
+    The features are keyword hits (weighted per keyword, counting more in the title
+    and early in the body), engagement from score and comment count, and the number
+    of top comments saying "me too". They are computed for the whole batch at once
+    with NumPy and combined by a logistic model.
+
+    Args:
+        posts (list): Post dicts as returned by reddit_crawler.crawl_reddit
+        keywords (dict, optional): Keyword to weight. Defaults to CLASS_ACTION_KEYWORDS.
+
+    Returns:
+        numpy.ndarray: Likelihood between 0 and 1 for each post, in input order
+    """
+    import numpy as np
+    if keywords is None:
+        keywords = CLASS_ACTION_KEYWORDS
+    count = len(posts)
+    if not count:
+        return np.empty(0)
+    weights = np.fromiter(keywords.values(), dtype=float, count=len(keywords))
+    phrases = list(keywords)
+
+    # Keyword hits, counting more in the title and the earlier they are in the body
+    title_index, title_keyword, _ = find_phrases([post.get('title') for post in posts], phrases)
+    body_index, body_keyword, body_position = find_phrases([post.get('content') for post in posts], phrases)
+    keyword_hits = TITLE_WEIGHT * np.bincount(title_index, weights=weights[title_keyword], minlength=count)
+    keyword_hits += np.bincount(body_index, minlength=count,
+                                weights=weights[body_keyword] * (1 - (1 - END_OF_BODY_WEIGHT) * body_position))
+
+    # Engagement, on a log scale so a viral post does not drown out everything else
+    score = np.fromiter((post.get('score') or 0 for post in posts), dtype=float, count=count)
+    num_comments = np.fromiter((post.get('num_comments') or 0 for post in posts), dtype=float, count=count)
+    engagement = (np.log1p(np.maximum(score, 0)) + np.log1p(np.maximum(num_comments, 0))) / 2
+
+    # Top comments with at least one "me too" phrase
+    comments = [post.get('top_comments') or [] for post in posts]
+    owner = np.repeat(np.arange(count), [len(post_comments) for post_comments in comments])
+    comment_index, _, _ = find_phrases([comment.get('body') for post_comments in comments for comment in post_comments],
+                                       ME_TOO_PHRASES)
+    me_too = np.bincount(owner[np.unique(comment_index)], minlength=count)
+
+    z = (BIAS + KEYWORD_COEF * np.log1p(keyword_hits) + ENGAGEMENT_COEF * engagement
+         + ME_TOO_COEF * np.minimum(me_too, MAX_ME_TOO))
+    return 1 / (1 + np.exp(-z))
+
+def rank_posts(posts, threshold=CLASS_ACTION_THRESHOLD, keywords=None):
+    """
+    Score posts and sort them by class-action likelihood, most likely first.
+
+    Each post gets a 'class_action_score' and a 'likely_class_action' flag that is set
+    when the score reaches the threshold. Posts with equal scores keep their order.
+
+    Args:
+        posts (list): Post dicts as returned by reddit_crawler.crawl_reddit
+        threshold (float, optional): Likelihood to flag at. Defaults to CLASS_ACTION_THRESHOLD.
+        keywords (dict, optional): Keyword to weight. Defaults to CLASS_ACTION_KEYWORDS.
+
+    Returns:
+        list: The same post dicts, sorted
+    """
+    import numpy as np
+    scores = score_posts(posts, keywords)
+    for post, score in zip(posts, scores.tolist()):
+        post['class_action_score'] = round(score, 4)
+        post['likely_class_action'] = score >= threshold
+    return [posts[index] for index in np.argsort(-scores, kind='stable')]
@@ -0,0 +1,169 @@
+import re
+import html
+from db import get_connection
+
+# Relative weight of a match in the title, content and summary of a post
+POST_COLUMN_WEIGHTS = (5.0, 1.0, 0.5)
+
+# bm25() scores are negative and lower is better. Comment scores are multiplied by this
+# factor, which moves them toward zero, so a comment match ranks below an equally good
+# match in the post itself.
+COMMENT_SCORE_FACTOR = 0.5
+
+# Ranked comment matches resolved to their posts at a time
+COMMENT_BATCH = 200
+
+# Words around each match shown in a snippet
+SNIPPET_WORDS = 16
+
+# Control characters marking matches in FTS5 snippets until they are turned into HTML
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+def fts_query(text):
+    """
+    Turn a search box query into an FTS5 query.
+
+    Words and "quoted phrases" must all appear; OR between two terms accepts either.
+    Everything else is quoted, so punctuation in the query can never be a syntax error.
+
+    Returns:
+        str: The FTS5 query, empty when the text has nothing to search for
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text or ''):
+        if word == 'OR':
+            if terms and terms[-1] != 'OR':
+                terms.append('OR')
+            continue
+        value = (phrase or word).replace('"', '""')
+        if re.search(r'\w', value):
+            terms.append(f'"{value}"')
+    if terms and terms[-1] == 'OR':
+        terms.pop()
+    return ' '.join(terms)
+
+def keyword_query(keywords):
+    """
+    Search box query for posts that contain any of the keywords, e.g. the class action
+    list, so keyword filtering can be re-run against stored crawls.
+    """
+    return ' OR '.join(f'"{keyword}"' for keyword in keywords)
+
+def highlight(snippet):
+    """
+    Escape an FTS5 snippet for HTML and mark the matched terms.
+    """
+    return html.escape(snippet or '').replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+def _filters(run_id, subreddit):
+    clauses = []
+    params = []
+    if subreddit:
+        clauses.append('AND p.subreddit = ? COLLATE NOCASE')
+        params.append(subreddit)
+    if run_id:
+        clauses.append('AND p.id IN (SELECT post_id FROM run_posts WHERE run_id = ?)')
+        params.append(run_id)
+    return ' '.join(clauses), params
+
+def _best_comment_hits(conn, match, filters, filter_params, needed):
+    # Comments are ranked inside the FTS index alone, which is cheap, and the posts
+    # of the best ones are looked up a batch at a time until enough distinct posts
+    # are found. Joining every match to its post before ranking costs several times more.
+    ranked = conn.execute('''
+        SELECT rowid, bm25(comments_fts) AS relevance FROM comments_fts
+        WHERE comments_fts MATCH ? ORDER BY relevance
+    ''', (match,))
+    hits = {}
+    while len(hits) < needed:
+        batch = ranked.fetchmany(COMMENT_BATCH)
+        if not batch:
+            break
+        relevance = {row['rowid']: row['relevance'] for row in batch}
+        cur = conn.execute(f'''
+            SELECT c.doc_id AS comment_doc_id, p.id, p.title, p.url AS permalink, p.subreddit, p.author,
+                   p.created_utc, p.score, p.num_comments
+            FROM comments c JOIN posts p ON p.id = c.post_id
+            WHERE c.doc_id IN ({', '.join('?' * len(batch))}) {filters}
+        ''', (*relevance, *filter_params))
+        for hit in sorted(cur.fetchall(), key=lambda hit: relevance[hit['comment_doc_id']]):
+            # The first comment seen for a post is its best one
+            if hit['id'] not in hits and len(hits) < needed:
+                hit['relevance'] = relevance[hit['comment_doc_id']] * COMMENT_SCORE_FACTOR
+                hits[hit['id']] = hit
+    ranked.close()
+    return list(hits.values())
+
+def search_posts(query, page=1, per_page=20, run_id=None, subreddit=None):
+    """
+    Search stored posts and their comments, best matches first.
+
+    Posts are ranked by BM25 over title, content and summary, and by their best
+    matching comment; a post that matches in both places is listed once, where it
+    ranks higher. Each source only returns the posts up to the end of the page, so
+    the cost of a query depends on the number of matches, not on the size of the store.
+
+    Args:
+        query (str): Search box text (see fts_query)
+        page (int, optional): Page number, starting at 1. Defaults to 1.
+        per_page (int, optional): Results per page. Defaults to 20.
+        run_id (str, optional): Only search the posts of this run
+        subreddit (str, optional): Only search posts from this subreddit
+
+    Returns:
+        dict: 'results' (post fields, BM25 'relevance' where lower is better, HTML
+        'snippet' and 'matched_in' of 'post' or 'comment'), 'page' and 'has_more'
+    """
+    match = fts_query(query)
+    page = max(1, page)
+    if not match:
+        return {'results': [], 'page': page, 'has_more': False}
+    # One more than needed tells whether there is a next page
+    needed = page * per_page + 1
+    filters, filter_params = _filters(run_id, subreddit)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(f'''
+        SELECT p.id, p.title, p.url AS permalink, p.subreddit, p.author, p.created_utc, p.score, p.num_comments,
+               bm25(posts_fts, ?, ?, ?) AS relevance,
+               snippet(posts_fts, -1, ?, ?, '...', ?) AS snippet
+        FROM posts_fts JOIN posts p ON p.doc_id = posts_fts.rowid
+        WHERE posts_fts MATCH ? {filters}
+        ORDER BY relevance
+        LIMIT ?
+    ''', (*POST_COLUMN_WEIGHTS, _MARK_START, _MARK_END, SNIPPET_WORDS, match, *filter_params, needed))
+    post_hits = cur.fetchall()
+
+    comment_hits = _best_comment_hits(conn, match, filters, filter_params, needed)
+
+    best = {}
+    for matched_in, hits in (('post', post_hits), ('comment', comment_hits)):
+        for hit in hits:
+            if hit['id'] not in best or hit['relevance'] < best[hit['id']]['relevance']:
+                best[hit['id']] = dict(hit, matched_in=matched_in)
+    ranked = sorted(best.values(), key=lambda hit: hit['relevance'])
+    start = (page - 1) * per_page
+    results = ranked[start:start + per_page]
+
+    # Snippets are only built for the comments shown on this page
+    comment_doc_ids = [hit.pop('comment_doc_id') for hit in results if hit['matched_in'] == 'comment']
+    if comment_doc_ids:
+        cur.execute(f'''
+            SELECT rowid, snippet(comments_fts, 0, ?, ?, '...', ?) AS snippet FROM comments_fts
+            WHERE comments_fts MATCH ? AND rowid IN ({', '.join('?' * len(comment_doc_ids))})
+        ''', (_MARK_START, _MARK_END, SNIPPET_WORDS, match, *comment_doc_ids))
+        snippets = {row['rowid']: row['snippet'] for row in cur.fetchall()}
+        for hit, doc_id in zip([hit for hit in results if hit['matched_in'] == 'comment'], comment_doc_ids):
+            hit['snippet'] = snippets.get(doc_id)
+    cur.close()
+    conn.close()
+
+    for hit in results:
+        hit['snippet'] = highlight(hit['snippet'])
+    return {
+        'results': results,
+        'page': page,
+        'has_more': len(ranked) > start + per_page,
+    }
@@ -0,0 +1,156 @@
+import numpy as np
+
+class QuantileSketch:
+    """
+    Streaming summary of a numeric column in bounded memory (a merging t-digest).
+
+    Values are folded into at most about `compression` weighted centroids, packed more
+    tightly near the tails so extreme quantiles stay accurate. Count, mean, min and max
+    are exact; quantiles and histograms are approximate once more than `compression`
+    values have been seen, and exact before that.
+
+    Args:
+        compression (int, optional): Centroids kept. Defaults to 200.
+    """
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """
+        Add a chunk of values; NaNs are ignored.
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.total += values.sum()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._add(values, np.ones(len(values)))
+
+    def merge(self, other):
+        """
+        Fold another sketch into this one, e.g. one built from a different file.
+        """
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._add(other.means, other.weights)
+
+    def _add(self, means, weights):
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind='mergesort')
+        self.means, self.weights = means[order], weights[order]
+        if len(self.means) > self.compression:
+            self._compress()
+
+    def _compress(self):
+        # Map each centroid's position in the distribution through the k1 scale function
+        # and merge neighbours that land in the same unit of k
+        weights = self.weights
+        q = (np.cumsum(weights) - weights / 2) / weights.sum()
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        bucket = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(self.means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    def _points(self):
+        # Cumulative weight at each centroid's middle, anchored at the exact min and max
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.r_[0.0, centers, self.count], np.r_[self.min, self.means, self.max]
+
+    def quantile(self, q):
+        """
+        Approximate value below which a fraction q of the values fall.
+        """
+        if not self.count:
+            return float('nan')
+        ranks, values = self._points()
+        return float(np.interp(q * self.count, ranks, values))
+
+    def cdf(self, x):
+        """
+        Approximate number of values at or below each x.
+        """
+        ranks, values = self._points()
+        return np.interp(x, values, ranks)
+
+    def histogram(self, bins=10):
+        """
+        Approximate counts per bin over [min, max], binned like numpy.histogram.
+
+        Returns:
+            dict: 'counts' per bin and the bin 'edges'
+        """
+        if not self.count:
+            return {'counts': [], 'edges': []}
+        low, high = self.min, self.max
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, bins + 1)
+        cumulative = np.round(self.cdf(edges)).astype(np.int64)
+        cumulative[0], cumulative[-1] = 0, self.count
+        return {'counts': np.diff(cumulative).tolist(), 'edges': edges.tolist()}
+
+class CorrelationAccumulator:
+    """
+    Pearson correlation matrix of several columns, accumulated chunk by chunk.
+
+    Keeps only sums and cross products (shifted by the first chunk's means for
+    numerical stability), so memory does not depend on the number of rows.
+
+    Args:
+        columns (list): Column names, in matrix order
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.count = 0
+        self.shift = None
+        self.sums = np.zeros(len(self.columns))
+        self.products = np.zeros((len(self.columns), len(self.columns)))
+
+    def update(self, matrix):
+        """
+        Add a chunk of rows (an array with one column per name); rows with NaNs are skipped.
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        matrix = matrix[~np.isnan(matrix).any(axis=1)]
+        if not len(matrix):
+            return
+        if self.shift is None:
+            self.shift = matrix.mean(axis=0)
+        centered = matrix - self.shift
+        self.count += len(matrix)
+        self.sums += centered.sum(axis=0)
+        self.products += centered.T @ centered
+
+    def correlation(self):
+        """
+        Return the correlation matrix as a nested list, or None before two rows were seen.
+        """
+        if self.count < 2:
+            return None
+        mean = self.sums / self.count
+        covariance = self.products / self.count - np.outer(mean, mean)
+        scale = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (covariance / np.outer(scale, scale)).tolist()
@@ -0,0 +1,209 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Total size of cached summaries kept in the database; least recently used
+# entries are evicted beyond this
+SUMMARY_CACHE_MAX_BYTES = int(os.environ.get('SUMMARY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Eviction scans the whole table, so it runs once every this many stores
+# (the cache may overshoot its limit by that many entries in between)
+EVICT_EVERY = 50
+
+# Hits mark entries as recently used in memory only; the marks are written in one
+# transaction at most once per this many seconds, and before eviction or stats read them
+TOUCH_INTERVAL = 30.0
+
+# Hit/miss counters for this process, per model
+_stats = {}
+_stats_lock = threading.Lock()
+_stores_since_evict = 0
+
+# Pending [last_used, hits] per cache key, and when they were last written
+_touches = {}
+_last_flush = time.monotonic()
+
+def cache_key(model, template, text):
+    """
+    Return the content address of a summary: a hash of model, prompt template and input text.
+    """
+    digest = hashlib.sha256()
+    for part in (model, template, text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def _count(model, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(model, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+def get_cached(model, template, text):
+    """
+    Look up a cached summary and mark it as recently used.
+
+    Args:
+        model (str): Model that produced the summary, e.g. "llama3" or "textrank"
+        template (str): Prompt template or settings the summary was made with
+        text (str): The summarized text
+
+    Returns:
+        str: The cached summary, or None on a miss
+    """
+    key = cache_key(model, template, text)
+    conn = get_connection()
+    try:
+        row = conn.execute('SELECT summary FROM summary_cache WHERE key = ?', (key,)).fetchone()
+    except sqlite3.Error as e:
+        # A missing or locked cache is a miss, never a failed summary
+        logger.warning("Summary cache lookup failed: %s", e)
+        row = None
+    finally:
+        conn.close()
+
+    _count(model, 'hits' if row else 'misses')
+    if row:
+        _touch(key)
+    return row['summary'] if row else None
+
+def _touch(key):
+    global _last_flush
+    with _stats_lock:
+        touch = _touches.setdefault(key, [0.0, 0])
+        touch[0] = time.time()
+        touch[1] += 1
+        due = time.monotonic() - _last_flush >= TOUCH_INTERVAL
+    if due:
+        flush_touches()
+
+def flush_touches(conn=None):
+    """
+    Write the pending recently-used marks and hit counts of this process.
+
+    With a connection the updates join the caller's transaction and the caller commits.
+    A locked database only loses the marks, which just make eviction less exact.
+    """
+    global _last_flush
+    with _stats_lock:
+        pending = [(last_used, hits, key) for key, (last_used, hits) in _touches.items()]
+        _touches.clear()
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    try:
+        conn.executemany('UPDATE summary_cache SET last_used = MAX(last_used, ?), hits = hits + ? WHERE key = ?',
+                         pending)
+        if own_conn:
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning("Summary cache touch failed: %s", e)
+    finally:
+        if own_conn:
+            conn.close()
+
+def store(model, template, text, summary):
+    """
+    Save a summary and evict the least recently used entries over SUMMARY_CACHE_MAX_BYTES.
+    """
+    global _stores_since_evict
+    with _stats_lock:
+        _stores_since_evict += 1
+        evict = _stores_since_evict >= EVICT_EVERY
+        if evict:
+            _stores_since_evict = 0
+
+    key = cache_key(model, template, text)
+    size = len(summary.encode('utf-8'))
+    conn = get_connection()
+    try:
+        conn.execute(
+            '''INSERT OR REPLACE INTO summary_cache (key, model, summary, size, hits, created_at, last_used)
+               VALUES (?, ?, ?, ?, 0, ?, ?)''',
+            (key, model, summary, size, time.time(), time.time())
+        )
+        if evict:
+            evict_entries(conn)
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.warning("Summary cache store failed: %s", e)
+    finally:
+        conn.close()
+
+def evict_entries(conn, max_bytes=None):
+    """
+    Delete the least recently used summaries until the cache fits in max_bytes
+    (SUMMARY_CACHE_MAX_BYTES by default). The caller commits.
+    """
+    if max_bytes is None:
+        max_bytes = SUMMARY_CACHE_MAX_BYTES
+    # Recent hits must count before choosing what to drop
+    flush_touches(conn)
+    conn.execute('''
+        DELETE FROM summary_cache WHERE key IN (
+            SELECT key FROM (
+                SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running_size
+                FROM summary_cache
+            ) WHERE running_size > ?
+        )
+    ''', (max_bytes,))
+
+def cached_summary(model, template, text, compute):
+    """
+    Return the cached summary for the input, calling compute() and caching its result on a miss.
+
+    Exceptions from compute() propagate and nothing is cached.
+    """
+    summary = get_cached(model, template, text)
+    if summary is None:
+        summary = compute()
+        store(model, template, text, summary)
+    return summary
+
+def cache_stats():
+    """
+    Return hit/miss counters for this process and the size of the stored cache.
+
+    Returns:
+        dict: 'models' maps each model to its hits and misses; 'entries', 'bytes'
+        and 'stored_hits' describe the cache table across all processes
+    """
+    flush_touches()
+    with _stats_lock:
+        models = {model: dict(counters) for model, counters in _stats.items()}
+
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            'SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes, COALESCE(SUM(hits), 0) AS stored_hits FROM summary_cache'
+        ).fetchone()
+    except sqlite3.Error:
+        row = {'entries': 0, 'bytes': 0, 'stored_hits': 0}
+    finally:
+        conn.close()
+
+    return {
+        'models': models,
+        'hits': sum(counters['hits'] for counters in models.values()),
+        'misses': sum(counters['misses'] for counters in models.values()),
+        'entries': row['entries'],
+        'bytes': row['bytes'],
+        'stored_hits': row['stored_hits'],
+    }
+
+def reset_stats():
+    """
+    Zero the hit/miss counters of this process and drop its pending hits.
+    """
+    with _stats_lock:
+        _stats.clear()
+        _touches.clear()
@@ -0,0 +1,47 @@
+import pandas as pd
+import db
+import analyze_data
+from analyze_data import PostStats, iter_file_chunks, iter_db_chunks
+from columnar import save_columnar
+from test_columnar import make_post
+from test_db import make_post as make_stored_post
+
+def test_chunked_stats_over_a_glob_of_files(tmp_path, monkeypatch):
+    posts = [dict(make_post(i), score=i * 3 % 17, num_comments=i % 5) for i in range(30)]
+    save_columnar(posts[:10], str(tmp_path / 'crawl1.parquet'))
+    save_columnar(posts[10:20], str(tmp_path / 'crawl2.arrow'))
+    pd.DataFrame(posts[20:]).to_csv(tmp_path / 'crawl3.csv', index=False)
+
+    stats = PostStats()
+    for path in sorted(tmp_path.glob('crawl*')):
+        for chunk in iter_file_chunks(str(path), chunk_size=4):
+            stats.update(chunk)
+
+    scores = pd.Series([post['score'] for post in posts])
+    assert stats.rows == 30
+    assert stats.sketches['score'].quantile(0.5) == scores.median()
+    assert stats.largest['score'][0] == scores.max()
+    assert stats.day_counts.sum() == 30
+
+    # The command line entry point accepts the same glob
+    monkeypatch.chdir(tmp_path)
+    assert analyze_data.analyze_reddit_data(str(tmp_path / 'crawl*')) == 0
+
+def test_stats_from_the_sqlite_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [make_stored_post('p1', 5), make_stored_post('p2', 9)])
+    db.save_run('run2', '2024-01-02T00:00:00', 'legaladvice', 10, '', [make_stored_post('p2', 11)])
+
+    stats = PostStats()
+    for chunk in iter_db_chunks(db.DATABASE_PATH):
+        stats.update(chunk)
+    # p2 is stored once with its latest score
+    assert stats.rows == 2
+    assert stats.largest['score'][0] == 11
+    assert stats.sketches['content_length'].count == 2
+
+    stats = PostStats()
+    for chunk in iter_db_chunks(db.DATABASE_PATH, run_id='run2'):
+        stats.update(chunk)
+    assert stats.rows == 1
@@ -0,0 +1,145 @@
+import json
+import time
+import threading
+import pytest
+import db
+import job_queue
+from test_search import make_post
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    import app
+    # Keeps the crawl worker pool from starting and claiming the tests' jobs
+    monkeypatch.setattr(app.app, 'testing', True)
+    return app.app.test_client()
+
+def sse_events(body):
+    """
+    Split a Server-Sent Events body into (event, data) pairs.
+    """
+    events = []
+    for message in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines() if ': ' in line)
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+def test_download_escapes_the_filename(client):
+    db.save_run('run1', '2024-01-01T00:00:00', 'a"\r\nX-Injected: yes', 10, '', [
+        make_post('a', 'Hidden fees', 'Fees on every bill.'),
+    ])
+    response = client.get('/download-csv', query_string={'run_id': 'run1'})
+    assert response.status_code == 200
+    assert 'X-Injected' not in response.headers
+    disposition = response.headers['Content-Disposition']
+    assert '\r' not in disposition and '\n' not in disposition
+    assert disposition.startswith('attachment; filename="reddit_crawler_a_X-Injected_yes_')
+    assert "filename*=UTF-8''reddit_crawler_a%22%0D%0AX-Injected%3A%20yes_" in disposition
+    assert disposition.count('"') == 2
+
+    rows = response.get_data(as_text=True).splitlines()
+    assert len(rows) == 2 and 'Hidden fees' in rows[1]
+
+def test_testing_app_does_not_start_workers(client):
+    import app
+    client.get('/status/missing')
+    assert app.worker_pool.threads == []
+
+def test_status_of_a_job(client):
+    job_id = job_queue.enqueue_job({'subreddit': 'legaladvice'})
+    job_queue.update_job_progress(job_id, 25, 3)
+    found = client.get(f'/status/{job_id}').get_json()
+    assert found['state'] == 'queued' and found['running'] and not found['complete']
+    assert (found['posts_processed'], found['matches_found']) == (25, 3)
+
+    job_queue.finish_job(job_id, 3)
+    found = client.get(f'/status/{job_id}').get_json()
+    assert found['complete'] and found['result_count'] == 3
+    assert client.get('/status/missing').status_code == 404
+
+def test_api_results_are_paged(client):
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [
+        make_post(f"p{i}", f"Post {i}", 'Text.', ['A comment']) for i in range(5)
+    ])
+    pages = []
+    after = None
+    while True:
+        query = {'limit': 2, 'comments': 0}
+        if after is not None:
+            query['after'] = after
+        page = client.get('/api/results/run1', query_string=query).get_json()
+        pages.append([post['id'] for post in page['results']])
+        after = page['next_after']
+        if after is None:
+            break
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sorted(post_id for page in pages for post_id in page) == [f"p{i}" for i in range(5)]
+    assert client.get('/api/results/missing').status_code == 404
+
+def test_events_stream_results_and_finish(client):
+    job_id = job_queue.enqueue_job({'subreddit': 'legaladvice'})
+    job_queue.update_job_progress(job_id, 10, 2)
+    job_queue.add_job_result(job_id, {'id': 'a'})
+    job_queue.add_job_result(job_id, {'id': 'b'})
+    # The live results are cleared when a job finishes, so mark it complete by hand to keep them
+    conn = db.get_connection()
+    conn.execute("UPDATE crawl_jobs SET state = 'complete' WHERE id = ?", (job_id,))
+    conn.commit()
+    conn.close()
+
+    response = client.get(f'/events/{job_id}')
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert body.startswith('id: 1\nevent: result\n')
+    assert sse_events(body) == [
+        ('result', {'id': 'a'}),
+        ('result', {'id': 'b'}),
+        ('progress', {'state': 'complete', 'posts_processed': 10, 'matches_found': 2}),
+        ('done', {'state': 'complete', 'error': None}),
+    ]
+
+    # A reconnecting browser only gets the results it has not seen
+    body = client.get(f'/events/{job_id}', headers={'Last-Event-ID': '1'}).get_data(as_text=True)
+    assert [data for event, data in sse_events(body) if event == 'result'] == [{'id': 'b'}]
+    assert client.get('/events/missing').status_code == 404
+
+def test_events_stop_when_the_job_finishes(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'EVENTS_POLL_INTERVAL', 0.01)
+    job_id = job_queue.enqueue_job({'subreddit': 'legaladvice'})
+    finisher = threading.Timer(0.2, job_queue.finish_job, (job_id, 0))
+    finisher.start()
+
+    started = time.monotonic()
+    body = client.get(f'/events/{job_id}').get_data(as_text=True)
+    finisher.join()
+    # The stream ends on the first poll after the job finishes, not at EVENTS_MAX_SECONDS
+    assert time.monotonic() - started < 5
+    assert sse_events(body)[-1] == ('done', {'state': 'complete', 'error': None})
+    assert 'retry:' not in body
+
+def test_events_of_a_running_job_close_at_the_cap(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'EVENTS_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(app, 'EVENTS_MAX_SECONDS', 0.1)
+    job_id = job_queue.enqueue_job({'subreddit': 'legaladvice'})
+
+    body = client.get(f'/events/{job_id}').get_data(as_text=True)
+    assert [event for event, data in sse_events(body)] == ['progress']
+    assert body.endswith('retry: 1000\n\n')
+
+def test_finished_job_has_the_final_counts(client, monkeypatch):
+    import app
+    def crawl(config, progress=None, on_result=None, marks=None):
+        # The second call comes within a second of the first and is throttled
+        progress(1, 0)
+        progress(40, 3)
+        return []
+    monkeypatch.setattr(app, 'run_crawl', crawl)
+    job_id = job_queue.enqueue_job({'subreddit': 'legaladvice', 'posts': 40, 'keyword': ''})
+
+    assert app.run_crawler_job(job_queue.get_job(job_id)) == 0
+    found = client.get(f'/status/{job_id}').get_json()
+    assert (found['posts_processed'], found['matches_found']) == (40, 3)
@@ -0,0 +1,33 @@
+import base64
+import charts
+from charts import chart_data, render_charts, get_charts
+
+def make_results(count, offset=0):
+    return [{'title': f"Defective product report number {i}", 'score': (i * 37 + offset) % 101, 'num_comments': i % 13}
+            for i in range(count)]
+
+def test_chart_data_histograms():
+    data = chart_data(make_results(50))
+    assert sum(data['score_distribution']['counts']) == 50
+    assert len(data['score_distribution']['edges']) == 11
+    assert data['top_posts']['scores'] == sorted(data['top_posts']['scores'], reverse=True)
+    assert len(data['top_posts']['titles']) == 10
+    assert all(len(title) <= 33 for title in data['top_posts']['titles'])
+    assert chart_data([]) == {}
+
+def test_render_charts_returns_svg():
+    rendered = render_charts(chart_data(make_results(20)))
+    assert set(rendered) == {'score_distribution', 'comments_distribution', 'top_posts'}
+    assert base64.b64decode(rendered['top_posts']).lstrip().startswith(b'<?xml')
+
+def test_get_charts_is_cached_until_data_changes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(charts, 'render_charts', lambda data: calls.append(data) or {'n': len(calls)})
+    monkeypatch.setattr(charts, '_chart_cache', charts.OrderedDict())
+
+    first = get_charts('run1', chart_data(make_results(20)))
+    assert get_charts('run1', chart_data(make_results(20))) is first
+    assert len(calls) == 1
+
+    get_charts('run1', chart_data(make_results(20, offset=5)))
+    assert len(calls) == 2
@@ -0,0 +1,140 @@
+import random
+import db
+import clustering
+import ollama_summarizer
+from ollama_summarizer import OllamaClient
+from clustering import update_clusters, get_post_clusters, get_run_clusters, get_cluster, minhash_signatures, shingles
+from test_ollama_summarizer import start_fake_ollama
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+def make_post(post_id, content, title=None):
+    return {
+        'id': post_id,
+        'title': title or f"Post {post_id}",
+        'permalink': f"https://www.reddit.com/r/legaladvice/comments/{post_id}/post/",
+        'score': 1,
+        'author': 'someone',
+        'created_utc': '2024-01-01 00:00:00',
+        'num_comments': 0,
+        'content': content,
+        'summary': content[:40],
+        'top_comments': [],
+    }
+
+def variant(text, rng, changes=8):
+    # The same complaint with a few words changed
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return ' '.join(words)
+
+def test_signature_agreement_estimates_jaccard():
+    rng = random.Random(1)
+    first = ' '.join(rng.choices(WORDS, k=200))
+    second = variant(first, rng, changes=30)
+    a, b = shingles(first), shingles(second)
+    signatures = minhash_signatures([first, second, ''])
+    estimate = (signatures[0] == signatures[1]).mean()
+    assert abs(estimate - len(a & b) / len(a | b)) < 0.15
+    assert (signatures[2] == signatures.max()).all()
+
+def test_near_duplicates_share_a_cluster_across_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    rng = random.Random(2)
+    charger = ' '.join(rng.choices(WORDS, k=120))
+    landlord = ' '.join(rng.choices(WORDS, k=120))
+
+    first_run = [make_post('a1', charger), make_post('b1', landlord), make_post('c1', ' '.join(rng.choices(WORDS, k=120))),
+                 make_post('a2', variant(charger, rng)), make_post('empty', '[No text content]', title='?')]
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', first_run)
+    assigned = update_clusters(first_run)
+    assert assigned['a1'] == assigned['a2'] == 'a1'
+    assert len({assigned['a1'], assigned['b1'], assigned['c1']}) == 3
+    assert 'empty' not in assigned
+
+    # Later posts join the stored clusters; posts seen before are not clustered again
+    second_run = [make_post('a1', charger), make_post('a3', variant(charger, rng)), make_post('b2', variant(landlord, rng))]
+    db.save_run('run2', '2024-01-02T00:00:00', 'legaladvice', 10, '', second_run)
+    assert update_clusters(second_run) == {'a3': 'a1', 'b2': 'b1'}
+
+    clusters = get_post_clusters(['a1', 'a3', 'c1', 'empty'])
+    assert clusters['a3'] == {'cluster_id': 'a1', 'cluster_size': 3}
+    assert clusters['c1']['cluster_size'] == 1
+    assert 'empty' not in clusters
+
+    run_clusters = get_run_clusters('run2')
+    assert [(cluster['id'], cluster['size'], cluster['run_count']) for cluster in run_clusters] == [('a1', 3, 2), ('b1', 2, 1)]
+
+def test_bridging_post_merges_only_related_clusters(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    rng = random.Random(3)
+    left = ' '.join(rng.choices(WORDS, k=60))
+    right = ' '.join(rng.choices(WORDS, k=60))
+    update_clusters([make_post('l1', left), make_post('l2', variant(left, rng, 3)), make_post('r1', right)])
+
+    # Half of each: similar enough to both clusters, but the clusters share nothing,
+    # so the post joins the larger one and the other is left alone
+    update_clusters([make_post('bridge', left + ' ' + right)])
+    clusters = get_post_clusters(['l1', 'l2', 'r1', 'bridge'])
+    assert clusters['bridge']['cluster_id'] == 'l1'
+    assert clusters['r1']['cluster_id'] == 'r1'
+    assert get_cluster('l1')['size'] == 3
+
+    # Clusters whose first posts are alike are merged by a post that matches both
+    middle = variant(left, rng, 12)
+    monkeypatch.setattr(clustering, 'CLUSTER_SIMILARITY', 0.9)
+    update_clusters([make_post('m1', middle)])
+    assert get_post_clusters(['m1'])['m1']['cluster_id'] == 'm1'
+    monkeypatch.setattr(clustering, 'CLUSTER_SIMILARITY', 0.3)
+    update_clusters([make_post('m2', variant(middle, rng, 3))])
+    clusters = get_post_clusters(['m1', 'm2'])
+    assert clusters['m1']['cluster_id'] == clusters['m2']['cluster_id'] == 'l1'
+    assert get_cluster('m1') is None
+    assert get_cluster('l1')['size'] == 5
+
+def test_signatures_of_another_length_are_rebuilt(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    rng = random.Random(5)
+    text = ' '.join(rng.choices(WORDS, k=80))
+    posts = [make_post('a1', text), make_post('a2', variant(text, rng, 3))]
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', posts)
+    update_clusters(posts)
+
+    # As stored by a version with shorter signatures
+    conn = db.get_connection()
+    conn.execute("UPDATE post_minhash SET signature = substr(signature, 1, 64)")
+    conn.commit()
+    conn.close()
+
+    assert update_clusters([make_post('a3', variant(text, rng, 3))]) == {'a1': 'a1', 'a2': 'a1', 'a3': 'a1'}
+    assert get_cluster('a1')['size'] == 3
+def test_cluster_summary_is_generated_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    import app
+    monkeypatch.setattr(app.app, 'testing', True)
+    rng = random.Random(4)
+    text = ' '.join(rng.choices(WORDS, k=80))
+    posts = [make_post('a1', text), make_post('a2', variant(text, rng, 3))]
+    update_clusters(posts)
+
+    server, url = start_fake_ollama()
+    try:
+        monkeypatch.setattr(ollama_summarizer, '_client', OllamaClient(url))
+        client = app.app.test_client()
+        first = client.post('/summarize-cluster', json={'cluster_id': 'a1'}).get_json()
+        assert first['size'] == 2 and first['summary'].startswith('summary of')
+        assert client.post('/summarize-cluster', json={'cluster_id': 'a1'}).get_json() == first
+        assert server.requests == 1
+        assert get_cluster('a1')['summary'] == first['summary']
+
+        # A new member clears the stored summary
+        update_clusters([make_post('a3', variant(text, rng, 3))])
+        assert get_cluster('a1')['summary'] is None
+        assert client.post('/summarize-cluster', json={'cluster_id': 'missing'}).status_code == 404
+    finally:
+        server.shutdown()
@@ -0,0 +1,85 @@
+import sys
+import threading
+import datetime
+import pandas as pd
+import pyarrow.parquet as pq
+import db
+import run_crawler
+from columnar import ColumnarWriter, save_columnar, read_results
+
+def make_post(i):
+    return {
+        'id': f"p{i}",
+        'title': f"Defective product {i}",
+        'score': i,
+        'url': f"https://example.com/{i}",
+        'permalink': f"https://www.reddit.com/r/legaladvice/comments/p{i}/",
+        'author': 'someone',
+        'created_utc': '2024-01-01 12:00:00',
+        'num_comments': 2,
+        'content': 'The company refuses to refund a defective product.',
+        'summary': 'Refund refused.',
+        'top_comments': [
+            {'id': f"p{i}c1", 'author': 'a', 'score': 5, 'body': 'Same here', 'created_utc': '2024-01-01 13:00:00'},
+            {'id': f"p{i}c2", 'author': 'b', 'score': 1, 'body': 'Small claims'},
+        ],
+    }
+
+def test_parquet_is_written_in_row_groups_from_threads(tmp_path):
+    path = str(tmp_path / 'results.parquet')
+    with ColumnarWriter(path, row_group_size=10) as writer:
+        threads = [threading.Thread(target=lambda start: [writer.write(make_post(i)) for i in range(start, start + 25)],
+                                    args=(start,)) for start in (0, 25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert pq.ParquetFile(path).metadata.num_row_groups == 5
+    table = read_results(path, columns=['id', 'top_comments'])
+    assert table.column_names == ['id', 'top_comments']
+    assert sorted(table.column('id').to_pylist()) == sorted(f"p{i}" for i in range(50))
+    comments = table.column('top_comments').to_pylist()[0]
+    assert comments[0]['body'] == 'Same here'
+    assert comments[0]['created_utc'] == datetime.datetime(2024, 1, 1, 13, 0)
+    assert comments[1]['created_utc'] is None
+
+def test_arrow_round_trip(tmp_path):
+    path = str(tmp_path / 'results.arrow')
+    save_columnar([make_post(i) for i in range(3)], path, row_group_size=2)
+    table = read_results(path, columns=['score', 'created_utc'])
+    assert table.column('score').to_pylist() == [0, 1, 2]
+    assert table.column('created_utc').to_pylist()[0] == datetime.datetime(2024, 1, 1, 12, 0)
+
+def test_empty_crawl_still_writes_a_readable_file(tmp_path):
+    path = str(tmp_path / 'empty.parquet')
+    ColumnarWriter(path).close()
+    assert read_results(path).num_rows == 0
+
+def test_csv_and_parquet_output_have_the_same_columns(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    def crawl(config, on_result=None, marks=None):
+        posts = [make_post(i) for i in range(3)]
+        for post in posts[0], posts[2]:
+            post.update(title='Question about a lease', content='The landlord kept my deposit.', top_comments=[])
+        posts[1]['title'] = 'Class action over defective chargers?'
+        for post in posts:
+            if on_result:
+                on_result(post)
+        return posts
+    monkeypatch.setattr(run_crawler, 'run_crawl', crawl)
+
+    outputs = {}
+    for output_format in ('csv', 'parquet'):
+        outputs[output_format] = str(tmp_path / f"results.{output_format}")
+        monkeypatch.setattr(sys, 'argv', ['run_crawler.py', '--format', output_format, '--output', outputs[output_format]])
+        assert run_crawler.main() == 0
+
+    csv = pd.read_csv(outputs['csv'])
+    parquet = read_results(outputs['parquet']).to_pandas()
+    assert sorted(csv.columns) == sorted(parquet.columns)
+    assert set(parquet['subreddit']) == {'legaladvice'}
+    # Parquet rows are in crawl order, with the scores the CSV is ranked by
+    scores = dict(zip(csv['id'], csv['class_action_score']))
+    assert parquet['class_action_score'].tolist() == [scores[post_id] for post_id in parquet['id']]
+    assert csv['id'][0] == 'p1' and parquet['likely_class_action'].tolist() == [False, True, False]
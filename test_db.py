@@ -2,3 +2,158 @@ import db
 
 # initialize database
 db.init_db()
+
+def make_post(post_id, score):
+    return {
+        'id': post_id,
+        'title': f"Post {post_id}",
+        'permalink': f"https://www.reddit.com/r/legaladvice/comments/{post_id}/post/",
+        'score': score,
+        'author': 'someone',
+        'created_utc': '2024-01-01 00:00:00',
+        'num_comments': 2,
+        'content': 'My landlord kept the deposit.',
+        'summary': 'My landlord kept the deposit.',
+        'top_comments': [
+            {'id': f"{post_id}c1", 'author': 'a', 'score': 5, 'body': 'Same here', 'created_utc': '2024-01-01 01:00:00'},
+            {'id': f"{post_id}c2", 'author': 'b', 'score': 3, 'body': 'Small claims', 'created_utc': '2024-01-01 02:00:00'},
+        ],
+    }
+
+def count_rows(table):
+    conn = db.get_connection()
+    count = conn.execute(f'SELECT COUNT(*) AS n FROM {table}').fetchone()['n']
+    conn.close()
+    return count
+
+def test_runs_share_posts(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [make_post('abc', 1), make_post('def', 2)])
+    db.save_run('run2', '2024-01-02T00:00:00', 'legaladvice', 10, '', [make_post('abc', 7)])
+
+    assert count_rows('posts') == 2
+    assert count_rows('comments') == 4
+    assert count_rows('run_posts') == 3
+
+    results = db.get_run_results('run1')
+    assert [post['id'] for post in results] == ['abc', 'def']
+    assert results[0]['score'] == 7
+    assert [comment['body'] for comment in results[0]['top_comments']] == ['Same here', 'Small claims']
+
+def test_migrates_old_crawler_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    conn = db.get_connection()
+    conn.execute('CREATE TABLE crawler_runs (id TEXT PRIMARY KEY, timestamp TEXT NOT NULL, subreddit TEXT NOT NULL, posts_count INTEGER NOT NULL, keyword TEXT, results_count INTEGER NOT NULL)')
+    conn.execute('CREATE TABLE crawler_results (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT NOT NULL, title TEXT NOT NULL, url TEXT NOT NULL, score INTEGER NOT NULL, author TEXT NOT NULL, created_utc TEXT NOT NULL, num_comments INTEGER NOT NULL, summary TEXT, top_comments TEXT)')
+    for run_id, timestamp, score in [('old1', '2024-01-01T00:00:00', 1), ('old2', '2024-01-02T00:00:00', 4)]:
+        conn.execute('INSERT INTO crawler_runs VALUES (?, ?, ?, ?, ?, ?)', (run_id, timestamp, 'legaladvice', 10, '', 1))
+        conn.execute(
+            'INSERT INTO crawler_results (run_id, title, url, score, author, created_utc, num_comments, summary, top_comments) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (run_id, 'Old post', 'https://www.reddit.com/r/legaladvice/comments/xyz/old_post/', score, 'someone',
+             '2024-01-01 00:00:00', 0, 'Summary', '[{"author": "a", "score": 1, "body": "Me too"}]')
+        )
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+    db.init_db()
+
+    assert count_rows('posts') == 1
+    assert count_rows('comments') == 1
+    assert count_rows('run_posts') == 2
+    results = db.get_run_results('old1')
+    assert results[0]['id'] == 'xyz'
+    assert results[0]['score'] == 4
+    assert results[0]['top_comments'][0]['body'] == 'Me too'
+
+def test_resaving_post_replaces_stale_comments(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+
+    post = make_post('abc', 1)
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [post])
+    post['top_comments'] = [post['top_comments'][1], {'id': 'abcc3', 'author': 'c', 'score': 9, 'body': 'Call a lawyer'}]
+    db.save_run('run2', '2024-01-02T00:00:00', 'legaladvice', 10, '', [post])
+
+    comments = db.get_run_results('run2')[0]['top_comments']
+    assert [comment['id'] for comment in comments] == ['abcc2', 'abcc3']
+
+def test_connections_are_reused_per_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    conn = db.get_connection()
+    conn.close()
+    assert db.get_connection() is conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()['journal_mode'] == 'wal'
+
+def test_nested_borrow_keeps_the_callers_transaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    conn = db.get_connection()
+    conn.execute("INSERT INTO crawl_state VALUES ('a', '', 1.0, 'p1', '2024-01-01T00:00:00')")
+    # A helper borrowing the same connection does not throw away the caller's insert
+    assert db.get_crawl_state('a', None)['newest_post_id'] == 'p1'
+    assert conn.in_transaction
+    conn.commit()
+
+    # The outermost close still rolls back what was left uncommitted
+    conn.execute("INSERT INTO crawl_state VALUES ('b', '', 1.0, 'p2', '2024-01-01T00:00:00')")
+    conn.close()
+    assert db.get_crawl_state('b', None) is None
+
+def test_run_results_are_paged_and_projected(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [make_post(f"p{i}", i) for i in range(7)])
+
+    first = db.get_run_results('run1', columns=['title'], comment_limit=1, limit=3)
+    assert [post['id'] for post in first] == ['p0', 'p1', 'p2']
+    assert set(first[0]) == {'position', 'id', 'title', 'top_comments'}
+    assert len(first[0]['top_comments']) == 1
+
+    rest = db.get_run_results('run1', include_comments=False, after=first[-1]['position'])
+    assert [post['id'] for post in rest] == ['p3', 'p4', 'p5', 'p6']
+    assert 'top_comments' not in rest[0] and 'content' not in rest[0]
+
+    conn = db.get_connection()
+    plan = ' '.join(row['detail'] for row in conn.execute(
+        'EXPLAIN QUERY PLAN SELECT * FROM crawler_runs ORDER BY timestamp DESC, id DESC LIMIT 10'))
+    conn.close()
+    assert 'idx_crawler_runs_timestamp' in plan
+
+def test_class_action_scores_are_stored_per_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    conn = db.get_connection()
+    # A run_posts table from before posts were scored
+    conn.execute('CREATE TABLE run_posts (run_id TEXT NOT NULL, post_id TEXT NOT NULL, position INTEGER NOT NULL, '
+                 'PRIMARY KEY (run_id, post_id))')
+    conn.commit()
+    db.init_db()
+
+    scored = dict(make_post('abc', 1), class_action_score=0.83)
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [scored, make_post('def', 2)])
+
+    results = db.get_run_results('run1', columns=['title', 'class_action_score'], include_comments=False)
+    assert [post['class_action_score'] for post in results] == [0.83, None]
+
+def test_update_post_stats_reports_affected_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [make_post('a', 1), make_post('b', 2)])
+    db.save_run('run2', '2024-01-02T00:00:00', 'legaladvice', 10, '', [make_post('b', 2)])
+    db.save_run('run3', '2024-01-03T00:00:00', 'legaladvice', 10, '', [make_post('c', 3)])
+
+    # Unchanged numbers leave every run as it was
+    assert db.update_post_stats([{'id': 'a', 'score': 1, 'num_comments': 2}]) == []
+    assert db.update_post_stats([{'id': 'b', 'score': 9, 'num_comments': 2},
+                                 {'id': 'c', 'score': 3, 'num_comments': 2}]) == ['run1', 'run2']
+
+def test_stored_post_ids_are_newest_first_and_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    posts = [dict(make_post(f"p{day}", 1), created_utc=f"2024-01-0{day} 00:00:00") for day in range(1, 6)]
+    db.save_run('run1', '2024-01-06T00:00:00', 'legaladvice', 10, '', posts)
+
+    assert db.get_stored_post_ids('legaladvice', '2024-01-02 00:00:00') == ['p5', 'p4', 'p3', 'p2']
+    assert db.get_stored_post_ids('LegalAdvice', '2024-01-01 00:00:00', limit=2) == ['p5', 'p4']
@@ -0,0 +1,26 @@
+import csv
+import gzip
+import io
+import json
+from export import iter_csv, iter_ndjson, encode_chunks, gzip_chunks
+
+POSTS = [
+    {'title': 'Charger caught fire, "recall"?', 'permalink': 'https://www.reddit.com/r/legaladvice/comments/a1/',
+     'score': 12, 'author': 'someone', 'created_utc': '2024-01-01 00:00:00', 'num_comments': 4,
+     'summary': 'Line one\nline two',
+     'top_comments': [{'author': 'a', 'score': 3, 'body': 'Same here'}, {'author': 'b', 'score': 1, 'body': 'Call a lawyer'}]},
+    {'title': 'Deposit kept', 'permalink': '', 'score': 1, 'author': 'other', 'created_utc': '', 'num_comments': 0,
+     'summary': '', 'top_comments': []},
+]
+
+def test_streamed_csv_parses_back():
+    data = b''.join(encode_chunks(iter_csv(POSTS), chunk_size=16)).decode('utf-8')
+    rows = list(csv.reader(io.StringIO(data)))
+    assert rows[0][0] == 'Title'
+    assert rows[1][0] == 'Charger caught fire, "recall"?'
+    assert rows[1][7] == 'u/a (Score: 3): Same here\nu/b (Score: 1): Call a lawyer'
+    assert len(rows) == 3
+
+def test_gzipped_ndjson_round_trips():
+    data = gzip.decompress(b''.join(gzip_chunks(encode_chunks(iter_ndjson(POSTS)))))
+    assert [json.loads(line) for line in data.decode('utf-8').splitlines()] == POSTS
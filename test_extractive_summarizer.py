@@ -0,0 +1,50 @@
+import random
+import numpy as np
+import networkx as nx
+from reddit_crawler import sentence_similarity
+from extractive_summarizer import similarity_matrix, rank_sentences
+
+STOP_WORDS = {"the", "a", "an", "and", "or", "to", "of", "in", "is", "it", "i", "my", "was", "for", "on", "this"}
+
+WORDS = ("battery swelling phone refund warranty landlord deposit employer overtime wage "
+         "paycheck recall defect customer service company charged fee lawyer court "
+         "contract lease mold repair broken car dealer loan interest bank").split()
+
+def legacy_rank_sentences(sentences, stop_words, num_sentences=5):
+    """
+    The original double-loop TextRank, kept here as the reference output.
+    """
+    matrix = np.zeros((len(sentences), len(sentences)))
+    for i in range(len(sentences)):
+        for j in range(len(sentences)):
+            if i != j:
+                matrix[i][j] = sentence_similarity(sentences[i], sentences[j], stop_words)
+    scores = nx.pagerank(nx.from_numpy_array(matrix))
+    ranked_sentences = sorted(((scores[i], s) for i, s in enumerate(sentences)), reverse=True)
+    summary_sentences = [ranked_sentences[i][1] for i in range(min(num_sentences, len(ranked_sentences)))]
+    summary_sentences.sort(key=lambda sentence: sentences.index(sentence))
+    return summary_sentences
+
+def make_sentences(count, seed):
+    rng = random.Random(seed)
+    vocabulary = WORDS + sorted(STOP_WORDS)
+    return [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(4, 18))).capitalize() + '.'
+            for _ in range(count)]
+
+def test_similarity_matrix_matches_pairwise():
+    sentences = make_sentences(25, seed=1) + ["The and of.", "Battery battery BATTERY."]
+    matrix = similarity_matrix(sentences, STOP_WORDS)
+    for i in range(len(sentences)):
+        for j in range(len(sentences)):
+            expected = sentence_similarity(sentences[i], sentences[j], STOP_WORDS) if i != j else 0.0
+            assert abs(matrix[i][j] - expected) < 1e-9
+
+def test_rank_sentences_matches_legacy_textrank():
+    for seed, count in enumerate([6, 10, 25, 60]):
+        sentences = make_sentences(count, seed)
+        assert rank_sentences(sentences, STOP_WORDS) == legacy_rank_sentences(sentences, STOP_WORDS)
+
+if __name__ == "__main__":
+    test_similarity_matrix_matches_pairwise()
+    test_rank_sentences_matches_legacy_textrank()
+    print("All extractive summarizer checks passed")
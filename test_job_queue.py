@@ -0,0 +1,146 @@
+import time
+import sqlite3
+import threading
+import db
+import job_queue
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_jobs_are_claimed_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    job_ids = {job_queue.enqueue_job({'subreddit': 'legaladvice', 'n': i}) for i in range(20)}
+
+    claimed = []
+    def claim_all(worker_id):
+        while True:
+            job = job_queue.claim_next_job(worker_id)
+            if job is None:
+                return
+            claimed.append(job['id'])
+
+    threads = [threading.Thread(target=claim_all, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+
+def test_worker_pool_runs_jobs_and_records_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+
+    def handler(job):
+        if job['params']['fail']:
+            raise RuntimeError('Reddit is down')
+        job_queue.update_job_progress(job['id'], 10, 2)
+        return 2
+
+    ok = job_queue.enqueue_job({'fail': False})
+    bad = job_queue.enqueue_job({'fail': True})
+    pool = job_queue.WorkerPool(handler, workers=2)
+    pool.start()
+    try:
+        assert wait_for(lambda: job_queue.get_job(ok)['state'] == 'complete' and job_queue.get_job(bad)['state'] == 'failed')
+    finally:
+        pool.stop(timeout=5)
+
+    done = job_queue.get_job(ok)
+    assert (done['posts_processed'], done['matches_found'], done['results_count']) == (10, 2, 2)
+    assert job_queue.get_job(bad)['error'] == 'Reddit is down'
+
+def test_stale_running_jobs_are_requeued(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    job_id = job_queue.enqueue_job({})
+    job_queue.claim_next_job('dead-worker')
+    job_queue.add_job_result(job_id, {'title': 'partial'})
+
+    assert job_queue.requeue_stale_jobs(max_age=3600) == 0
+    assert job_queue.requeue_stale_jobs(max_age=-1) == 1
+    assert job_queue.get_job(job_id)['state'] == 'queued'
+    # The rerun starts its live results over
+    assert job_queue.get_job_results(job_id) == []
+
+def test_worker_survives_a_locked_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    monkeypatch.setattr(job_queue, 'POLL_INTERVAL', 0.01)
+    db.init_db()
+    claim = job_queue.claim_next_job
+    failures = []
+    def flaky_claim(worker_id):
+        if len(failures) < 2:
+            failures.append(worker_id)
+            raise sqlite3.OperationalError('database is locked')
+        return claim(worker_id)
+    monkeypatch.setattr(job_queue, 'claim_next_job', flaky_claim)
+
+    finish = job_queue.finish_job
+    finished = threading.Event()
+    def finish_and_signal(job_id, results_count):
+        finish(job_id, results_count)
+        finished.set()
+    monkeypatch.setattr(job_queue, 'finish_job', finish_and_signal)
+
+    job_id = job_queue.enqueue_job({})
+    pool = job_queue.WorkerPool(lambda job: 0, workers=1)
+    pool.start()
+    try:
+        # Generous, since the event fires as soon as the job is done
+        assert finished.wait(60)
+    finally:
+        pool.stop(timeout=5)
+    assert job_queue.get_job(job_id)['state'] == 'complete'
+    assert len(failures) == 2
+
+def test_worker_survives_a_locked_database_when_recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    monkeypatch.setattr(job_queue, 'POLL_INTERVAL', 0.01)
+    db.init_db()
+    def locked(job_id, *args):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(job_queue, 'finish_job', locked)
+    monkeypatch.setattr(job_queue, 'fail_job', locked)
+
+    handled = []
+    last_done = threading.Event()
+    def handler(job):
+        handled.append(job['id'])
+        if len(handled) == 3:
+            last_done.set()
+        if job['params']['fail']:
+            raise RuntimeError('crawl failed')
+        return 0
+
+    job_ids = [job_queue.enqueue_job({'fail': fail}) for fail in (False, True, False)]
+    pool = job_queue.WorkerPool(handler, workers=1)
+    pool.start()
+    try:
+        # The worker goes on to the next job after each unrecorded one
+        assert last_done.wait(60)
+    finally:
+        pool.stop(timeout=5)
+    assert handled == job_ids
+    # They are left running for requeue_stale_jobs
+    assert [job_queue.get_job(job_id)['state'] for job_id in job_ids] == ['running'] * 3
+
+def test_live_results_are_read_incrementally(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    job_id = job_queue.enqueue_job({})
+    job_queue.add_job_result(job_id, {'title': 'first'})
+    job_queue.add_job_result(job_id, {'title': 'second'})
+
+    rows = job_queue.get_job_results(job_id)
+    assert [row['post'] for row in rows] == ['{"title": "first"}', '{"title": "second"}']
+    assert job_queue.get_job_results(job_id, rows[0]['id']) == rows[1:]
+
+    job_queue.finish_job(job_id, 2)
+    assert job_queue.get_job_results(job_id) == []
@@ -0,0 +1,39 @@
+from keyword_matcher import KeywordMatcher, compile_keywords
+
+KEYWORDS = ["class action", "same issue", "issue", "Scam", "defective", "wage theft"]
+
+def test_find_all_reports_overlapping_matches_with_offsets():
+    matcher = KeywordMatcher(KEYWORDS)
+    text = "Is this a SCAM? Same issue with my defective charger"
+    matches = sorted(matcher.find_all(text), key=lambda match: (match[1], match[0]))
+    assert matches == [
+        ("Scam", 10, 14),
+        ("same issue", 16, 26),
+        ("issue", 21, 26),
+        ("defective", 35, 44),
+    ]
+    for keyword, start, end in matches:
+        assert text[start:end].lower() == keyword.lower()
+
+def test_matched_keywords_agrees_with_substring_search():
+    matcher = compile_keywords(KEYWORDS)
+    texts = [
+        ("Wage theft at my job", "they kept my tips"),
+        ("Question about a lease", ""),
+        ("Possible class action?", "Is the defective part a scam or the same issue everyone has"),
+    ]
+    for title, content in texts:
+        expected = [k for k in KEYWORDS if k.lower() in title.lower() or k.lower() in content.lower()]
+        assert matcher.matched_keywords(title, content) == expected
+
+def test_compile_keywords_reuses_matcher():
+    assert compile_keywords(KEYWORDS) is compile_keywords(list(KEYWORDS))
+
+def test_empty_and_blank_keywords_match_like_substring_search():
+    keywords = ["", "  ", "scam"]
+    matcher = KeywordMatcher(keywords)
+    texts = [("Is this a scam?", ""), ("Double  spaced", "text"), ("", "")]
+    for title, content in texts:
+        expected = [k for k in keywords if k.lower() in title.lower() or k.lower() in content.lower()]
+        assert matcher.matched_keywords(title, content) == expected
+    assert matcher.find_all("a scam") == [("", 0, 0), ("scam", 2, 6)]
@@ -1,8 +1,139 @@
+import pytest
 import requests
 import json
-from ollama_summarizer import summarize_text
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import db
+import ollama_summarizer
+from ollama_summarizer import summarize_text, summarize_texts, generate_cached, stream_cached, summarize_map_reduce, chunk_texts, estimate_tokens, OllamaClient, OllamaError
 
-def test_ollama_api():
+class FakeOllama(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Ollama generate API.
+
+    The server object carries the scripted behaviour: a list of status codes to
+    answer with before succeeding, a delay per request and in-flight counters.
+    """
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.requests += 1
+            status = server.statuses.pop(0) if server.statuses else 200
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            if status != 200:
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            words = f"summary of {payload['prompt'][-8:]}".split(' ')
+            if payload.get('stream', True):
+                body = "\n".join(json.dumps({'response': word + ' '}) for word in words)
+            else:
+                body = json.dumps({'response': ' '.join(words)})
+            body = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+def start_fake_ollama(statuses=None, delay=0.0):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllama)
+    server.lock = threading.Lock()
+    server.statuses = list(statuses or [])
+    server.delay = delay
+    server.requests = 0
+    server.in_flight = 0
+    server.max_in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def test_client_generate_and_stream():
+    server, url = start_fake_ollama()
+    try:
+        client = OllamaClient(url)
+        assert client.generate("prompt 12345678") == "summary of 12345678"
+        assert "".join(client.stream_generate("prompt 12345678")).strip() == "summary of 12345678"
+    finally:
+        server.shutdown()
+
+def test_client_retries_gateway_errors():
+    server, url = start_fake_ollama(statuses=[503, 503])
+    try:
+        client = OllamaClient(url, backoff=0.01)
+        assert client.generate("prompt 12345678") == "summary of 12345678"
+        assert server.requests == 3
+    finally:
+        server.shutdown()
+
+def test_client_raises_after_retries():
+    server, url = start_fake_ollama(statuses=[500])
+    try:
+        client = OllamaClient(url, backoff=0.01)
+        try:
+            client.generate("prompt")
+            assert False, "expected OllamaError"
+        except OllamaError as e:
+            assert e.status_code == 500
+    finally:
+        server.shutdown()
+
+def test_summarize_texts_limits_concurrency_and_keeps_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    server, url = start_fake_ollama(delay=0.05)
+    try:
+        monkeypatch.setattr(ollama_summarizer, '_client', OllamaClient(url))
+        texts = [f"post {i:08d}" for i in range(12)]
+        summaries = summarize_texts(texts, max_concurrency=3)
+        assert summaries == [f"summary of {i:08d}" for i in range(12)]
+        assert server.max_in_flight == 3
+    finally:
+        server.shutdown()
+
+def test_generate_cached_skips_repeat_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    server, url = start_fake_ollama()
+    try:
+        monkeypatch.setattr(ollama_summarizer, '_client', OllamaClient(url))
+        first = generate_cached("Summarize this: {text}", "post 12345678", "gemma3")
+        second = generate_cached("Summarize this: {text}", "post 12345678", "gemma3")
+        assert first == second == "summary of 12345678"
+        assert server.requests == 1
+    finally:
+        server.shutdown()
+
+def ollama_running():
+    try:
+        requests.get(ollama_summarizer.OLLAMA_URL, timeout=1)
+        return True
+    except requests.exceptions.RequestException:
+        return False
+
+def test_ollama_api(tmp_path, monkeypatch):
+    """
+    Run the manual Ollama check against a local server, when one is running.
+    """
+    if not ollama_running():
+        pytest.skip(f"Ollama is not running on {ollama_summarizer.OLLAMA_URL}")
+    # Cached summaries go to a scratch database, not crawler_results.db
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    check_ollama_api()
+
+def check_ollama_api():
     """
     Test the Ollama Summarizer directly.
     """
@@ -38,5 +169,58 @@ def test_ollama_api():
     except requests.exceptions.ConnectionError:
         print("Could not connect to Flask server. Make sure it's running on localhost:5000")
 
+def test_chunk_texts_respects_budget_and_stays_stable():
+    texts = [f"post {i} " + "word " * (i % 7 * 20) for i in range(60)]
+    chunks = chunk_texts(texts, token_budget=200)
+    assert [text for chunk in chunks for text in chunk] == texts
+    assert all(len(chunk) == 1 or sum(estimate_tokens(t) for t in chunk) <= 200 for chunk in chunks)
+
+    # Inserting a post only changes the chunk it lands in
+    changed = texts[:30] + ["a brand new post"] + texts[30:]
+    new_chunks = chunk_texts(changed, token_budget=200)
+    removed = [chunk for chunk in chunks if chunk not in new_chunks]
+    assert len(removed) <= 2
+
+def test_map_reduce_only_regenerates_changed_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    server, url = start_fake_ollama()
+    try:
+        monkeypatch.setattr(ollama_summarizer, '_client', OllamaClient(url))
+        texts = [f"post {i:04d} " + "word " * 40 for i in range(40)]
+        summary = summarize_map_reduce(texts, "Overall: {text}", token_budget=300)
+        assert summary.startswith("summary of")
+        first_requests = server.requests
+        assert first_requests > 2
+
+        server.requests = 0
+        summarize_map_reduce(texts + ["post 9999 one more"], "Overall: {text}", token_budget=300)
+        # The changed last chunk and the final reduce
+        assert server.requests == 2
+    finally:
+        server.shutdown()
+
+def test_stream_cached_caches_only_complete_answers(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    server, url = start_fake_ollama()
+    try:
+        monkeypatch.setattr(ollama_summarizer, '_client', OllamaClient(url))
+
+        # Abandoned after the first token: nothing is cached
+        tokens = stream_cached("Summarize this: {text}", "post 12345678", "gemma3")
+        assert next(tokens) == "summary "
+        tokens.close()
+
+        pieces = list(stream_cached("Summarize this: {text}", "post 12345678", "gemma3"))
+        assert pieces == ["summary ", "of ", "12345678 "]
+        assert server.requests == 2
+
+        # Served from the cache in one piece
+        assert list(stream_cached("Summarize this: {text}", "post 12345678", "gemma3")) == ["summary of 12345678 "]
+        assert server.requests == 2
+    finally:
+        server.shutdown()
+
 if __name__ == "__main__":
-    test_ollama_api()
\ No newline at end of file
+    check_ollama_api()
\ No newline at end of file
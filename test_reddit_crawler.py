@@ -0,0 +1,328 @@
+import os
+import time
+import db
+import reddit_crawler
+import threading
+from reddit_crawler import (crawl_reddit, crawl_reddit_incremental, CrawlConfig, run_crawl, run_crawls, parse_subreddits,
+                            SummaryStage)
+from rate_limit import TokenBucket, FairRateLimiter
+from run_stats import get_run_stats
+
+class FakeComment:
+    def __init__(self, post_id, index):
+        self.id = f"{post_id}c{index}"
+        self.author = f"commenter{index}"
+        self.score = 10 - index
+        self.body = f"Same thing happened to me on {post_id}"
+        self.created_utc = time.time()
+
+class FakeComments(list):
+    def replace_more(self, limit=None):
+        pass
+
+class FakePost:
+    """
+    Stand-in for a praw Submission whose comment tree costs one slow round-trip.
+    """
+
+    def __init__(self, index, latency):
+        self.id = f"p{index}"
+        self.title = f"Defective charger {index}" if index % 2 == 0 else f"Question {index}"
+        self.selftext = "My charger is defective and the company will not refund it."
+        self.score = index
+        self.url = f"https://example.com/{index}"
+        self.created_utc = time.time()
+        self.author = f"user{index}"
+        self.num_comments = 3
+        self.permalink = f"/r/legaladvice/comments/p{index}/"
+        self.stickied = False
+        self.latency = latency
+
+    @property
+    def comments(self):
+        time.sleep(self.latency)
+        return FakeComments(FakeComment(self.id, i) for i in range(3))
+
+class FakeSubreddit:
+    def __init__(self, posts):
+        self.posts = posts
+
+    def new(self, limit=None):
+        return iter(self.posts[:limit])
+
+class FakeReddit:
+    def __init__(self, posts):
+        self.posts = posts
+
+    def subreddit(self, name):
+        return FakeSubreddit(self.posts)
+
+    def info(self, fullnames=None):
+        wanted = {fullname[3:] for fullname in fullnames}
+        return [post for post in self.posts if post.id in wanted]
+
+class FakeMultiReddit(FakeReddit):
+    def __init__(self, listings):
+        super().__init__([post for posts in listings.values() for post in posts])
+        self.listings = listings
+
+    def subreddit(self, name):
+        return FakeSubreddit(self.listings[name])
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.perf_counter()
+    for _ in range(11):
+        bucket.acquire()
+    # One token is available up front, the other ten arrive at 50 per second
+    assert time.perf_counter() - start >= 0.18
+
+def test_pipelined_crawl_matches_sequential_and_is_faster():
+    reddit = FakeReddit([FakePost(i, latency=0.05) for i in range(20)])
+    unlimited = TokenBucket(rate=1000, capacity=1000)
+
+    start = time.perf_counter()
+    sequential = crawl_reddit('legaladvice', 10, 2, 30, ['defective'], workers=1, rate_limiter=unlimited, reddit=reddit)
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pipelined = crawl_reddit('legaladvice', 10, 2, 30, ['defective'], workers=8, rate_limiter=unlimited, reddit=reddit)
+    pipelined_time = time.perf_counter() - start
+
+    assert [post['id'] for post in pipelined] == [post['id'] for post in sequential]
+    assert all(len(post['top_comments']) == 2 for post in pipelined)
+    assert pipelined_time * 3 < sequential_time
+
+def test_incremental_crawl_stops_at_high_water_mark(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    unlimited = TokenBucket(rate=1000, capacity=1000)
+
+    # Listing is newest first
+    posts = [FakePost(i, latency=0) for i in range(6)]
+    for age, post in enumerate(posts):
+        post.created_utc -= age
+    reddit = FakeReddit(posts)
+
+    first = crawl_reddit_incremental('legaladvice', 10, 1, 30, ['defective'], rate_limiter=unlimited, reddit=reddit)
+    assert [post['id'] for post in first] == ['p0', 'p1', 'p2', 'p3', 'p4', 'p5']
+    assert db.get_crawl_state('legaladvice', ['Defective'])['newest_post_id'] == 'p0'
+
+    # Store the first run the way the web app does so its stats can be refreshed
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, 'defective', first)
+    assert get_run_stats('run1')['score']['max'] == 5
+
+    newer = FakePost(6, latency=0)
+    newer.created_utc += 10
+    posts[2].score = 99
+    reddit.posts = [newer] + posts
+
+    second = crawl_reddit_incremental('legaladvice', 10, 1, 30, ['defective'], rate_limiter=unlimited, reddit=reddit)
+    assert [post['id'] for post in second] == ['p6']
+    assert db.get_crawl_state('legaladvice', ['defective'])['newest_post_id'] == 'p6'
+
+    conn = db.get_connection()
+    row = conn.execute("SELECT score FROM posts WHERE id = 'p2'").fetchone()
+    conn.close()
+    assert row['score'] == 99
+    # The stored aggregates of the run showing p2 follow its new score
+    assert get_run_stats('run1')['score']['max'] == 99
+
+def test_high_water_mark_waits_for_a_complete_crawl(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    unlimited = TokenBucket(rate=1000, capacity=1000)
+    posts = [FakePost(i, latency=0) for i in range(10)]
+    for age, post in enumerate(posts):
+        post.created_utc -= age
+    reddit = FakeReddit(posts[6:])
+    crawl_reddit_incremental('legaladvice', 10, 1, 30, None, rate_limiter=unlimited, reddit=reddit)
+    assert db.get_crawl_state('legaladvice', None)['newest_post_id'] == 'p6'
+
+    # Six new posts, but only four are listed: the old mark stays so p4 and p5 are not lost
+    reddit.posts = posts
+    truncated = crawl_reddit_incremental('legaladvice', 2, 1, 30, None, rate_limiter=unlimited, reddit=reddit)
+    assert [post['id'] for post in truncated] == ['p0', 'p1', 'p2', 'p3']
+    assert db.get_crawl_state('legaladvice', None)['newest_post_id'] == 'p6'
+
+    # A caller collecting the marks saves them itself once the posts are stored
+    marks = []
+    config = CrawlConfig(subreddit='legaladvice', post_limit=10, comment_limit=1, incremental=True)
+    complete = run_crawl(config, reddit=reddit, rate_limiter=unlimited, marks=marks)
+    assert [post['id'] for post in complete] == [f"p{i}" for i in range(6)]
+    assert db.get_crawl_state('legaladvice', None)['newest_post_id'] == 'p6'
+    assert [mark[3] for mark in marks] == ['p0']
+    db.save_crawl_state(*marks[0])
+    assert db.get_crawl_state('legaladvice', None)['newest_post_id'] == 'p0'
+
+def test_run_crawl_reports_progress_without_printing(capsys):
+    reddit = FakeReddit([FakePost(i, latency=0) for i in range(5)])
+    config = CrawlConfig(subreddit='legaladvice', post_limit=10, comment_limit=1, filter_keywords=['charger'], workers=2)
+    updates = []
+
+    posts = run_crawl(config, progress=lambda processed, matches: updates.append((processed, matches)), reddit=reddit)
+
+    assert len(posts) == 5
+    assert updates[-1] == (5, 5)
+    assert capsys.readouterr().out == ''
+
+class CountingLimiter:
+    def __init__(self):
+        self.count = 0
+
+    def acquire(self, tokens=1):
+        self.count += tokens
+
+def test_listing_pages_count_against_the_rate_limit():
+    limiter = CountingLimiter()
+    assert list(reddit_crawler.rate_limited(range(250), limiter)) == list(range(250))
+    assert limiter.count == 3
+
+    # One token for the listing page and one per comment tree
+    limiter = CountingLimiter()
+    reddit = FakeReddit([FakePost(i, latency=0) for i in range(6)])
+    posts = crawl_reddit('legaladvice', 10, 1, 30, ['defective'], rate_limiter=limiter, reddit=reddit)
+    assert limiter.count == 1 + len(posts)
+
+def test_fetch_threads_get_their_own_client():
+    import praw
+    reddit = praw.Reddit(client_id='id', client_secret='secret', user_agent='crawler tests', check_for_updates=False)
+    client = reddit_crawler.worker_client(reddit)
+    assert client is not reddit
+    assert (client.config.client_id, client.config.user_agent) == ('id', 'crawler tests')
+    assert reddit_crawler.worker_client(FakeReddit([])) is None
+
+    # Comments come through the thread's client; the post's own fields from the listing
+    post = FakePost(1, latency=0)
+    other = FakePost(2, latency=0)
+    class ThreadClient:
+        def submission(self, id=None):
+            assert id == 'p1'
+            return other
+    details = reddit_crawler.fetch_post_details(post, 1, reddit=ThreadClient())
+    assert details['id'] == 'p1'
+    assert details['top_comments'][0]['id'] == 'p2c0'
+
+def test_parse_subreddits():
+    assert parse_subreddits('legaladvice', 100) == [('legaladvice', 100)]
+    assert parse_subreddits('r/legaladvice:20, antiwork+consumer', 100) == [
+        ('legaladvice', 20), ('antiwork', 100), ('consumer', 100)]
+    assert parse_subreddits(['legaladvice:5', 'legaladvice:7'], 100) == [('legaladvice', 7)]
+
+def test_fair_rate_limiter_serves_clients_round_robin():
+    order = []
+    order_lock = threading.Lock()
+
+    class RecordingBucket:
+        def acquire(self, tokens=1):
+            time.sleep(0.01)
+
+    limiter = FairRateLimiter(RecordingBucket())
+
+    def request(name):
+        limiter.acquire(name)
+        with order_lock:
+            order.append(name)
+
+    # "busy" floods the limiter from many threads, "quiet" asks a few times in a row
+    busy = [threading.Thread(target=request, args=('busy',)) for _ in range(8)]
+    for thread in busy:
+        thread.start()
+    time.sleep(0.02)
+    quiet = threading.Thread(target=lambda: [request('quiet') for _ in range(3)])
+    quiet.start()
+    for thread in busy + [quiet]:
+        thread.join()
+
+    # Once quiet is waiting it is served every other request instead of after the flood
+    first_quiet = order.index('quiet')
+    assert order[first_quiet:first_quiet + 5] == ['quiet', 'busy', 'quiet', 'busy', 'quiet']
+
+def test_run_crawls_merges_subreddits(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    # Listings hold twice the post limit, which is what crawl_reddit fetches
+    legal = [FakePost(i, latency=0.01) for i in range(6)]
+    work = [FakePost(i, latency=0.01) for i in range(10, 13)]
+    for age, post in enumerate(legal + work):
+        post.created_utc -= age
+    reddit = FakeMultiReddit({'legaladvice': legal, 'antiwork': work})
+    configs = [
+        CrawlConfig(subreddit='legaladvice', post_limit=2, comment_limit=1, filter_keywords=['charger'], workers=2),
+        CrawlConfig(subreddit='antiwork', post_limit=10, comment_limit=1, filter_keywords=['charger'], workers=2),
+    ]
+    updates = []
+    streamed = []
+
+    posts = run_crawls(configs, progress=lambda processed, matches: updates.append((processed, matches)),
+                       on_result=streamed.append, reddit=reddit, rate_limiter=TokenBucket(rate=1000, capacity=1000))
+
+    assert sorted(post['id'] for post in posts) == ['p0', 'p1', 'p10', 'p11', 'p12', 'p2', 'p3']
+    assert [post['created_utc'] for post in posts] == sorted((post['created_utc'] for post in posts), reverse=True)
+    assert {post['id']: post['subreddit'] for post in streamed}['p11'] == 'antiwork'
+    assert updates[-1] == (7, 7)
+
+    # Each post is stored under the subreddit it came from
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice+antiwork', 12, 'charger', posts)
+    conn = db.get_connection()
+    rows = {row['id']: row['subreddit'] for row in conn.execute("SELECT id, subreddit FROM posts")}
+    conn.close()
+    assert rows['p0'] == 'legaladvice' and rows['p12'] == 'antiwork'
+
+def first_sentences(text, num_sentences):
+    # Stand-in for TextRank that runs in the worker processes without NLTK data
+    return '. '.join(text.split('. ')[:num_sentences]) + f" [{os.getpid()}]"
+
+def test_summary_stage_summarizes_in_worker_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    unlimited = TokenBucket(rate=1000, capacity=1000)
+    posts = [FakePost(i, latency=0.01) for i in range(6)]
+    for i, post in enumerate(posts):
+        post.selftext = '. '.join(f"The charger number {i} broke after {n} days of normal use at home" for n in range(12))
+
+    # A queue of one keeps the fetches waiting on the worker process
+    streamed = []
+    with SummaryStage(1, max_pending=1, num_sentences=2, summarize=first_sentences, model='first') as stage:
+        staged = crawl_reddit('legaladvice', 3, 1, 30, ['charger'], workers=2, rate_limiter=unlimited,
+                              reddit=FakeReddit(posts), on_result=streamed.append, nlp_stage=stage)
+
+    assert [post['id'] for post in staged] == [f"p{i}" for i in range(6)]
+    for post in staged:
+        summary, pid = post['summary'].rsplit(' [', 1)
+        assert summary == '. '.join(post['content'].split('. ')[:2])
+        assert int(pid.rstrip(']')) != os.getpid()
+    assert sorted(post['id'] for post in streamed) == sorted(post['id'] for post in staged)
+
+    # Summaries are cached in this process, so a second crawl sends nothing to the workers
+    with SummaryStage(1, num_sentences=2, summarize=first_sentences, model='first') as stage:
+        stage.executor.shutdown()
+        again = crawl_reddit('legaladvice', 3, 1, 30, ['charger'], workers=2, rate_limiter=unlimited,
+                             reddit=FakeReddit(posts), nlp_stage=stage)
+    assert [post['summary'] for post in again] == [post['summary'] for post in staged]
+
+def test_summary_stage_failure_does_not_hang_the_crawl(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    def broken_store(*args):
+        raise RuntimeError('cache is broken')
+    monkeypatch.setattr(reddit_crawler, 'store', broken_store)
+    unlimited = TokenBucket(rate=1000, capacity=1000)
+    posts = [FakePost(i, latency=0) for i in range(2)]
+    for post in posts:
+        post.selftext = '. '.join(f"The charger broke after {n} days of normal use at home" for n in range(12))
+
+    # The error reaches the caller instead of leaving the crawl waiting on a future forever
+    errors = []
+    def crawl():
+        try:
+            with SummaryStage(1, num_sentences=2, summarize=first_sentences, model='first') as stage:
+                crawl_reddit('legaladvice', 1, 1, 30, ['charger'], workers=2, rate_limiter=unlimited,
+                             reddit=FakeReddit(posts), nlp_stage=stage)
+        except RuntimeError as e:
+            errors.append(e)
+    thread = threading.Thread(target=crawl, daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive()
+    assert [str(e) for e in errors] == ['cache is broken']
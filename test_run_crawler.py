@@ -0,0 +1,22 @@
+import sys
+import db
+import run_crawler
+from run_stats import get_run_stats
+from test_db import make_post
+
+def test_incremental_runs_are_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    crawled = [make_post('a', 3), make_post('b', 8)]
+    def crawl(config, on_result=None, marks=None):
+        assert config.incremental
+        marks.append((config.subreddit, config.filter_keywords, 1.0, 'a'))
+        return crawled
+    monkeypatch.setattr(run_crawler, 'run_crawl', crawl)
+    monkeypatch.setattr(sys, 'argv', ['run_crawler.py', '--incremental', '--print-only'])
+
+    assert run_crawler.main() == 0
+    runs = db.get_runs()
+    assert len(runs) == 1 and runs[0]['subreddit'] == 'legaladvice'
+    assert sorted(post['id'] for post in db.get_run_results(runs[0]['id'], include_comments=False)) == ['a', 'b']
+    assert get_run_stats(runs[0]['id'])['score']['max'] == 8
+    assert db.get_crawl_state('legaladvice', run_crawler.CLASS_ACTION_KEYWORDS)['newest_post_id'] == 'a'
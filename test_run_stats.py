@@ -0,0 +1,34 @@
+import db
+from run_stats import compute_run_stats, get_run_stats, refresh_run_stats
+from test_db import make_post
+
+def test_compute_run_stats():
+    posts = [
+        {'id': 'a', 'title': 'A', 'score': 10, 'num_comments': 1, 'created_utc': '2024-01-01 10:00:00'},
+        {'id': 'b', 'title': 'B', 'score': 30, 'num_comments': 5, 'created_utc': '2024-01-02 10:00:00'},
+        {'id': 'c', 'title': 'C', 'score': 20, 'num_comments': 9, 'created_utc': '2024-01-08 10:00:00'},
+    ]
+    stats = compute_run_stats(posts, top_n=2)
+    assert stats['count'] == 3
+    assert stats['score']['mean'] == 20
+    assert stats['score']['median'] == 20
+    assert sum(stats['score']['histogram']['counts']) == 3
+    assert [post['id'] for post in stats['top_posts']] == ['b', 'c']
+    assert [post['id'] for post in stats['most_commented']] == ['c', 'b']
+    assert stats['day_of_week']['Monday'] == 2
+    assert stats['day_of_week']['Tuesday'] == 1
+
+def test_stats_are_stored_per_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [make_post('p1', 5), make_post('p2', 7)])
+
+    # Runs saved without stats get them on first read
+    stats = get_run_stats('run1')
+    assert stats['count'] == 2
+
+    conn = db.get_connection()
+    stored = conn.execute('SELECT COUNT(*) AS n FROM run_stats').fetchone()['n']
+    conn.close()
+    assert stored == 1
+    assert refresh_run_stats('run1') == stats
@@ -0,0 +1,64 @@
+import pytest
+from scoring import find_phrases, score_posts, rank_posts, CLASS_ACTION_THRESHOLD
+
+def make_post(title, content='', score=0, num_comments=0, comments=()):
+    return {
+        'title': title,
+        'content': content,
+        'score': score,
+        'num_comments': num_comments,
+        'top_comments': [{'body': body} for body in comments],
+    }
+
+def test_find_phrases_maps_hits_back_to_texts():
+    texts = ['A SCAM and a scam', None, 'no match', 'ends with scam']
+    text_index, phrase_index, position = find_phrases(texts, ['scam', 'match'])
+    hits = sorted(zip(text_index.tolist(), phrase_index.tolist(), position.tolist()))
+    assert hits == [(0, 0, 2 / 17), (0, 0, 13 / 17), (2, 1, 3 / 8), (3, 0, 10 / 14)]
+
+def test_find_phrases_does_not_match_across_texts():
+    text_index, _, _ = find_phrases(['class', 'action'], ['class action', 'classaction'])
+    assert len(text_index) == 0
+
+def test_score_rises_with_each_feature():
+    base = make_post('Question about my lease', 'My landlord kept the deposit.')
+    keyword = make_post('Question about my lease', 'My landlord kept the deposit. Is this illegal?')
+    early = make_post('Question about my lease', 'Is this illegal? My landlord kept the deposit.')
+    title = make_post('Is this illegal?', 'My landlord kept the deposit.')
+    engaged = make_post('Question about my lease', 'My landlord kept the deposit.', score=400, num_comments=150)
+    me_too = make_post('Question about my lease', 'My landlord kept the deposit.',
+                       comments=['Same thing happened to me', 'Me too!', 'Nice weather'])
+    scores = score_posts([base, keyword, early, title, engaged, me_too]).tolist()
+    assert scores[0] < scores[1] < scores[2] < scores[3]
+    assert scores[0] < scores[4]
+    assert scores[0] < scores[5]
+    assert all(0 < score < 1 for score in scores)
+
+def test_rank_posts_sorts_and_flags():
+    posts = [
+        make_post('Question about my lease'),
+        make_post('Class action over defective chargers?', 'Anyone else have the same issue?', score=120,
+                  num_comments=80, comments=['Same here', 'Mine too, same problem', 'Me too']),
+        make_post('Is my boss allowed to do this?', 'Sounds like wage theft'),
+    ]
+    ranked = rank_posts(posts)
+    assert [post['title'][:5] for post in ranked] == ['Class', 'Is my', 'Quest']
+    assert ranked[0]['likely_class_action'] and ranked[0]['class_action_score'] >= CLASS_ACTION_THRESHOLD
+    assert not ranked[-1]['likely_class_action']
+    assert rank_posts(posts, threshold=0.0)[-1]['likely_class_action']
+    assert rank_posts([]) == []
+
+def make_posts(count):
+    return [
+        make_post(f"Post {i} about a defective charger", 'My charger stopped working after a week. ' * 20,
+                  score=i % 500, num_comments=i % 70, comments=['Same here', 'That is a scam', 'Good luck'] * 2)
+        for i in range(count)
+    ]
+
+def test_batch_scores_match_single_post_scores():
+    # Posts are scored on their own features only, so a post scored as it is crawled
+    # gets the same score as in the final ranking. Timing lives in bench_scoring.py.
+    posts = make_posts(200)
+    scores = score_posts(posts)
+    assert scores.shape == (200,)
+    assert scores.tolist() == pytest.approx([score_posts([post])[0] for post in posts])
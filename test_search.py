@@ -0,0 +1,171 @@
+import sqlite3
+import db
+from search import fts_query, keyword_query, highlight, search_posts
+
+def make_post(post_id, title, content, comments=(), subreddit='legaladvice'):
+    return {
+        'id': post_id,
+        'title': title,
+        'subreddit': subreddit,
+        'permalink': f"https://www.reddit.com/r/{subreddit}/comments/{post_id}/post/",
+        'score': 1,
+        'author': 'someone',
+        'created_utc': '2024-01-01 00:00:00',
+        'num_comments': len(comments),
+        'content': content,
+        'summary': None,
+        'top_comments': [
+            {'id': f"{post_id}c{i}", 'author': 'other', 'score': 1, 'body': body, 'created_utc': None}
+            for i, body in enumerate(comments)
+        ],
+    }
+
+def ids(found):
+    return [post['id'] for post in found['results']]
+
+def test_fts_query_quotes_terms():
+    assert fts_query('wage theft') == '"wage" "theft"'
+    assert fts_query('"wage theft" OR overtime') == '"wage theft" OR "overtime"'
+    assert fts_query('OR refund OR') == '"refund"'
+    assert fts_query('c++ - * NEAR(') == '"c++" "NEAR("'
+    assert fts_query('  ') == ''
+    assert fts_query(keyword_query(['class action', 'scam'])) == '"class action" OR "scam"'
+
+def test_highlight_escapes_snippets():
+    assert highlight('<b>\x02refund\x03</b>') == '&lt;b&gt;<mark>refund</mark>&lt;/b&gt;'
+
+def test_index_follows_saved_posts_and_comments(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [
+        make_post('a', 'Landlord kept my deposit', 'They never returned the security deposit.'),
+        make_post('b', 'Charger caught fire', 'The charger melted overnight.', ['Same here, mine was defective too']),
+        make_post('c', 'Unpaid overtime', 'My employer skips overtime pay.', subreddit='antiwork'),
+    ])
+
+    # Stemming matches other forms; title matches rank above body matches
+    assert ids(search_posts('deposits')) == ['a']
+    assert ids(search_posts('overtime')) == ['c']
+    assert ids(search_posts('overtime', subreddit='legaladvice')) == []
+    assert sorted(ids(search_posts('deposit OR charger'))) == ['a', 'b']
+
+    found = search_posts('defective')
+    assert ids(found) == ['b']
+    assert found['results'][0]['matched_in'] == 'comment'
+    assert '<mark>defective</mark>' in found['results'][0]['snippet']
+
+    # A re-crawl updates the text in place and replaces the top comments
+    db.save_run('run2', '2024-01-02T00:00:00', 'legaladvice', 10, '', [
+        make_post('b', 'Charger caught fire', 'Update: the manufacturer issued a recall.', ['Mine was fine']),
+    ])
+    assert ids(search_posts('recall')) == ['b']
+    assert ids(search_posts('melted')) == []
+    assert ids(search_posts('defective')) == []
+    assert ids(search_posts('charger', run_id='run2')) == ['b']
+    assert ids(search_posts('deposit', run_id='run2')) == []
+
+    # The external-content index agrees with its tables
+    conn = db.get_connection()
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('integrity-check')")
+    conn.execute("INSERT INTO comments_fts (comments_fts) VALUES ('integrity-check')")
+    conn.close()
+
+def test_results_are_paged(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    # Posts with the word in the title, then posts where only a comment has it
+    posts = [make_post(f"t{i}", f"Refund denied {i}", 'x ' * i) for i in range(5)]
+    posts += [make_post(f"c{i}", f"Question {i}", 'Nothing here.', ['I never got a refund either']) for i in range(4)]
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', posts)
+
+    pages = [search_posts('refund', page=page, per_page=4) for page in (1, 2, 3)]
+    assert [page['has_more'] for page in pages] == [True, True, False]
+    found = [post_id for page in pages for post_id in ids(page)]
+    assert sorted(found) == sorted(post['id'] for post in posts)
+    assert found[:5] == [f"t{i}" for i in range(5)]
+
+def test_existing_database_is_indexed(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [
+        make_post('a', 'Gym cancellation', 'They keep billing me.', ['Planet gym did the same']),
+    ])
+    # A database from before the search index
+    conn = sqlite3.connect(db.DATABASE_PATH)
+    conn.executescript('DROP TABLE posts_fts; DROP TABLE comments_fts;')
+    conn.close()
+
+    db.init_db()
+    assert ids(search_posts('billing')) == ['a']
+    assert ids(search_posts('planet')) == ['a']
+
+def test_search_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    import app
+    monkeypatch.setattr(app.app, 'testing', True)
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [
+        make_post('a', 'Class action over <script> fees', 'Hidden fees on every bill.'),
+    ])
+    client = app.app.test_client()
+
+    page = client.get('/search', query_string={'q': 'fees'}).get_data(as_text=True)
+    assert '<mark>fees</mark>' in page
+    assert '<script>' not in page
+
+    found = client.get('/api/search', query_string={'q': '"hidden fees"'}).get_json()
+    assert [post['id'] for post in found['results']] == ['a']
+    assert found['has_more'] is False
+
+    assert 'Find Class Action Keywords' in client.get('/').get_data(as_text=True)
+
+def test_index_survives_vacuum(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    db.save_run('run1', '2024-01-01T00:00:00', 'legaladvice', 10, '', [
+        make_post('a', 'Gym cancellation', 'They keep billing me.', ['Planet gym did the same']),
+        make_post('b', 'Airline refund', 'The flight was cancelled.', ['Chargeback worked for me']),
+        make_post('c', 'Landlord deposit', 'Deposit never returned.', ['Small claims court']),
+    ])
+    # Gaps in the rowids are what VACUUM closes up
+    conn = db.get_connection()
+    conn.execute("DELETE FROM comments WHERE post_id = 'a'")
+    conn.execute("DELETE FROM posts WHERE id = 'a'")
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+    assert ids(search_posts('refund')) == ['b']
+    found = search_posts('chargeback')
+    assert ids(found) == ['b'] and '<mark>Chargeback</mark>' in found['results'][0]['snippet']
+    assert ids(search_posts('court')) == ['c']
+    assert ids(search_posts('billing')) == []
+
+def test_posts_without_doc_id_are_migrated(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    # Tables as created before the search index
+    conn = sqlite3.connect(db.DATABASE_PATH)
+    conn.executescript('''
+        CREATE TABLE posts (id TEXT PRIMARY KEY, subreddit TEXT NOT NULL, title TEXT NOT NULL, url TEXT NOT NULL,
+            score INTEGER NOT NULL, author TEXT NOT NULL, created_utc TEXT NOT NULL, num_comments INTEGER NOT NULL,
+            content TEXT, summary TEXT, first_seen TEXT NOT NULL, last_seen TEXT NOT NULL);
+        CREATE TABLE comments (id TEXT PRIMARY KEY, post_id TEXT NOT NULL, rank INTEGER NOT NULL, author TEXT NOT NULL,
+            score INTEGER NOT NULL, body TEXT NOT NULL, created_utc TEXT);
+        INSERT INTO posts VALUES ('a', 'legaladvice', 'Gym cancellation', 'u', 1, 'someone', '2024-01-01 00:00:00', 1,
+            'They keep billing me.', NULL, 'x', 'x');
+        INSERT INTO comments VALUES ('a0', 'a', 0, 'other', 1, 'Planet gym did the same', NULL);
+    ''')
+    conn.close()
+
+    db.init_db()
+    assert ids(search_posts('billing')) == ['a']
+    assert ids(search_posts('planet')) == ['a']
+    conn = db.get_connection()
+    assert conn.execute("SELECT doc_id FROM posts WHERE id = 'a'").fetchone()['doc_id'] == 1
+    conn.close()
+
+    # Re-saving the post updates it in place
+    db.save_run('run1', '2024-01-02T00:00:00', 'legaladvice', 10, '', [make_post('a', 'Gym cancellation', 'Still billing.')])
+    conn = db.get_connection()
+    assert conn.execute('SELECT COUNT(*) AS n FROM posts').fetchone()['n'] == 1
+    conn.close()
@@ -0,0 +1,45 @@
+import numpy as np
+from sketches import QuantileSketch, CorrelationAccumulator
+
+def test_small_inputs_are_exact():
+    values = np.array([5, 1, 9, 3, 7, 2, 8, 4, 6, 10], dtype=float)
+    sketch = QuantileSketch()
+    sketch.update(values[:4])
+    sketch.update(values[4:])
+    assert sketch.quantile(0.5) == np.median(values)
+    assert sketch.mean == values.mean()
+    assert sketch.histogram(bins=5)['counts'] == np.histogram(values, bins=5)[0].tolist()
+
+def test_quantiles_stay_accurate_in_bounded_memory():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(3, 1.5, 1_000_000)
+    sketch = QuantileSketch(compression=200)
+    for chunk in np.array_split(values, 100):
+        sketch.update(chunk)
+
+    assert len(sketch.means) <= 200
+    assert sketch.count == len(values)
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        # Rank error well under one percent
+        assert abs((values <= sketch.quantile(q)).mean() - q) < 0.005
+    assert sum(sketch.histogram(bins=20)['counts']) == len(values)
+
+def test_merge_matches_single_sketch():
+    rng = np.random.default_rng(1)
+    a, b = rng.normal(0, 1, 50_000), rng.normal(5, 1, 50_000)
+    left, right = QuantileSketch(), QuantileSketch()
+    left.update(a)
+    right.update(b)
+    left.merge(right)
+    both = np.concatenate([a, b])
+    assert left.count == len(both)
+    assert abs((both <= left.quantile(0.5)).mean() - 0.5) < 0.005
+
+def test_correlation_matches_numpy():
+    rng = np.random.default_rng(2)
+    x = rng.normal(1000, 10, 30_000)
+    matrix = np.column_stack([x, 2 * x + rng.normal(0, 5, len(x)), rng.normal(0, 1, len(x))])
+    accumulator = CorrelationAccumulator(['a', 'b', 'c'])
+    for chunk in np.array_split(matrix, 7):
+        accumulator.update(chunk)
+    assert np.allclose(accumulator.correlation(), np.corrcoef(matrix, rowvar=False), atol=1e-9)
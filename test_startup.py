@@ -0,0 +1,7 @@
+from bench_startup import TARGETS, import_times
+
+def test_entry_points_do_not_import_heavy_dependencies(tmp_path):
+    for module in TARGETS:
+        total, modules, heavy = import_times(module, str(tmp_path))
+        assert heavy == [], f"{module} imports {heavy} at startup"
+        assert total > 0
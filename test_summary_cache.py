@@ -0,0 +1,81 @@
+import db
+import summary_cache
+from summary_cache import cached_summary, get_cached, store, evict_entries, cache_stats
+
+def setup_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'crawler.db'))
+    db.init_db()
+    summary_cache.reset_stats()
+
+def test_cached_summary_computes_once(tmp_path, monkeypatch):
+    setup_db(tmp_path, monkeypatch)
+    calls = []
+    def compute():
+        calls.append(1)
+        return "short summary"
+
+    for _ in range(3):
+        assert cached_summary('llama3', 'Summarize: {text}', 'post text', compute) == "short summary"
+    assert len(calls) == 1
+
+    # Model, template and text are all part of the key
+    assert get_cached('gemma3', 'Summarize: {text}', 'post text') is None
+    assert get_cached('llama3', 'TL;DR: {text}', 'post text') is None
+    assert get_cached('llama3', 'Summarize: {text}', 'other text') is None
+
+    stats = cache_stats()
+    assert stats['models']['llama3'] == {'hits': 2, 'misses': 3}
+    assert stats['models']['gemma3'] == {'hits': 0, 'misses': 1}
+    assert stats['entries'] == 1
+    assert stats['stored_hits'] == 2
+
+def test_failed_compute_is_not_cached(tmp_path, monkeypatch):
+    setup_db(tmp_path, monkeypatch)
+    def compute():
+        raise RuntimeError("ollama is down")
+
+    try:
+        cached_summary('llama3', '{text}', 'post text', compute)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    assert cache_stats()['entries'] == 0
+
+def test_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    setup_db(tmp_path, monkeypatch)
+    for name in ('a', 'b', 'c'):
+        store('textrank', 'sentences=5', name, 'x' * 100)
+    # Touch 'a' so 'b' becomes the least recently used entry
+    assert get_cached('textrank', 'sentences=5', 'a') == 'x' * 100
+
+    conn = db.get_connection()
+    evict_entries(conn, max_bytes=200)
+    conn.commit()
+    conn.close()
+
+    assert get_cached('textrank', 'sentences=5', 'a') is not None
+    assert get_cached('textrank', 'sentences=5', 'b') is None
+    assert get_cached('textrank', 'sentences=5', 'c') is not None
+
+def test_missing_table_is_a_miss(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATABASE_PATH', str(tmp_path / 'empty.db'))
+    assert cached_summary('textrank', 'sentences=5', 'text', lambda: 'summary') == 'summary'
+
+def test_hits_are_written_in_batches(tmp_path, monkeypatch):
+    setup_db(tmp_path, monkeypatch)
+    store('textrank', 'sentences=5', 'text', 'summary')
+    for _ in range(3):
+        assert get_cached('textrank', 'sentences=5', 'text') == 'summary'
+
+    # The read path does not write; the hits are flushed together when stats are read
+    conn = db.get_connection()
+    assert conn.execute('SELECT hits FROM summary_cache').fetchone()['hits'] == 0
+    conn.close()
+    assert cache_stats()['stored_hits'] == 3
+
+    # Once the interval has passed the next hit writes all pending ones
+    monkeypatch.setattr(summary_cache, 'TOUCH_INTERVAL', 0)
+    get_cached('textrank', 'sentences=5', 'text')
+    conn = db.get_connection()
+    assert conn.execute('SELECT hits FROM summary_cache').fetchone()['hits'] == 4
+    conn.close()